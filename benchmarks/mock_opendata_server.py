@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Local mock of the Paris Open Data records API for offline benchmarks.
+Serves /api/records/1.0/search/ from in-memory records with the same
+pagination and refine semantics the fetcher relies on.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = '/api/records/1.0/search/'
+
+
+class MockOpenDataServer:
+    """Serves synthetic records over HTTP on a background thread."""
+
+    def __init__(self, records: Dict[str, List[Dict]], host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            records: API records keyed by dataset id
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+        """
+        self.records = records
+        self.requests_served = 0
+        self.bytes_served = 0
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def api_base(self) -> str:
+        """Base URL to pass as the fetcher's ``api_base``."""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/records/1.0"
+
+    def start(self) -> "MockOpenDataServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockOpenDataServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def search(self, params: Dict[str, List[str]]) -> Dict:
+        """Answer a search query the way the records/1.0 API does."""
+        dataset_id = params.get('dataset', [''])[0]
+        records = self.records.get(dataset_id, [])
+
+        refines = {k[len('refine.'):]: v[0] for k, v in params.items() if k.startswith('refine.')}
+        if refines:
+            records = [
+                r for r in records
+                if all(str(r.get('fields', {}).get(field)) == value for field, value in refines.items())
+            ]
+
+        fields = params.get('fields', [None])[0]
+        if fields:
+            selected = set(fields.split(','))
+            records = [
+                {**r, 'fields': {k: v for k, v in r.get('fields', {}).items() if k in selected}}
+                for r in records
+            ]
+
+        start = int(params.get('start', ['0'])[0])
+        rows = int(params.get('rows', ['10'])[0])
+        return {
+            'nhits': len(records),
+            'parameters': {'dataset': dataset_id, 'rows': rows, 'start': start, 'format': 'json'},
+            'records': records[start:start + rows]
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path.rstrip('/') != SEARCH_PATH.rstrip('/'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(server.search(parse_qs(url.query))).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server.requests_served += 1
+                server.bytes_served += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
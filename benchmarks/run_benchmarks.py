@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the Paris garbage flow pipeline.
+Times each pipeline stage against synthetic data served by a local mock of the
+Open Data API, records wall time, peak RSS and output sizes, and checks the
+results against a baseline.
+
+Run from the project root:
+    python -m benchmarks.run_benchmarks --scales 1000 10000 100000
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.mock_opendata_server import MockOpenDataServer
+from benchmarks.synthetic_data import SyntheticParisData
+from scripts.enrich_data import DataEnricher
+from scripts.fetch_paris_data import ParisDataFetcher
+from scripts.pipeline_metrics import PipelineMetrics
+from scripts.streaming_fetch import StreamingFetcher
+from src.map_visualizer import GarbageFlowVisualizer
+
+STAGES = ['fetch_dataset', 'stream_fetch', 'process_geometric_data', 'create_flow_network', 'analyze_coverage', 'propose_sites', 'create_complete_map', 'save_map']
+
+# Metrics compared against the baseline and the default allowed ratios
+DEFAULT_THRESHOLDS = {'wall_s': 1.25, 'peak_rss_mb': 1.15, 'output_bytes': 1.10}
+
+# Smallest absolute increase that counts as a regression; repeated runs of
+# second-long stages on an idle machine vary by up to 1.5x
+NOISE_FLOORS = {'wall_s': 1.0, 'peak_rss_mb': 32.0, 'output_bytes': 0}
+
+
+class PipelineBenchmark:
+    """Runs every pipeline stage at one scale and measures it."""
+
+    def __init__(self, scale: int, workdir: Path, verbose: bool = False):
+        self.scale = scale
+        self.workdir = workdir
+        self.verbose = verbose
+        self.data_dir = workdir / "data"
+        self.output_dir = workdir / "static"
+        # Stage timings and per-stage peak RSS, measured the same way as main.py --profile
+        self.metrics = PipelineMetrics()
+
+    def run(self) -> Dict[str, Dict]:
+        """Run all stages in pipeline order and return their measurements."""
+        records = SyntheticParisData(self.scale).generate()
+        results = {}
+
+        with MockOpenDataServer(records) as server:
+            fetcher = ParisDataFetcher(data_dir=self.data_dir, api_base=server.api_base)
+
+            frames = {}
+
+            def fetch_all():
+                for key in fetcher.DATASETS:
+                    df = fetcher.fetch_dataset(key)
+                    if df is not None:
+                        frames[key] = df
+
+            results['fetch_dataset'] = self._measure(fetch_all, fetcher.RAW_DATA_DIR)
+            results['fetch_dataset']['records'] = sum(len(df) for df in frames.values())
+            results['fetch_dataset']['bytes_served'] = server.bytes_served
+
+            # Paged fetch with conversion and persistence overlapped
+            streamer = StreamingFetcher(ParisDataFetcher(data_dir=self.workdir / "stream", api_base=server.api_base))
+            results['stream_fetch'] = self._measure(lambda: streamer.run('14'), self.workdir / "stream")
+
+        # Geometry conversion and the later stages use the full synthetic scale,
+        # independently of the API's 10k row page size
+        full_frames = self._frames_from_records(records)
+        processed = {}
+
+        def process_all():
+            for key, df in full_frames.items():
+                gdf = fetcher.process_geometric_data(df, key)
+                if gdf is not None:
+                    processed[key] = gdf
+
+        results['process_geometric_data'] = self._measure(process_all, fetcher.PROCESSED_DATA_DIR)
+
+        enricher = DataEnricher(self.data_dir)
+        results['create_flow_network'] = self._measure(
+            lambda: enricher.create_flow_network(processed), enricher.enriched_dir
+        )
+        results['analyze_coverage'] = self._measure(
+            lambda: enricher.analyze_coverage(processed), enricher.enriched_dir / "coverage"
+        )
+        results['propose_sites'] = self._measure(lambda: enricher.propose_sites(processed))
+
+        visualizer = GarbageFlowVisualizer(self.data_dir)
+        visualizer.output_dir = self.output_dir
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        maps = {}
+        results['create_complete_map'] = self._measure(
+            lambda: maps.setdefault('map', visualizer.create_complete_map())
+        )
+        results['save_map'] = self._measure(
+            lambda: visualizer.save_map(maps['map'], "benchmark_map.html"), self.output_dir
+        )
+        return results
+
+    def _frames_from_records(self, records: Dict[str, List[Dict]]):
+        import pandas as pd
+
+        frames = {}
+        for key, dataset_id in ParisDataFetcher.DATASETS.items():
+            rows = []
+            for record in records.get(dataset_id, []):
+                fields = dict(record.get('fields', {}))
+                if record.get('geometry'):
+                    fields['geometry'] = record['geometry']
+                fields['_record_id'] = record['recordid']
+                fields['_dataset'] = key
+                rows.append(fields)
+            if rows and 'geometry' in rows[0]:
+                frames[key] = pd.DataFrame(rows)
+        return frames
+
+    def _measure(self, func: Callable, output_dir: Optional[Path] = None) -> Dict:
+        before = _directory_size(output_dir) if output_dir is not None else 0
+        log = StringIO()
+        with self.metrics.stage('benchmark'):
+            if self.verbose:
+                func()
+            else:
+                with redirect_stdout(log):
+                    func()
+        record = self.metrics.stages[-1]
+        return {
+            'wall_s': round(record['wall_seconds'], 4),
+            'peak_rss_mb': round(record['peak_rss_bytes'] / 2 ** 20, 1),
+            'output_bytes': (_directory_size(output_dir) - before) if output_dir is not None else 0
+        }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, thresholds: Dict[str, float]) -> List[str]:
+    """Return a description of every metric that regressed beyond its threshold and noise floor."""
+    regressions = []
+    for scale, stages in results['runs'].items():
+        base_stages = baseline.get('runs', {}).get(scale)
+        if not base_stages:
+            continue
+        for stage, metrics in stages.items():
+            base = base_stages.get(stage, {})
+            for metric, ratio in thresholds.items():
+                old, new = base.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                if new > old * ratio and new - old > NOISE_FLOORS.get(metric, 0):
+                    regressions.append(
+                        f"scale={scale} {stage}.{metric}: {old} -> {new} (x{new / old:.2f}, limit x{ratio})"
+                    )
+    return regressions
+
+
+def _directory_size(path: Path) -> int:
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the Paris garbage flow pipeline offline")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000],
+                        help='Features per dataset to benchmark (default: 1000 10000)')
+    parser.add_argument('--output', type=Path, default=Path('benchmarks/results/latest.json'),
+                        help='Results JSON file')
+    parser.add_argument('--baseline', type=Path, help='Previous results JSON to check for regressions')
+    parser.add_argument('--thresholds', type=Path,
+                        help='JSON mapping metric -> allowed ratio over baseline '
+                             f'(default: {json.dumps(DEFAULT_THRESHOLDS)})')
+    parser.add_argument('--verbose', action='store_true', help='Show pipeline output')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'runs': {}
+    }
+
+    for scale in args.scales:
+        print(f"Benchmarking scale={scale}...")
+        with tempfile.TemporaryDirectory(prefix="poubelles-bench-") as tmp:
+            runs = PipelineBenchmark(scale, Path(tmp), verbose=args.verbose).run()
+        results['runs'][str(scale)] = runs
+        for stage in STAGES:
+            m = runs[stage]
+            print(f"  {stage:<24} {m['wall_s']:>9.3f}s  {m['peak_rss_mb']:>8.1f} MB  {m['output_bytes']:>12,} B")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    if args.baseline:
+        thresholds = DEFAULT_THRESHOLDS
+        if args.thresholds:
+            with open(args.thresholds) as f:
+                thresholds = json.load(f)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, thresholds)
+        if regressions:
+            print("\n❌ Performance regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
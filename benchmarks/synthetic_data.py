@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Synthetic Paris-scale datasets for benchmarking.
+Generates Open Data API records matching the schemas of the fetcher's
+DATASETS at a configurable number of features.
+"""
+
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from scripts.fetch_paris_data import ParisDataFetcher
+
+# Approximate extent of Paris intra-muros (min_lon, min_lat, max_lon, max_lat)
+PARIS_BOUNDS = (2.2242, 48.8156, 2.4699, 48.9022)
+
+# Arrondissements are laid out on a 5 x 4 grid over the extent
+GRID_COLUMNS = 5
+GRID_ROWS = 4
+
+POINT_DATASETS = [
+    'glass_igloos', 'trilib_stations', 'public_composters', 'textile_containers',
+    'recycling_centers', 'street_bins', 'citizen_reports', 'waste_collection_points',
+    'waste_treatment_facilities'
+]
+
+REPORT_TYPES = ['Objets abandonnés', 'Propreté', 'Graffitis, tags, affiches', 'Mobiliers urbains', 'Eau']
+WASTE_TYPES = ['Ordures ménagères', 'Multimatériaux', 'Verre', 'Biodéchets', 'Encombrants', 'Textiles']
+STREET_TYPES = ['Rue', 'Avenue', 'Boulevard', 'Place', 'Impasse', 'Villa']
+STREET_NAMES = ['Daguerre', "d'Alésia", 'Raymond Losserand', 'du Château', 'de la Gaîté',
+                'Didot', 'Vercingétorix', 'Bezout', 'Brune', 'Montsouris', 'Sarrette', 'Hallé']
+
+
+class SyntheticParisData:
+    """Generates deterministic Open Data records for every fetcher dataset."""
+
+    def __init__(self, scale: int = 1000, seed: int = 14):
+        """
+        Args:
+            scale: Number of features for each point and line dataset
+            seed: Random seed, so runs at the same scale are comparable
+        """
+        self.scale = scale
+        self.rng = random.Random(seed)
+
+    def generate(self) -> Dict[str, List[Dict]]:
+        """Return API records keyed by Open Data dataset id."""
+        records = {}
+        for key, dataset_id in ParisDataFetcher.DATASETS.items():
+            if key in POINT_DATASETS:
+                features = self._point_records(key)
+            elif key == 'arrondissement_boundaries':
+                features = self._arrondissement_records()
+            elif key == 'neighborhoods':
+                features = self._neighborhood_records()
+            elif key == 'road_network':
+                features = self._road_records()
+            else:
+                features = self._tabular_records(key)
+            records[dataset_id] = [
+                {
+                    'datasetid': dataset_id,
+                    'recordid': f"{key}-{i:08d}",
+                    'record_timestamp': '2024-01-01T00:00:00+00:00',
+                    **feature
+                }
+                for i, feature in enumerate(features)
+            ]
+        return records
+
+    def _cell_bounds(self, arrondissement: int) -> Tuple[float, float, float, float]:
+        min_lon, min_lat, max_lon, max_lat = PARIS_BOUNDS
+        col = (arrondissement - 1) % GRID_COLUMNS
+        row = (arrondissement - 1) // GRID_COLUMNS
+        width = (max_lon - min_lon) / GRID_COLUMNS
+        height = (max_lat - min_lat) / GRID_ROWS
+        return (min_lon + col * width, min_lat + row * height,
+                min_lon + (col + 1) * width, min_lat + (row + 1) * height)
+
+    def _random_location(self) -> Tuple[int, float, float]:
+        arrondissement = self.rng.randint(1, 20)
+        min_lon, min_lat, max_lon, max_lat = self._cell_bounds(arrondissement)
+        return (arrondissement, self.rng.uniform(min_lon, max_lon), self.rng.uniform(min_lat, max_lat))
+
+    def _address(self, arrondissement: int) -> str:
+        return (f"{self.rng.randint(1, 180)} {self.rng.choice(STREET_TYPES)} "
+                f"{self.rng.choice(STREET_NAMES)}, 750{arrondissement:02d} Paris")
+
+    def _point_records(self, key: str) -> List[Dict]:
+        records = []
+        start = date(2023, 1, 1)
+        for i in range(self.scale):
+            arrondissement, lon, lat = self._random_location()
+            fields = {
+                'nom': f"{key.replace('_', ' ').title()} {i}",
+                'adresse': self._address(arrondissement),
+                'arrondissement': f"750{arrondissement:02d}",
+                'c_ar': arrondissement,
+                'geo_point_2d': [lat, lon]
+            }
+            if key == 'citizen_reports':
+                fields['type'] = self.rng.choice(REPORT_TYPES)
+                fields['datedecl'] = (start + timedelta(days=self.rng.randint(0, 730))).isoformat()
+            records.append({
+                'fields': fields,
+                'geometry': {'type': 'Point', 'coordinates': [lon, lat]}
+            })
+        return records
+
+    def _arrondissement_records(self) -> List[Dict]:
+        records = []
+        for arrondissement in range(1, 21):
+            min_lon, min_lat, max_lon, max_lat = self._cell_bounds(arrondissement)
+            ring = self._densified_ring(min_lon, min_lat, max_lon, max_lat, points_per_side=250)
+            records.append({
+                'fields': {
+                    'c_ar': arrondissement,
+                    'l_ar': f"{arrondissement}e Ardt",
+                    'surface': (max_lon - min_lon) * (max_lat - min_lat) * 8.1e9
+                },
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]}
+            })
+        return records
+
+    def _neighborhood_records(self) -> List[Dict]:
+        records = []
+        for arrondissement in range(1, 21):
+            min_lon, min_lat, max_lon, max_lat = self._cell_bounds(arrondissement)
+            mid_lon, mid_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+            quarters = [
+                (min_lon, min_lat, mid_lon, mid_lat), (mid_lon, min_lat, max_lon, mid_lat),
+                (min_lon, mid_lat, mid_lon, max_lat), (mid_lon, mid_lat, max_lon, max_lat)
+            ]
+            for q, bounds in enumerate(quarters):
+                records.append({
+                    'fields': {
+                        'c_qu': (arrondissement - 1) * 4 + q + 1,
+                        'l_qu': f"Quartier {arrondissement}-{q + 1}",
+                        'c_ar': arrondissement
+                    },
+                    'geometry': {'type': 'Polygon', 'coordinates': [self._densified_ring(*bounds, points_per_side=120)]}
+                })
+        return records
+
+    def _road_records(self) -> List[Dict]:
+        records = []
+        for i in range(self.scale):
+            arrondissement, lon, lat = self._random_location()
+            coords = [[lon, lat]]
+            for _ in range(self.rng.randint(5, 30)):
+                lon += self.rng.uniform(-0.0004, 0.0004)
+                lat += self.rng.uniform(-0.0003, 0.0003)
+                coords.append([lon, lat])
+            records.append({
+                'fields': {
+                    'l_longmin': f"{self.rng.choice(STREET_TYPES)} {self.rng.choice(STREET_NAMES)}",
+                    'c_ar': arrondissement,
+                    'longueur': len(coords) * 30.0
+                },
+                'geometry': {'type': 'LineString', 'coordinates': coords}
+            })
+        return records
+
+    def _tabular_records(self, key: str) -> List[Dict]:
+        records = []
+        for year in range(2011, 2024):
+            for month in range(1, 13):
+                for waste_type in WASTE_TYPES:
+                    for arrondissement in range(1, 21):
+                        records.append({'fields': {
+                            'annee': year,
+                            'mois': month,
+                            'granularite': 'arrondissement',
+                            'arrondissement': f"750{arrondissement:02d}",
+                            'type_dechet': waste_type,
+                            'tonnage': round(self.rng.uniform(50, 2500), 1),
+                            'kg_par_habitant': round(self.rng.uniform(1, 30), 2)
+                        }})
+                        if len(records) >= self.scale:
+                            return records
+        return records
+
+    def _densified_ring(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float,
+                        points_per_side: int) -> List[List[float]]:
+        """Rectangle ring with many collinear vertices, like real surveyed boundaries."""
+        corners = [(min_lon, min_lat), (max_lon, min_lat), (max_lon, max_lat), (min_lon, max_lat)]
+        ring = []
+        for (x0, y0), (x1, y1) in zip(corners, corners[1:] + corners[:1]):
+            for step in range(points_per_side):
+                t = step / points_per_side
+                ring.append([x0 + (x1 - x0) * t, y0 + (y1 - y0) * t])
+        ring.append(ring[0])
+        return ring
@@ -5,50 +5,73 @@ Coordinates data fetching, enrichment, and visualization.
 """
 
 import sys
+import json
 import argparse
 from pathlib import Path
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 from scripts.fetch_paris_data import ParisDataFetcher
+from scripts.streaming_fetch import StreamingFetcher
 from scripts.enrich_data import DataEnricher
 from src.map_visualizer import GarbageFlowVisualizer
+from scripts.dataset_context import DatasetContext
+from scripts.simplify_geometries import GeometrySimplifier
+from src.batch_renderer import BatchMapRenderer
+from scripts.pipeline_metrics import PipelineMetrics
+from scripts.pipeline_daemon import PipelineDaemon, send_command
+from scripts.query_engine import run_query
 
-def run_full_pipeline(arrondissement: str = '14'):
+def run_full_pipeline(arrondissement: str = '14', external_assets: bool = False,
+                      metrics: Optional[PipelineMetrics] = None):
     """Run the complete data pipeline."""
+    metrics = metrics or PipelineMetrics(enabled=False)
     print("=" * 60)
     print("PARIS GARBAGE FLOW VISUALIZATION")
     print(f"{arrondissement}th Arrondissement")
     print("=" * 60)
     
-    # Step 1: Fetch data
-    print(f"\n1. Fetching Paris open data for {arrondissement}th arrondissement...")
-    fetcher = ParisDataFetcher()
-    datasets = fetcher.fetch_arrondissement_data(arrondissement)
-    
-    # Process geometric data
-    for name, df in datasets.items():
-        if df is not None and 'geometry' in df.columns:
-            fetcher.process_geometric_data(df, name)
-    
-    # Step 2: Enrich data
-    print("\n2. Enriching data with research estimates...")
-    enricher = DataEnricher()
-    enriched_datasets = enricher.load_processed_data()
-    
-    if enriched_datasets:
-        enricher.create_flow_network(enriched_datasets)
-    else:
-        print("Warning: No processed data found for enrichment")
-    
-    # Step 3: Create visualization
-    print("\n3. Creating interactive map...")
-    visualizer = GarbageFlowVisualizer()
-    map_obj = visualizer.create_complete_map()
+    # Datasets are handed between stages in memory; files are written in the background
+    with DatasetContext() as context:
+        # Step 1: Fetch data
+        print(f"\n1. Fetching Paris open data for {arrondissement}th arrondissement...")
+        with metrics.stage('fetch'):
+            # Datasets are converted while the remaining ones are still downloading
+            fetcher = ParisDataFetcher(metrics=metrics)
+            StreamingFetcher(fetcher, context).run(arrondissement)
+            with metrics.stage('simplify'):
+                GeometrySimplifier().build_all(context.get_datasets())
+        
+        # Step 2: Enrich data
+        print("\n2. Enriching data with research estimates...")
+        with metrics.stage('enrich'):
+            enricher = DataEnricher(metrics=metrics)
+            enriched_datasets = enricher.load_processed_data(context)
+            
+            if enriched_datasets:
+                enricher.create_flow_network(enriched_datasets, context=context)
+                enricher.analyze_coverage(enriched_datasets, context=context)
+                enricher.propose_sites(enriched_datasets, context=context)
+            else:
+                print("Warning: No processed data found for enrichment")
+        
+        # Step 3: Create visualization
+        print("\n3. Creating interactive map...")
+        with metrics.stage('visualize'):
+            visualizer = GarbageFlowVisualizer(arrondissement=arrondissement, metrics=metrics)
+            map_obj = visualizer.create_complete_map(context, external_assets=external_assets)
+            
+            if map_obj:
+                output_path = visualizer.save_map(map_obj)
+        
+        with metrics.stage('persist_flush'):
+            failures = context.flush()
+        if failures:
+            print("Warning: some datasets could not be written to disk")
     
     if map_obj:
-        output_path = visualizer.save_map(map_obj)
         print(f"\n✅ SUCCESS: Map created at {output_path}")
         print("\nTo view the map:")
         print(f"  open {output_path}")
@@ -61,42 +84,56 @@ def run_full_pipeline(arrondissement: str = '14'):
         
     return True
 
-def run_individual_step(step: str):
+def run_individual_step(step: str, external_assets: bool = False,
+                        metrics: Optional[PipelineMetrics] = None):
     """Run an individual pipeline step."""
+    metrics = metrics or PipelineMetrics(enabled=False)
     
     if step == "fetch":
         print("Fetching Paris open data...")
-        fetcher = ParisDataFetcher()
-        datasets = fetcher.fetch_14th_arrondissement_data()
-        
-        for name, df in datasets.items():
-            if df is not None and 'geometry' in df.columns:
-                fetcher.process_geometric_data(df, name)
+        with metrics.stage('fetch'):
+            fetcher = ParisDataFetcher(metrics=metrics)
+            datasets = StreamingFetcher(fetcher).run('14')
+            
+            processed = {name: df for name, df in datasets.items() if 'geometry' in df.columns}
+            with metrics.stage('simplify'):
+                GeometrySimplifier().build_all(processed)
                 
     elif step == "enrich":
         print("Enriching data...")
-        enricher = DataEnricher()
-        datasets = enricher.load_processed_data()
-        
-        if datasets:
-            enricher.create_flow_network(datasets)
-        else:
-            print("No processed data found. Run 'fetch' step first.")
+        with metrics.stage('enrich'):
+            enricher = DataEnricher(metrics=metrics)
+            datasets = enricher.load_processed_data()
+            
+            if datasets:
+                enricher.create_flow_network(datasets)
+                enricher.analyze_coverage(datasets)
+                enricher.propose_sites(datasets)
+            else:
+                print("No processed data found. Run 'fetch' step first.")
             
     elif step == "visualize":
         print("Creating visualization...")
-        visualizer = GarbageFlowVisualizer()
-        map_obj = visualizer.create_complete_map()
-        
-        if map_obj:
-            output_path = visualizer.save_map(map_obj)
-            print(f"Map saved to: {output_path}")
-        else:
-            print("Failed to create map")
+        with metrics.stage('visualize'):
+            visualizer = GarbageFlowVisualizer(metrics=metrics)
+            map_obj = visualizer.create_complete_map(external_assets=external_assets)
+            
+            if map_obj:
+                output_path = visualizer.save_map(map_obj)
+                print(f"Map saved to: {output_path}")
+            else:
+                print("Failed to create map")
+            
+    elif step == "batch":
+        print("Rendering one map per arrondissement...")
+        renderer = BatchMapRenderer(external_assets=external_assets)
+        renderer.load()
+        renderer.render(BatchMapRenderer.arrondissement_jobs())
+        print(f"Maps saved to: {renderer.output_dir}")
             
     else:
         print(f"Unknown step: {step}")
-        print("Available steps: fetch, enrich, visualize")
+        print("Available steps: fetch, enrich, visualize, batch")
 
 def main():
     """Main function with command line interface."""
@@ -104,9 +141,34 @@ def main():
         description="Paris Garbage Flow Visualization for 14th Arrondissement"
     )
     
+    parser.add_argument(
+        'command',
+        nargs='?',
+        choices=['query'],
+        help='Subcommand: "query [SQL]" runs SQL over processed and enriched data (lists tables without SQL)'
+    )
+    
+    parser.add_argument(
+        'sql',
+        nargs='?',
+        help='SQL for the query subcommand, e.g. "SELECT _arr, count(*) FROM street_bins GROUP BY 1"'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Query subcommand: ignore and do not write cached results'
+    )
+    
+    parser.add_argument(
+        '--output',
+        type=Path,
+        help='Query subcommand: write the result to a .csv or .parquet file'
+    )
+    
     parser.add_argument(
         '--step',
-        choices=['fetch', 'enrich', 'visualize', 'all'],
+        choices=['fetch', 'enrich', 'visualize', 'batch', 'all'],
         default='all',
         help='Pipeline step to run (default: all)'
     )
@@ -117,6 +179,43 @@ def main():
         help='Paris arrondissement to analyze (default: 14)'
     )
     
+    parser.add_argument(
+        '--external-assets',
+        action='store_true',
+        help='Write layer data as separate cacheable files loaded on demand (requires --serve or another web server)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Record per-stage metrics and export them as JSON and Prometheus text'
+    )
+    
+    parser.add_argument(
+        '--profile-stage',
+        metavar='STAGE',
+        help='Run the named stage (e.g. fetch, enrich, geometry_conversion) under cProfile and tracemalloc'
+    )
+    
+    parser.add_argument(
+        '--metrics-dir',
+        type=Path,
+        default=Path('data') / 'metrics',
+        help='Directory for metrics and profiler output (default: data/metrics)'
+    )
+    
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Keep data in memory, watch data/ for changes and rebuild incrementally'
+    )
+    
+    parser.add_argument(
+        '--control',
+        choices=['status', 'rebuild', 'fetch', 'stop'],
+        help='Send a command to a running daemon and exit'
+    )
+    
     parser.add_argument(
         '--serve',
         action='store_true',
@@ -125,12 +224,40 @@ def main():
     
     args = parser.parse_args()
     
-    if args.step == 'all':
-        success = run_full_pipeline(args.arrondissement)
-        if not success:
-            sys.exit(1)
+    if args.control:
+        print(json.dumps(send_command(args.control), indent=2, default=str))
+        return
+        
+    if args.command == 'query':
+        run_query(args.sql, use_cache=not args.no_cache, output=args.output)
+        return
+        
+    metrics = PipelineMetrics(
+        enabled=args.profile or args.profile_stage is not None,
+        profile_stage=args.profile_stage,
+        profile_dir=args.metrics_dir
+    )
+    
+    if args.daemon:
+        daemon = PipelineDaemon(
+            arrondissement=args.arrondissement,
+            external_assets=args.external_assets,
+            metrics=metrics if metrics.enabled else None
+        )
+        daemon.serve_forever()
+        success = True
+    elif args.step == 'all':
+        success = run_full_pipeline(args.arrondissement, args.external_assets, metrics)
     else:
-        run_individual_step(args.step)
+        run_individual_step(args.step, args.external_assets, metrics)
+        success = True
+        
+    if metrics.enabled:
+        paths = metrics.export(args.metrics_dir, f"pipeline_metrics_{args.step}")
+        print(f"Metrics saved to: {paths['json']} and {paths['prometheus']}")
+        
+    if not success:
+        sys.exit(1)
     
     if args.serve:
         import http.server
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Drop-off service coverage for Paris garbage flow visualization.
+Lays a fine metric grid over the arrondissement boundaries and stores, for
+every cell, the straight-line distance to the nearest drop-off point of each
+type. Distances come from one batched nearest-neighbour query per type against
+a spatial index, and are kept as a compact uint16 raster with per-quartier
+summaries to find gaps in coverage. Only arrondissements whose drop-off points
+were fetched are analysed; elsewhere the nearest fetched point says nothing
+about local coverage.
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+# Allow running this file directly, e.g. python scripts/coverage_raster.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.deduplicate_containers import METRIC_CRS
+
+COVERAGE_DATASETS = ['glass_igloos', 'trilib_stations', 'public_composters', 'textile_containers']
+
+# Layer holding the distance to the nearest drop-off of any type
+ANY_LAYER = 'any'
+
+# Distance value of cells outside Paris (distances are whole metres)
+NODATA = np.iinfo(np.uint16).max
+
+
+class CoverageRaster:
+    """Nearest drop-off distance per cell, with arrondissement and quartier labels."""
+
+    def __init__(self, layers: Dict[str, np.ndarray], arrondissements: np.ndarray, zones: np.ndarray,
+                 zone_names: List[str], origin: Tuple[float, float], resolution_m: float):
+        """
+        Args:
+            layers: uint16 distance grids in metres keyed by dataset (plus 'any'),
+                rows ordered north to south, NODATA outside the analysed arrondissements
+            arrondissements: Arrondissement number of each cell (0 outside the
+                analysed arrondissements)
+            zones: Index into ``zone_names`` of each cell (-1 outside any quartier)
+            zone_names: Quartier names
+            origin: Metric (x, y) of the grid's north-west corner
+            resolution_m: Cell size in metres
+        """
+        self.layers = layers
+        self.arrondissements = arrondissements
+        self.zones = zones
+        self.zone_names = zone_names
+        self.origin = origin
+        self.resolution_m = resolution_m
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.arrondissements.shape
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Metric (min_x, min_y, max_x, max_y) extent."""
+        x0, y1 = self.origin
+        ny, nx = self.shape
+        return (x0, y1 - ny * self.resolution_m, x0 + nx * self.resolution_m, y1)
+
+    def summarize(self, threshold_m: float = 300.0) -> List[Dict]:
+        """
+        Distance statistics per quartier.
+
+        Returns:
+            One dict per quartier with its cell count and, for every layer,
+            mean, median, 90th percentile and maximum distance and the share
+            of cells farther than ``threshold_m`` from a drop-off
+        """
+        inside = self.zones >= 0
+        frame = pd.DataFrame({name: grid[inside].astype(np.float32) for name, grid in self.layers.items()})
+        frame['zone'] = self.zones[inside]
+        frame['arrondissement'] = self.arrondissements[inside]
+        grouped = frame.groupby('zone', sort=True)
+
+        summary = pd.DataFrame({
+            'cells': grouped.size(),
+            'arrondissement': grouped['arrondissement'].agg(lambda s: int(s.mode().iloc[0]))
+        })
+        for name in self.layers:
+            column = grouped[name]
+            summary[f'{name}_mean_m'] = column.mean().round(1)
+            summary[f'{name}_median_m'] = column.median()
+            summary[f'{name}_p90_m'] = column.quantile(0.9)
+            summary[f'{name}_max_m'] = column.max()
+            summary[f'{name}_share_beyond'] = (frame[name] > threshold_m).groupby(frame['zone']).mean().round(4)
+
+        summary.insert(0, 'quartier', [self.zone_names[i] for i in summary.index])
+        return summary.reset_index(drop=True).to_dict(orient='records')
+
+    def to_wgs84(self, layer: str = ANY_LAYER,
+                 arrondissement: Optional[int] = None) -> Optional[Tuple[np.ndarray, Tuple]]:
+        """
+        Resample a layer onto a regular longitude/latitude grid for display.
+
+        Args:
+            layer: Layer name
+            arrondissement: Restrict to the cells of one arrondissement
+
+        Returns:
+            (grid, (min_lon, min_lat, max_lon, max_lat)) with rows ordered
+            north to south and NaN outside the selection, or None if empty
+        """
+        grid = self.layers.get(layer)
+        if grid is None:
+            return None
+        selected = self.arrondissements > 0 if arrondissement is None else self.arrondissements == arrondissement
+        rows = np.flatnonzero(selected.any(axis=1))
+        cols = np.flatnonzero(selected.any(axis=0))
+        if len(rows) == 0:
+            return None
+
+        # Metric extent of the selection, then its geographic bounding box
+        x0, y1 = self.origin
+        res = self.resolution_m
+        min_x, max_x = x0 + cols[0] * res, x0 + (cols[-1] + 1) * res
+        min_y, max_y = y1 - (rows[-1] + 1) * res, y1 - rows[0] * res
+        to_wgs84 = Transformer.from_crs(METRIC_CRS, 'EPSG:4326', always_xy=True)
+        corner_lon, corner_lat = to_wgs84.transform(
+            np.array([min_x, min_x, max_x, max_x]), np.array([min_y, max_y, min_y, max_y]))
+        min_lon, max_lon = float(corner_lon.min()), float(corner_lon.max())
+        min_lat, max_lat = float(corner_lat.min()), float(corner_lat.max())
+
+        # Nearest-cell lookup of every output pixel centre
+        ny, nx = rows[-1] - rows[0] + 1, cols[-1] - cols[0] + 1
+        lons = min_lon + (np.arange(nx) + 0.5) * (max_lon - min_lon) / nx
+        lats = max_lat - (np.arange(ny) + 0.5) * (max_lat - min_lat) / ny
+        lon_grid, lat_grid = np.meshgrid(lons, lats)
+        to_metric = Transformer.from_crs('EPSG:4326', METRIC_CRS, always_xy=True)
+        xs, ys = to_metric.transform(lon_grid.ravel(), lat_grid.ravel())
+        col_idx = np.floor((xs - x0) / res).astype(np.int64)
+        row_idx = np.floor((y1 - ys) / res).astype(np.int64)
+        valid = (col_idx >= 0) & (col_idx < self.shape[1]) & (row_idx >= 0) & (row_idx < self.shape[0])
+
+        resampled = np.full(xs.shape, np.nan, dtype=np.float32)
+        r, c = row_idx[valid], col_idx[valid]
+        keep = selected[r, c] & (grid[r, c] != NODATA)
+        resampled[np.flatnonzero(valid)[keep]] = grid[r[keep], c[keep]]
+        return resampled.reshape(ny, nx), (min_lon, min_lat, max_lon, max_lat)
+
+    def save(self, directory: Path, threshold_m: float = 300.0):
+        """Write the raster as compressed NumPy arrays and the quartier summary as JSON."""
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {f'layer_{name}': grid for name, grid in self.layers.items()}
+        tmp_path = directory / "coverage.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            arrondissements=self.arrondissements,
+            zones=self.zones,
+            zone_names=np.array(self.zone_names, dtype=str),
+            origin=np.array(self.origin, dtype=np.float64),
+            resolution_m=np.array(self.resolution_m, dtype=np.float64),
+            **arrays
+        )
+        tmp_path.replace(directory / "coverage.npz")
+
+        with open(directory / "coverage_summary.json", 'w') as f:
+            json.dump({
+                'resolution_m': self.resolution_m,
+                'threshold_m': threshold_m,
+                'layers': list(self.layers),
+                'quartiers': self.summarize(threshold_m)
+            }, f, indent=2, default=float)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["CoverageRaster"]:
+        """Read a raster written by ``save``; None if there is none."""
+        path = directory / "coverage.npz"
+        if not path.exists():
+            return None
+        with np.load(path) as arrays:
+            layers = {key[len('layer_'):]: arrays[key] for key in arrays.files if key.startswith('layer_')}
+            return cls(layers, arrays['arrondissements'], arrays['zones'],
+                       [str(n) for n in arrays['zone_names']], tuple(arrays['origin']),
+                       float(arrays['resolution_m']))
+
+
+class CoverageAnalyzer:
+    """Builds the coverage raster from boundary, quartier and drop-off datasets."""
+
+    def __init__(self, resolution_m: float = 10.0, chunk_cells: int = 500_000):
+        """
+        Args:
+            resolution_m: Cell size in metres
+            chunk_cells: Cells queried at once, bounding the temporary point geometries
+        """
+        self.resolution_m = resolution_m
+        self.chunk_cells = chunk_cells
+
+    def build(self, datasets: Dict[str, gpd.GeoDataFrame],
+              arrondissements: Optional[Iterable[int]] = None) -> Optional[CoverageRaster]:
+        """
+        Coverage raster over the analysed arrondissements, or None without boundaries.
+
+        Args:
+            datasets: Boundaries, optional quartiers and drop-off point datasets
+            arrondissements: Arrondissements whose drop-offs were fetched
+                (default: those containing at least one drop-off point)
+        """
+        boundaries = datasets.get('arrondissement_boundaries')
+        if boundaries is None or len(boundaries) == 0:
+            print("No arrondissement boundaries: skipping coverage analysis")
+            return None
+        boundaries = boundaries[boundaries.geometry.notna()].to_crs(METRIC_CRS)
+        if arrondissements is None:
+            arrondissements = arrondissements_with_points(boundaries, datasets, COVERAGE_DATASETS)
+        boundaries = select_boundaries(boundaries, arrondissements)
+        if len(boundaries) == 0:
+            print("No drop-off points inside the arrondissement boundaries: skipping coverage analysis")
+            return None
+
+        res = self.resolution_m
+        arrondissements, origin, numbers = arrondissement_grid(boundaries, res)
+        shape = arrondissements.shape
+
+        zones = np.full(shape, -1, dtype=np.int16)
+        neighborhoods = datasets.get('neighborhoods')
+        if neighborhoods is not None and len(neighborhoods) > 0:
+            neighborhoods = neighborhoods[neighborhoods.geometry.notna()].to_crs(METRIC_CRS)
+            names = neighborhoods['l_qu'] if 'l_qu' in neighborhoods.columns else neighborhoods.index
+            zone_names = [str(n) for n in names]
+            burn_polygons(zones, neighborhoods.geometry.values, np.arange(len(neighborhoods)), origin, res)
+        else:
+            # Without quartiers, summarise per arrondissement
+            zone_names = [f"Arrondissement {n}" for n in numbers]
+            burn_polygons(zones, boundaries.geometry.values, np.arange(len(boundaries)), origin, res)
+        zones[arrondissements == 0] = -1
+
+        inside = np.flatnonzero(arrondissements.ravel() > 0)
+        xs, ys = cell_centres(inside, shape, origin, res)
+
+        trees = {}
+        for name in COVERAGE_DATASETS:
+            tree = point_tree(datasets.get(name))
+            if tree is not None:
+                trees[name] = tree
+        if not trees:
+            print("No drop-off points: skipping coverage analysis")
+            return None
+
+        distances = {name: np.empty(len(inside), dtype=np.float32) for name in trees}
+        for start in range(0, len(inside), self.chunk_cells):
+            stop = min(start + self.chunk_cells, len(inside))
+            cells = shapely.points(xs[start:stop], ys[start:stop])
+            for name, tree in trees.items():
+                (cell_idx, _), nearest = tree.query_nearest(cells, return_distance=True, all_matches=False)
+                distances[name][start + cell_idx] = nearest
+
+        layers = {}
+        nearest_any = np.full(len(inside), np.inf, dtype=np.float32)
+        for name, values in distances.items():
+            layers[name] = self._encode(values, inside, shape)
+            np.minimum(nearest_any, values, out=nearest_any)
+        layers[ANY_LAYER] = self._encode(nearest_any, inside, shape)
+
+        print(f"✓ Coverage raster: {shape[1]}x{shape[0]} cells at {res:g} m, "
+              f"{len(inside)} inside Paris, {len(trees)} drop-off types")
+        return CoverageRaster(layers, arrondissements, zones, zone_names, origin, res)
+
+    @staticmethod
+    def _encode(values: np.ndarray, inside: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        grid = np.full(shape[0] * shape[1], NODATA, dtype=np.uint16)
+        grid[inside] = np.clip(np.rint(values), 0, NODATA - 1)
+        return grid.reshape(shape)
+
+
+def arrondissement_grid(boundaries: gpd.GeoDataFrame,
+                        resolution_m: float) -> Tuple[np.ndarray, Tuple[float, float], np.ndarray]:
+    """
+    Grid covering metric arrondissement boundaries.
+
+    Returns:
+        (labels, origin, numbers): int8 arrondissement number per cell (0
+        outside Paris, rows north to south), the grid's north-west corner and
+        the number of each boundary row
+    """
+    min_x, min_y, max_x, max_y = boundaries.total_bounds
+    x0 = np.floor(min_x / resolution_m) * resolution_m
+    y1 = np.ceil(max_y / resolution_m) * resolution_m
+    shape = (int(np.ceil((y1 - min_y) / resolution_m)), int(np.ceil((max_x - x0) / resolution_m)))
+    origin = (float(x0), float(y1))
+
+    numbers = boundary_numbers(boundaries)
+    labels = np.zeros(shape, dtype=np.int8)
+    burn_polygons(labels, boundaries.geometry.values, numbers, origin, resolution_m)
+    return labels, origin, numbers
+
+
+def boundary_numbers(boundaries: gpd.GeoDataFrame) -> np.ndarray:
+    """Arrondissement number of each boundary row (row order when there is no 'c_ar')."""
+    if 'c_ar' in boundaries.columns:
+        return pd.to_numeric(boundaries['c_ar'], errors='coerce').fillna(0).to_numpy(dtype=np.int8)
+    return np.arange(1, len(boundaries) + 1, dtype=np.int8)
+
+
+def arrondissements_with_points(boundaries: gpd.GeoDataFrame, datasets: Dict[str, gpd.GeoDataFrame],
+                                names: List[str]) -> List[int]:
+    """
+    Arrondissements containing at least one point of the named datasets.
+
+    Point datasets are usually fetched for one arrondissement only, so this
+    is the area over which distances to them mean something.
+    """
+    numbers = boundary_numbers(boundaries)
+    tree = shapely.STRtree(np.asarray(boundaries.geometry.to_crs(METRIC_CRS).values))
+    found = set()
+    for name in names:
+        gdf = datasets.get(name)
+        if gdf is None or len(gdf) == 0 or 'geometry' not in gdf:
+            continue
+        points = gdf.geometry[gdf.geometry.notna() & ~gdf.geometry.is_empty].to_crs(METRIC_CRS)
+        _, boundary_idx = tree.query(np.asarray(points.representative_point().values), predicate='within')
+        found.update(int(n) for n in numbers[np.unique(boundary_idx)])
+    found.discard(0)
+    return sorted(found)
+
+
+def select_boundaries(boundaries: gpd.GeoDataFrame, arrondissements: Iterable[int]) -> gpd.GeoDataFrame:
+    """Boundary rows of the given arrondissements."""
+    wanted = {int(a) for a in arrondissements}
+    selected = boundaries[np.isin(boundary_numbers(boundaries), list(wanted))]
+    if 0 < len(selected) < len(boundaries):
+        print(f"   Restricted to arrondissement(s) {', '.join(str(a) for a in sorted(wanted))}")
+    return selected
+
+
+def burn_polygons(target: np.ndarray, geometries: np.ndarray, values: np.ndarray,
+                  origin: Tuple[float, float], resolution_m: float):
+    """Set cells whose centre lies in each polygon, testing only the polygon's window."""
+    x0, y1 = origin
+    ny, nx = target.shape
+    for geometry, value in zip(geometries, values):
+        if geometry is None or geometry.is_empty:
+            continue
+        g_min_x, g_min_y, g_max_x, g_max_y = geometry.bounds
+        c0 = max(int((g_min_x - x0) // resolution_m), 0)
+        c1 = min(int((g_max_x - x0) // resolution_m) + 1, nx)
+        r0 = max(int((y1 - g_max_y) // resolution_m), 0)
+        r1 = min(int((y1 - g_min_y) // resolution_m) + 1, ny)
+        if c0 >= c1 or r0 >= r1:
+            continue
+        xs = x0 + (np.arange(c0, c1) + 0.5) * resolution_m
+        ys = y1 - (np.arange(r0, r1) + 0.5) * resolution_m
+        shapely.prepare(geometry)
+        inside = shapely.contains_xy(geometry, *np.meshgrid(xs, ys))
+        target[r0:r1, c0:c1][inside] = value
+
+
+def cell_centres(flat_indices: np.ndarray, shape: Tuple[int, int], origin: Tuple[float, float],
+                 resolution_m: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Metric x and y of the centres of cells given by flat (row-major) index."""
+    rows, cols = np.divmod(flat_indices, shape[1])
+    return origin[0] + (cols + 0.5) * resolution_m, origin[1] - (rows + 0.5) * resolution_m
+
+
+def point_tree(gdf: Optional[gpd.GeoDataFrame]) -> Optional[shapely.STRtree]:
+    """Spatial index over a dataset's points in metric coordinates; None if it has none."""
+    if gdf is None or len(gdf) == 0 or 'geometry' not in gdf:
+        return None
+    points = gdf.geometry[gdf.geometry.notna() & ~gdf.geometry.is_empty].to_crs(METRIC_CRS)
+    if len(points) == 0:
+        return None
+    return shapely.STRtree(np.asarray(points.representative_point().values))
+
+
+def main():
+    """Build the coverage raster from processed data."""
+    processed_dir = Path("data") / "processed"
+    datasets = {}
+    for name in COVERAGE_DATASETS + ['arrondissement_boundaries', 'neighborhoods']:
+        path = processed_dir / f"{name}.geojson"
+        if path.exists():
+            datasets[name] = gpd.read_file(path)
+    coverage = CoverageAnalyzer().build(datasets)
+    if coverage is None:
+        return
+    output = Path("data") / "enriched" / "coverage"
+    coverage.save(output)
+    print(f"Coverage raster saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
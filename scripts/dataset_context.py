@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+In-memory dataset hand-off between pipeline stages.
+Lets fetch, enrichment and visualization share parsed datasets within a single
+run while disk persistence happens in the background.
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import geopandas as gpd
+
+
+class DatasetContext:
+    """Shares parsed datasets between pipeline stages of a single run.
+
+    Each dataset is parsed once and handed to the next stage as-is; writes to
+    ``data/`` are queued on a small thread pool so stages never wait on
+    GeoJSON serialization. Datasets stored here are treated as read-only by
+    every consumer.
+    """
+
+    def __init__(self, persist_workers: int = 2):
+        self.datasets: Dict[str, gpd.GeoDataFrame] = {}
+        self.enriched: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=persist_workers, thread_name_prefix="persist"
+        )
+        self._pending: List[Tuple[str, Future]] = []
+
+    def __enter__(self) -> "DatasetContext":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_dataset(self, name: str, gdf: gpd.GeoDataFrame):
+        """Register a processed dataset for downstream stages."""
+        with self._lock:
+            self.datasets[name] = gdf
+
+    def remove_dataset(self, name: str):
+        """Forget a dataset, e.g. after its file was deleted."""
+        with self._lock:
+            self.datasets.pop(name, None)
+
+    def get_datasets(self) -> Dict[str, gpd.GeoDataFrame]:
+        """Return a shallow copy of the registered processed datasets."""
+        with self._lock:
+            return dict(self.datasets)
+
+    def set_enriched(self, key: str, value: Any):
+        """Register an enrichment output (flow nodes, edges, estimates)."""
+        with self._lock:
+            self.enriched[key] = value
+
+    def get_enriched(self, key: str, default: Any = None) -> Any:
+        """Return an enrichment output if it was produced in this run."""
+        with self._lock:
+            return self.enriched.get(key, default)
+
+    def persist(self, description: str, func: Callable, *args, **kwargs) -> Future:
+        """Schedule a write to disk without blocking the calling stage."""
+        future = self._executor.submit(func, *args, **kwargs)
+        with self._lock:
+            self._pending.append((description, future))
+        return future
+
+    def flush(self) -> int:
+        """Wait for queued writes to finish and return the number of failures."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+
+        failures = 0
+        for description, future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                failures += 1
+                print(f"✗ Error persisting {description}: {e}")
+        return failures
+
+    def close(self):
+        """Flush pending writes and stop the persistence pool."""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    @property
+    def pending_writes(self) -> int:
+        """Number of writes that have not completed yet."""
+        with self._lock:
+            return sum(1 for _, future in self._pending if not future.done())
+
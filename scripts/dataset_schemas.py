@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Column schemas for the Paris waste management datasets.
+Declares the columns each dataset keeps and their compact in-memory types,
+so loaded GeoDataFrames use categoricals, downcast integers and float32
+instead of Python-object strings and float64 everywhere.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Column types:
+#   'category' - low-cardinality strings
+#   'int'      - integers, downcast to the smallest (nullable) type that fits
+#   'float32'  - measurements and coordinates where ~1e-7 relative precision is enough
+#   'str'      - free text kept as Python strings
+#   'datetime' - ISO dates
+# 'time_column' names the date column large datasets are partitioned by.
+COMMON_COLUMNS = {
+    '_dataset': 'category',
+    '_record_id': 'str',
+    'geometry': 'geometry'
+}
+
+LOCATION_COLUMNS = {
+    'nom': 'str',
+    'name': 'str',
+    'adresse': 'str',
+    'address': 'str',
+    'arrondissement': 'category',
+    'c_ar': 'int'
+}
+
+DATASET_SCHEMAS: Dict[str, Dict] = {
+    # Drop-off infrastructure
+    'glass_igloos': {'columns': LOCATION_COLUMNS},
+    'trilib_stations': {'columns': LOCATION_COLUMNS},
+    'public_composters': {'columns': LOCATION_COLUMNS},
+    'textile_containers': {'columns': LOCATION_COLUMNS},
+    'recycling_centers': {'columns': LOCATION_COLUMNS},
+    'waste_collection_points': {'columns': LOCATION_COLUMNS},
+    'waste_treatment_facilities': {'columns': LOCATION_COLUMNS},
+
+    # Public litter bins
+    'street_bins': {'columns': {**LOCATION_COLUMNS, 'lib_level': 'category'}},
+
+    # Citizen feedback
+    'citizen_reports': {'columns': {
+        **LOCATION_COLUMNS,
+        'type': 'category',
+        'soustype': 'category',
+        'datedecl': 'datetime',
+        'conseilquartier': 'category'
+    }, 'time_column': 'datedecl'},
+
+    # Context & routing
+    'arrondissement_boundaries': {'columns': {
+        'c_ar': 'int', 'c_arinsee': 'int', 'l_ar': 'category', 'l_aroff': 'category',
+        'surface': 'float32', 'perimetre': 'float32'
+    }},
+    'neighborhoods': {'columns': {
+        'c_qu': 'int', 'c_quinsee': 'int', 'l_qu': 'category', 'c_ar': 'int',
+        'surface': 'float32', 'perimetre': 'float32'
+    }},
+    'road_network': {'columns': {
+        'l_longmin': 'category', 'l_voie': 'category', 'c_ar': 'int', 'longueur': 'float32'
+    }},
+
+    # Tabular statistics keep every column, only compacted
+    'waste_per_capita': {'columns': None},
+    'waste_statistics': {'columns': None},
+    'ghg_emissions': {'columns': None}
+}
+
+# Fields each downstream consumer reads, per dataset. The union is what the
+# fetcher asks the API for; datasets not listed here are fetched whole.
+POINT_DATASETS = [
+    'glass_igloos', 'trilib_stations', 'public_composters', 'textile_containers',
+    'recycling_centers', 'street_bins', 'waste_collection_points', 'waste_treatment_facilities'
+]
+
+CONSUMER_FIELDS: Dict[str, Dict[str, List[str]]] = {
+    # Marker popups and per-arrondissement filtering
+    'map_visualizer': {
+        **{name: ['nom', 'name', 'adresse', 'address', 'arrondissement', 'c_ar'] for name in POINT_DATASETS},
+        'arrondissement_boundaries': ['c_ar', 'l_ar'],
+        'neighborhoods': ['c_qu', 'l_qu', 'c_ar'],
+        'road_network': ['l_longmin', 'c_ar']
+    },
+    # Flow network nodes
+    'enrich_data': {
+        'waste_collection_points': ['nom'],
+        'citizen_reports': ['type', 'soustype']
+    },
+    # Partition keys of the partitioned store
+    'partitioned_store': {
+        'citizen_reports': ['arrondissement', 'c_ar', 'datedecl'],
+        'street_bins': ['arrondissement', 'c_ar'],
+        'road_network': ['c_ar']
+    }
+}
+
+
+def consumer_fields(dataset_name: str) -> Optional[List[str]]:
+    """Fields any consumer reads from a dataset, or None when it is used whole."""
+    fields = []
+    for datasets in CONSUMER_FIELDS.values():
+        fields.extend(datasets.get(dataset_name, []))
+    return sorted(set(fields)) if fields else None
+
+
+# Object columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def compact_dataset(df: pd.DataFrame, dataset_name: str, drop_unused: bool = True) -> pd.DataFrame:
+    """
+    Drop unused columns and convert the rest to compact dtypes.
+
+    Datasets without a declared column list keep all columns; their
+    low-cardinality strings still become categoricals and integers are
+    downcast. With ``drop_unused=False`` undeclared columns are kept too
+    (with inferred dtypes), for frames that are written to disk in full.
+    """
+    declared = DATASET_SCHEMAS.get(dataset_name, {'columns': None})['columns']
+    types = {**COMMON_COLUMNS, **declared} if declared is not None else dict(COMMON_COLUMNS)
+    if drop_unused:
+        df = drop_unused_columns(df, dataset_name)
+
+    converted = {}
+    for column in df.columns:
+        kind = types.get(column)
+        if kind == 'geometry' or column == getattr(df, '_geometry_column_name', None):
+            continue
+        series = df[column]
+        try:
+            if kind == 'category':
+                converted[column] = series.astype('category')
+            elif kind == 'int':
+                converted[column] = _downcast_integer(series)
+            elif kind == 'float32':
+                converted[column] = pd.to_numeric(series, errors='coerce').astype(np.float32)
+            elif kind == 'datetime':
+                converted[column] = pd.to_datetime(series, errors='coerce', utc=True)
+            elif kind is None:
+                converted[column] = _infer_compact(series)
+        except (TypeError, ValueError):
+            # Mixed or nested values (lists, dicts): leave the column as it is
+            continue
+
+    if converted:
+        df = df.assign(**converted)
+    return df
+
+
+def drop_unused_columns(df: pd.DataFrame, dataset_name: str) -> pd.DataFrame:
+    """Keep only a dataset's declared columns (all of them when none are declared)."""
+    declared = DATASET_SCHEMAS.get(dataset_name, {'columns': None})['columns']
+    if declared is None:
+        return df
+    return df[[c for c in df.columns if c in declared or c in COMMON_COLUMNS]]
+
+
+def memory_usage_bytes(df: pd.DataFrame) -> int:
+    """Deep memory usage of a dataset, including Python string payloads."""
+    usage = df.memory_usage(deep=True, index=True)
+    return int(usage.sum())
+
+
+def memory_report(datasets: Dict[str, pd.DataFrame]) -> Dict[str, Dict]:
+    """Rows and in-memory size per dataset, printed as a small table."""
+    report = {}
+    for name, df in sorted(datasets.items()):
+        if not isinstance(df, pd.DataFrame):
+            continue
+        report[name] = {'rows': len(df), 'bytes': memory_usage_bytes(df)}
+    total = sum(r['bytes'] for r in report.values())
+    for name, entry in report.items():
+        print(f"   {name:<28} {entry['rows']:>9,} rows  {entry['bytes'] / 2 ** 20:>8.2f} MB")
+    print(f"   {'total':<28} {'':>14}  {total / 2 ** 20:>8.2f} MB")
+    return report
+
+
+def write_geojson(gdf, output_file: Path):
+    """Write a compacted GeoDataFrame, converting dtypes GeoJSON drivers can't store."""
+    casts = {}
+    for column, dtype in gdf.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            casts[column] = object
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            casts[column] = str
+    if casts:
+        gdf = gdf.astype(casts)
+        for column, target in casts.items():
+            if target is str:
+                gdf[column] = gdf[column].replace('NaT', None)
+    gdf.to_file(output_file, driver='GeoJSON')
+
+
+def _downcast_integer(series: pd.Series) -> pd.Series:
+    numeric = pd.to_numeric(series, errors='coerce')
+    if numeric.isna().any():
+        if numeric.dropna().empty or (numeric.dropna() % 1 != 0).any():
+            return numeric.astype(np.float32)
+        for dtype in (pd.Int8Dtype(), pd.Int16Dtype(), pd.Int32Dtype(), pd.Int64Dtype()):
+            info = np.iinfo(dtype.numpy_dtype)
+            if numeric.min() >= info.min and numeric.max() <= info.max:
+                return numeric.astype(dtype)
+    return pd.to_numeric(numeric, downcast='integer')
+
+
+def _infer_compact(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return pd.to_numeric(series, downcast='integer')
+    if series.dtype == object and len(series) > 0:
+        unique = series.nunique(dropna=True)
+        if unique <= max(1, len(series) * CATEGORY_MAX_UNIQUE_RATIO):
+            return series.astype('category')
+    return series
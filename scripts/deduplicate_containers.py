@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Container deduplication for Paris garbage flow visualization.
+The legacy collection point dataset overlaps the per-type drop-off datasets
+(glass igloos, Trilib', textile containers, composters). Features are matched
+with a spatial-index proximity join plus address similarity, fully
+vectorised, and merged into one canonical container table that records
+which source features each container came from.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Paris Lambert 93 projection, used so distances are in metres
+METRIC_CRS = 'EPSG:2154'
+
+LEGACY_DATASET = 'waste_collection_points'
+TYPED_DATASETS = ['glass_igloos', 'trilib_stations', 'textile_containers', 'public_composters']
+
+# Waste type collected from each container type and trucked to treatment.
+# Textile containers and composters feed no modelled treatment flow.
+CONTAINER_WASTE_TYPES = {
+    LEGACY_DATASET: 'household_waste',
+    'trilib_stations': 'recyclables',
+    'glass_igloos': 'glass'
+}
+
+
+class ContainerDeduplicator:
+    """Matches legacy collection points to typed containers and builds a canonical table."""
+
+    def __init__(self, match_distance_m: float = 25.0, duplicate_distance_m: float = 1.0,
+                 min_score: float = 0.5):
+        """
+        Args:
+            match_distance_m: Search radius for legacy <-> typed container matches
+            duplicate_distance_m: Features of the same dataset closer than this are duplicates
+            min_score: Minimum combined distance/address score for a match
+        """
+        self.match_distance_m = match_distance_m
+        self.duplicate_distance_m = duplicate_distance_m
+        self.min_score = min_score
+
+    def deduplicate(self, datasets: Dict[str, gpd.GeoDataFrame]) -> gpd.GeoDataFrame:
+        """
+        Build the canonical container table.
+
+        Returns:
+            One row per physical container with 'container_id', 'container_type',
+            'name', 'address', 'arrondissement', 'sources' (datasets it appears
+            in), 'lineage' (dataset:record ids of the merged features),
+            'members' and geometry in WGS84
+        """
+        features = self._stack(datasets)
+        if len(features) == 0:
+            return gpd.GeoDataFrame(columns=['container_id', 'container_type', 'name', 'address',
+                                             'arrondissement', 'sources', 'lineage', 'members', 'geometry'],
+                                    geometry='geometry', crs='EPSG:4326')
+
+        left, right = self._match_pairs(features)
+        labels = _connected_labels(len(features), left, right)
+        canonical = self._canonical(features, labels)
+        print(f"✓ Deduplicated {len(features)} features into {len(canonical)} containers "
+              f"({len(features) - len(canonical)} duplicates merged)")
+        return canonical
+
+    def _stack(self, datasets: Dict[str, gpd.GeoDataFrame]) -> gpd.GeoDataFrame:
+        """All point features of the overlapping datasets in one metric frame."""
+        frames = []
+        for priority, name in enumerate(TYPED_DATASETS + [LEGACY_DATASET]):
+            gdf = datasets.get(name)
+            if gdf is None or len(gdf) == 0 or 'geometry' not in gdf:
+                continue
+            gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+            frames.append(pd.DataFrame({
+                'source': name,
+                'priority': priority,
+                'record_id': _column(gdf, ['_record_id'], gdf.index.astype(str)),
+                'name': _column(gdf, ['nom', 'name'], None),
+                'address': _column(gdf, ['adresse', 'address'], None),
+                'arrondissement': _column(gdf, ['arrondissement', 'c_ar'], None),
+                'geometry': gdf.geometry.representative_point().values
+            }))
+        if not frames:
+            return gpd.GeoDataFrame(geometry=[], crs=METRIC_CRS)
+        stacked = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), geometry='geometry', crs='EPSG:4326')
+        return stacked.to_crs(METRIC_CRS)
+
+    def _match_pairs(self, features: gpd.GeoDataFrame):
+        """Index pairs of features that describe the same container."""
+        geometries = np.asarray(features.geometry.values)
+        tree = shapely.STRtree(geometries)
+        left, right = tree.query(geometries, predicate='dwithin', distance=self.match_distance_m)
+        keep = left < right
+        left, right = left[keep], right[keep]
+
+        sources = features['source'].to_numpy()
+        legacy = sources == LEGACY_DATASET
+        distance = shapely.distance(geometries[left], geometries[right])
+
+        # Legacy points may match any typed container; within one dataset only
+        # near-identical positions are duplicates. Different typed datasets never merge.
+        cross = legacy[left] != legacy[right]
+        same = (sources[left] == sources[right]) & (distance <= self.duplicate_distance_m)
+
+        score = self._score(features, left, right, distance)
+        accepted = (cross & (score >= self.min_score)) | same
+        left, right, score, cross = left[accepted], right[accepted], score[accepted], cross[accepted]
+
+        # A legacy point merges with its best-scoring typed container only
+        legacy_side = np.where(legacy[left], left, right)
+        cross_idx = np.flatnonzero(cross)
+        order = cross_idx[np.lexsort((-score[cross_idx], legacy_side[cross_idx]))]
+        _, first = np.unique(legacy_side[order], return_index=True)
+        best = np.zeros(len(left), dtype=bool)
+        best[order[first]] = True
+        keep = best | ~cross
+        return left[keep], right[keep]
+
+    def _score(self, features: gpd.GeoDataFrame, left: np.ndarray, right: np.ndarray,
+               distance: np.ndarray) -> np.ndarray:
+        """Combined proximity and address similarity in [0, 1]."""
+        proximity = 1.0 - np.clip(distance / self.match_distance_m, 0.0, 1.0)
+
+        address = _normalize(features['address'])
+        numbers = address.str.extract(r'^(\d+)')[0].to_numpy(dtype=object)
+        streets = address.str.replace(r'^\d+\s*(bis|ter)?\s*', '', regex=True).to_numpy(dtype=object)
+        address = address.to_numpy(dtype=object)
+
+        known = (address[left] != '') & (address[right] != '')
+        same_street = known & (streets[left] == streets[right])
+        same_number = same_street & (numbers[left] == numbers[right])
+        # Missing addresses are neutral rather than evidence against a match
+        similarity = np.where(known, 0.5 * same_street + 0.5 * same_number, 0.5)
+        return 0.6 * proximity + 0.4 * similarity
+
+    def _canonical(self, features: gpd.GeoDataFrame, labels: np.ndarray) -> gpd.GeoDataFrame:
+        """One row per cluster, taking attributes from its highest-priority member."""
+        lineage = features['source'] + ':' + features['record_id'].astype(str)
+        features = features.assign(cluster=labels, lineage=lineage)
+        ordered = features.sort_values(['cluster', 'priority'], kind='stable')
+        heads = ordered.drop_duplicates('cluster')
+
+        grouped = ordered.groupby('cluster', sort=True)
+        sources = grouped['source'].agg(lambda s: ';'.join(dict.fromkeys(s)))
+        lineage = grouped['lineage'].agg(';'.join)
+        members = grouped.size()
+
+        # Fill missing attributes of the head from other members of the cluster
+        filled = grouped[['name', 'address', 'arrondissement']].first()
+
+        heads = heads.set_index('cluster')
+        canonical = gpd.GeoDataFrame({
+            'container_id': heads['source'] + ':' + heads['record_id'].astype(str),
+            'container_type': heads['source'],
+            'name': filled['name'],
+            'address': filled['address'],
+            'arrondissement': filled['arrondissement'],
+            'sources': sources,
+            'lineage': lineage,
+            'members': members
+        }, geometry=heads.geometry, crs=METRIC_CRS)
+        return canonical.reset_index(drop=True).to_crs('EPSG:4326')
+
+
+def legacy_only(containers: pd.DataFrame) -> pd.Series:
+    """Mask of containers known only from the legacy dataset."""
+    return containers['sources'] == LEGACY_DATASET
+
+
+def _column(gdf: pd.DataFrame, candidates: List[str], default) -> pd.Series:
+    for column in candidates:
+        if column in gdf.columns:
+            return gdf[column].astype(object).where(gdf[column].notna(), None).to_numpy()
+    if default is None:
+        return np.full(len(gdf), None, dtype=object)
+    return np.asarray(default, dtype=object)
+
+
+def _normalize(values: pd.Series) -> pd.Series:
+    """Lowercase, accent-free, single-spaced text ('' when missing)."""
+    text = values.fillna('').astype(str).str.lower()
+    text = text.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    return text.str.replace(r'[^a-z0-9 ]+', ' ', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def _connected_labels(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Union-find by min-label propagation: every feature gets its cluster's smallest index."""
+    labels = np.arange(n)
+    if len(left) == 0:
+        return labels
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[left], labels[right])
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        # Pointer jumping shortens chains so clusters converge in a few passes
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def main():
+    """Build the canonical container table from processed data."""
+    processed_dir = Path("data") / "processed"
+    datasets = {}
+    for name in TYPED_DATASETS + [LEGACY_DATASET]:
+        path = processed_dir / f"{name}.geojson"
+        if path.exists():
+            datasets[name] = gpd.read_file(path)
+    containers = ContainerDeduplicator().deduplicate(datasets)
+    output = Path("data") / "enriched" / "containers.geojson"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    containers.to_file(output, driver='GeoJSON')
+    print(f"Canonical containers saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Transport emissions ledger for Paris garbage flow analytics.
+Spreads each waste type's tonnage over the flow network's edges and the days
+of the collection calendar, giving an edges x days tonnage array. Emissions
+are that array times a per-edge coefficient (road distance x vehicle-class
+factors, loaded legs plus empty returns), so a new emission factor is one
+array multiplication. Totals are reconciled with the city's GHG inventory.
+
+Layout:
+    data/enriched/emissions_ledger/ledger.json     calendar, categories, factors
+    data/enriched/emissions_ledger/<array>.npy     one file per array
+"""
+
+import argparse
+import json
+import re
+import sys
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Allow running this file directly, e.g. python scripts/emissions_ledger.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.flow_graph import FlowGraph
+
+FORMAT_VERSION = 1
+
+# Indicative diesel factors: kg CO2 per tonne-km on loaded legs and per
+# vehicle-km on empty return legs, with the payload that sets the number of returns
+VEHICLE_CLASSES = {
+    'refuse_truck': {'payload_t': 10.0, 'loaded_kg_per_tkm': 0.11, 'empty_kg_per_km': 0.75},
+    'crane_truck': {'payload_t': 8.0, 'loaded_kg_per_tkm': 0.12, 'empty_kg_per_km': 0.80}
+}
+
+# Glass igloos are emptied by crane trucks, everything else by refuse trucks
+WASTE_VEHICLE_CLASS = {'glass': 'crane_truck'}
+DEFAULT_VEHICLE_CLASS = 'refuse_truck'
+
+# Waste type received by each treatment facility type
+FACILITY_WASTE_TYPES = {
+    'incineration': 'household_waste',
+    'recycling': 'recyclables',
+    'recycling_center': 'recyclables',
+    'glass_processing': 'glass',
+    'composting': 'organic_waste'
+}
+
+# Road distance over great-circle distance for urban trips
+ROAD_DETOUR_FACTOR = 1.3
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class EmissionsLedger:
+    """Per-edge, per-day tonnage and transport emissions of the flow network."""
+
+    ARRAYS = ['tonnage', 'sources', 'targets', 'waste_codes', 'class_codes', 'distance_km']
+
+    def __init__(self, arrays: Dict[str, np.ndarray], waste_types: List[str], start: date,
+                 node_ids: np.ndarray, node_names: np.ndarray, node_arrondissement: np.ndarray,
+                 vehicle_classes: Optional[Dict[str, Dict]] = None):
+        """
+        Args:
+            arrays: 'tonnage' (edges x days, float32) and the per-edge 'sources',
+                'targets' (node indices), 'waste_codes', 'class_codes' and 'distance_km'
+            waste_types: Categories behind ``waste_codes``
+            start: Date of the first day column
+            node_ids: Node ids, indexed by ``sources``/``targets``
+            node_names: Node display names
+            node_arrondissement: Arrondissement of each node (NaN if unknown)
+            vehicle_classes: Factors per vehicle class (VEHICLE_CLASSES by default)
+        """
+        self.arrays = arrays
+        self.waste_types = list(waste_types)
+        self.start = start
+        self.node_ids = node_ids
+        self.node_names = node_names
+        self.node_arrondissement = node_arrondissement
+        self.vehicle_classes = vehicle_classes or VEHICLE_CLASSES
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def days(self) -> int:
+        return self.tonnage.shape[1]
+
+    @property
+    def class_names(self) -> List[str]:
+        return list(self.vehicle_classes)
+
+    @classmethod
+    def from_graph(cls, graph: FlowGraph, flows: Dict, facility_types: Dict[str, str],
+                   start: Optional[date] = None, days: int = 365) -> "EmissionsLedger":
+        """
+        Build the ledger from the flow graph and the waste flow estimates.
+
+        Args:
+            graph: Flow network; edge weights set each edge's share of its waste type
+            flows: Output of ``DataEnricher.estimate_waste_flows``
+            facility_types: Treatment type of each facility node id
+            start: First day of the calendar (1 January of the current year by default)
+            days: Calendar length
+        """
+        start = start or date(date.today().year, 1, 1)
+        annual = flows['annual_tonnage']
+        schedule = flows['collection_flows']['collection_schedule']
+        waste_types = list(annual)
+
+        sources = np.repeat(np.arange(graph.node_count), np.diff(graph.indptr))
+        targets = np.asarray(graph.indices, dtype=np.int64)
+        target_waste = [FACILITY_WASTE_TYPES.get(facility_types.get(node_id, ''))
+                        for node_id in graph.node_ids[targets]]
+        waste_codes = np.array([waste_types.index(w) if w in waste_types else -1 for w in target_waste],
+                               dtype=np.int64)
+        known = waste_codes >= 0
+        if not known.all():
+            print(f"Warning: {int((~known).sum())} edges lead to facilities with no modelled waste type")
+        sources, targets, waste_codes = sources[known], targets[known], waste_codes[known]
+        weights = np.asarray(graph.weights, dtype=np.float64)[known]
+
+        # Each edge carries its share of its waste type; equal shares if weights are all zero
+        totals = np.bincount(waste_codes, weights=weights, minlength=len(waste_types))
+        counts = np.bincount(waste_codes, minlength=len(waste_types))
+        share = np.where(totals[waste_codes] > 0,
+                         weights / np.where(totals > 0, totals, 1)[waste_codes],
+                         1.0 / np.maximum(counts[waste_codes], 1))
+
+        calendar = collection_calendar(schedule, waste_types, start, days)
+        collection_days = calendar.sum(axis=1)
+        period_tonnage = np.array([annual[w] for w in waste_types], dtype=np.float64) * days / 365
+        per_collection = np.divide(period_tonnage, collection_days,
+                                   out=np.zeros_like(period_tonnage), where=collection_days > 0)
+        tonnage = (share * per_collection[waste_codes]).astype(np.float32)[:, None] * calendar[waste_codes]
+
+        class_names = list(VEHICLE_CLASSES)
+        class_codes = np.array([class_names.index(WASTE_VEHICLE_CLASS.get(w, DEFAULT_VEHICLE_CLASS))
+                                for w in waste_types], dtype=np.int8)[waste_codes]
+        distance_km = haversine_km(graph.lon[sources], graph.lat[sources],
+                                   graph.lon[targets], graph.lat[targets]) * ROAD_DETOUR_FACTOR
+
+        arrondissement = (np.asarray(graph.node_arrondissement) if 'arrondissement' in graph.node_columns
+                          else np.full(graph.node_count, np.nan))
+        return cls({
+            'tonnage': tonnage,
+            'sources': sources.astype(np.int64),
+            'targets': targets,
+            'waste_codes': waste_codes.astype(np.int8),
+            'class_codes': class_codes,
+            'distance_km': np.nan_to_num(distance_km).astype(np.float32)
+        }, waste_types, start, np.asarray(graph.node_ids), np.asarray(graph.node_names), arrondissement)
+
+    def coefficients(self, vehicle_classes: Optional[Dict[str, Dict]] = None) -> np.ndarray:
+        """kg CO2 per tonne carried on each edge, loaded leg plus its share of empty returns."""
+        classes = {**self.vehicle_classes, **(vehicle_classes or {})}
+        per_tonne_km = np.array([
+            classes[name]['loaded_kg_per_tkm'] + classes[name]['empty_kg_per_km'] / classes[name]['payload_t']
+            for name in self.class_names
+        ], dtype=np.float32)
+        return self.distance_km * per_tonne_km[self.class_codes]
+
+    def emissions(self, vehicle_classes: Optional[Dict[str, Dict]] = None) -> np.ndarray:
+        """
+        kg CO2 per edge and day.
+
+        Args:
+            vehicle_classes: Factor overrides per class, e.g.
+                ``{'refuse_truck': {..., 'loaded_kg_per_tkm': 0.05}}``
+        """
+        return self.tonnage * self.coefficients(vehicle_classes)[:, None]
+
+    def loaded_tkm(self) -> np.ndarray:
+        """Tonne-km carried per edge and day."""
+        return self.tonnage * self.distance_km[:, None]
+
+    def empty_km(self) -> np.ndarray:
+        """Empty return vehicle-km per edge and day (one return per payload delivered)."""
+        payload = np.array([self.vehicle_classes[name]['payload_t'] for name in self.class_names], dtype=np.float32)
+        return self.tonnage * (self.distance_km / payload[self.class_codes])[:, None]
+
+    def by_waste_type(self, emissions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Tonnage, tonne-km and emissions over the calendar per waste type."""
+        return self._aggregate(self.waste_codes, np.asarray(self.waste_types, dtype=object), 'waste_type', emissions)
+
+    def by_facility(self, emissions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Tonnage, tonne-km and emissions over the calendar per receiving facility."""
+        return self._aggregate(self.targets, self.node_names, 'facility', emissions)
+
+    def by_arrondissement(self, emissions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Tonnage, tonne-km and emissions over the calendar per arrondissement of origin (0 if unknown)."""
+        arrondissement = np.nan_to_num(self.node_arrondissement[self.sources]).astype(np.int64)
+        return self._aggregate(arrondissement, np.arange(arrondissement.max(initial=0) + 1),
+                               'arrondissement', emissions)
+
+    def daily(self, emissions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Tonnage and emissions per calendar day."""
+        emissions = self.emissions() if emissions is None else emissions
+        return pd.DataFrame({
+            'date': pd.date_range(self.start, periods=self.days, freq='D'),
+            'tonnage': self.tonnage.sum(axis=0, dtype=np.float64),
+            'kg_co2': emissions.sum(axis=0, dtype=np.float64)
+        })
+
+    def reconcile(self, inventory: Optional[pd.DataFrame],
+                  emissions: Optional[np.ndarray] = None) -> Dict[str, Optional[float]]:
+        """
+        Compare the ledger's annualised total with the GHG inventory.
+
+        The inventory's columns are found by name: a numeric emissions value
+        (tonnes CO2e, or kilotonnes when the column name says so), an
+        optional year to keep the latest edition, and an optional sector
+        used to isolate the waste sector.
+        """
+        emissions = self.emissions() if emissions is None else emissions
+        ledger_t = float(emissions.sum(dtype=np.float64)) * 365 / self.days / 1000
+        result = {'ledger_t_co2_per_year': round(ledger_t, 3), 'inventory_year': None,
+                  'inventory_total_t': None, 'inventory_waste_t': None,
+                  'share_of_total': None, 'share_of_waste': None}
+        if inventory is None or len(inventory) == 0:
+            return result
+
+        numeric = {c: pd.to_numeric(inventory[c], errors='coerce') for c in inventory.columns}
+        value = next((c for c in inventory.columns
+                      if re.search(r'emission|teq|co2', c.lower()) and numeric[c].notna().any()), None)
+        if value is None:
+            print("Warning: no emissions column found in the GHG inventory")
+            return result
+        year = next((c for c in inventory.columns if re.match(r'annee|year', c.lower())), None)
+        sector = next((c for c in inventory.columns if re.search(r'secteur|sector|poste', c.lower())), None)
+
+        frame = inventory.assign(_value=numeric[value].fillna(0))
+        if 'kt' in value.lower():
+            frame['_value'] *= 1000
+        if year is not None:
+            years = pd.to_numeric(frame[year], errors='coerce')
+            result['inventory_year'] = int(years.max()) if years.notna().any() else None
+            frame = frame[years == years.max()]
+
+        total = float(frame['_value'].sum())
+        result['inventory_total_t'] = round(total, 1)
+        result['share_of_total'] = round(ledger_t / total, 6) if total else None
+        if sector is not None:
+            waste = frame[sector].astype(str).str.contains(r'd[ée]chet|waste', case=False, regex=True)
+            waste_t = float(frame.loc[waste, '_value'].sum())
+            result['inventory_waste_t'] = round(waste_t, 1)
+            result['share_of_waste'] = round(ledger_t / waste_t, 6) if waste_t else None
+        return result
+
+    def summary(self, inventory: Optional[pd.DataFrame] = None) -> Dict:
+        """Totals per waste type and the inventory reconciliation, for the flow estimates."""
+        emissions = self.emissions()
+        per_type = self.by_waste_type(emissions).set_index('waste_type')
+        return {
+            'start': self.start.isoformat(),
+            'days': self.days,
+            'kg_co2_by_waste_type': per_type['kg_co2'].round(1).to_dict(),
+            'total_kg_co2': round(float(emissions.sum(dtype=np.float64)), 1),
+            'reconciliation': self.reconcile(inventory, emissions)
+        }
+
+    def save(self, directory: Path, inventory: Optional[pd.DataFrame] = None) -> Path:
+        """Write every array as .npy next to a JSON header with the summary."""
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {**self.arrays, 'node_ids': np.asarray(self.node_ids, dtype=str),
+                  'node_names': np.asarray(self.node_names, dtype=str),
+                  'node_arrondissement': np.asarray(self.node_arrondissement, dtype=np.float64)}
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+        with open(directory / "ledger.json", 'w') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'start': self.start.isoformat(),
+                'waste_types': self.waste_types,
+                'vehicle_classes': self.vehicle_classes,
+                'summary': self.summary(inventory)
+            }, f, indent=2)
+        return directory
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "EmissionsLedger":
+        """Load a saved ledger; arrays are memory-mapped unless ``mmap`` is False."""
+        with open(directory / "ledger.json") as f:
+            header = json.load(f)
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported emissions ledger version: {header.get('version')}")
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in cls.ARRAYS}
+        nodes = {name: np.load(directory / f"{name}.npy")
+                 for name in ('node_ids', 'node_names', 'node_arrondissement')}
+        return cls(arrays, header['waste_types'], date.fromisoformat(header['start']),
+                   nodes['node_ids'], nodes['node_names'], nodes['node_arrondissement'],
+                   header['vehicle_classes'])
+
+    def _aggregate(self, keys: np.ndarray, labels: np.ndarray, name: str,
+                   emissions: Optional[np.ndarray]) -> pd.DataFrame:
+        emissions = self.emissions() if emissions is None else emissions
+        tonnage = self.tonnage.sum(axis=1, dtype=np.float64)
+        n = len(labels)
+        result = pd.DataFrame({
+            name: labels,
+            'tonnage': np.bincount(keys, weights=tonnage, minlength=n),
+            'tonne_km': np.bincount(keys, weights=tonnage * self.distance_km, minlength=n),
+            'kg_co2': np.bincount(keys, weights=emissions.sum(axis=1, dtype=np.float64), minlength=n)
+        })
+        result = result[np.bincount(keys, minlength=n) > 0]
+        return result.sort_values('kg_co2', ascending=False, ignore_index=True)
+
+
+def collection_calendar(schedule: Dict[str, Dict], waste_types: List[str], start: date, days: int) -> np.ndarray:
+    """
+    Collection days of each waste type (waste types x days, bool).
+
+    Types collected n times a week use n weekdays spread over Monday to
+    Saturday; types collected less than weekly are collected on Mondays
+    every 1/n weeks. Types without a schedule are never collected.
+    """
+    offset = np.arange(days) + start.weekday()
+    weekday, week = offset % 7, offset // 7
+    calendar = np.zeros((len(waste_types), days), dtype=bool)
+    for i, waste_type in enumerate(waste_types):
+        per_week = schedule.get(waste_type, {}).get('days_per_week', 0)
+        if per_week >= 1:
+            n = min(int(round(per_week)), 6)
+            calendar[i] = np.isin(weekday, (np.arange(n) * 6) // n)
+        elif per_week > 0:
+            calendar[i] = (weekday == 0) & (week % int(round(1 / per_week)) == 0)
+    return calendar
+
+
+def haversine_km(lon1: np.ndarray, lat1: np.ndarray, lon2: np.ndarray, lat2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in kilometres."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def main():
+    """Print emissions of the saved ledger, optionally with a different loaded-leg factor."""
+    parser = argparse.ArgumentParser(description="Query the transport emissions ledger")
+    parser.add_argument('--ledger', type=Path, default=Path("data") / "enriched" / "emissions_ledger",
+                        help='Saved ledger directory')
+    parser.add_argument('--loaded-factor', type=float,
+                        help='Loaded-leg kg CO2 per tonne-km applied to every vehicle class')
+    args = parser.parse_args()
+
+    ledger = EmissionsLedger.load(args.ledger)
+    overrides = None
+    if args.loaded_factor is not None:
+        overrides = {name: {**factors, 'loaded_kg_per_tkm': args.loaded_factor}
+                     for name, factors in ledger.vehicle_classes.items()}
+    emissions = ledger.emissions(overrides)
+
+    print(f"Emissions ledger: {ledger.tonnage.shape[0]} edges x {ledger.days} days from {ledger.start}")
+    print(f"Total: {emissions.sum(dtype=np.float64) / 1000:,.1f} t CO2\n")
+    print(ledger.by_waste_type(emissions).to_string(index=False))
+    print()
+    print(ledger.by_arrondissement(emissions).to_string(index=False))
+    print()
+    print(ledger.by_facility(emissions).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,57 +8,148 @@ import pandas as pd
 import geopandas as gpd
 import json
 import requests
+import sys
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import numpy as np
 
+# Allow running this file directly, e.g. python scripts/enrich_data.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.coverage_raster import CoverageAnalyzer, CoverageRaster
+from scripts.dataset_context import DatasetContext
+from scripts.dataset_schemas import compact_dataset, memory_report
+from scripts.deduplicate_containers import CONTAINER_WASTE_TYPES, ContainerDeduplicator
+from scripts.emissions_ledger import FACILITY_WASTE_TYPES, EmissionsLedger
+from scripts.flow_graph import FlowGraph
+from scripts.partitioned_store import PartitionedStore
+from scripts.pipeline_metrics import PipelineMetrics
+from scripts.siting_optimizer import ARRONDISSEMENT_POPULATION, SitingOptimizer
+from scripts.tonnage_series import SERIES_DATASETS, PeriodLike, TonnageSeries
+
+# Research-based generation rates (kg/person/year, ADEME data), used for
+# waste types the fetched statistics don't cover
+DEFAULT_WASTE_RATES = {
+    'household_waste': 254,  # Ordures ménagères résiduelles
+    'recyclables': 85,       # Emballages et papiers
+    'glass': 38,             # Verre
+    'organic_waste': 45,     # Bio-déchets (when collected separately)
+    'bulky_waste': 25,       # Encombrants
+    'electronic_waste': 12   # DEEE
+}
+
+# Published rates further than this factor from the research-based rate are
+# taken to be misread columns or units and ignored
+RATE_PLAUSIBILITY_FACTOR = 10
+
 class DataEnricher:
     """Enriches waste management data with research-based estimates and flow modeling."""
     
-    def __init__(self, data_dir: Path = Path("data")):
+    def __init__(self, data_dir: Path = Path("data"), metrics: Optional[PipelineMetrics] = None):
         self.data_dir = data_dir
+        self.metrics = metrics or PipelineMetrics(enabled=False)
         self.processed_dir = data_dir / "processed"
         self.enriched_dir = data_dir / "enriched"
         self.enriched_dir.mkdir(exist_ok=True)
+        self.store = PartitionedStore(self.processed_dir / "partitioned")
         
-    def load_processed_data(self) -> Dict[str, pd.DataFrame]:
-        """Load all processed datasets."""
-        datasets = {}
+    def load_processed_data(self, context: Optional[DatasetContext] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Load all processed datasets.
+        
+        Datasets already held by the context are reused as-is; the remaining
+        files are read from disk and registered with the context for later
+        stages (the same rule ``GarbageFlowVisualizer.load_data`` applies).
+        Partitioned datasets are not loaded here; stream them with
+        ``iter_dataset`` instead.
+        """
+        datasets = context.get_datasets() if context is not None else {}
+        if datasets:
+            print(f"Reusing {len(datasets)} in-memory datasets")
         
         for file_path in self.processed_dir.glob("*.geojson"):
             name = file_path.stem
+            if name in datasets:
+                continue
             try:
-                gdf = gpd.read_file(file_path)
+                gdf = compact_dataset(gpd.read_file(file_path), name)
                 datasets[name] = gdf
+                if context is not None:
+                    context.add_dataset(name, gdf)
                 print(f"Loaded {name}: {len(gdf)} records")
             except Exception as e:
                 print(f"Error loading {name}: {e}")
+        
+        if datasets:
+            print("In-memory size per dataset:")
+            for name, entry in memory_report(datasets).items():
+                self.metrics.observe('dataset_memory_bytes', entry['bytes'], dataset=name)
                 
         return datasets
         
-    def estimate_waste_flows(self) -> Dict[str, any]:
+    def iter_dataset(self, name: str, chunk_rows: int = 100_000, **filters) -> Iterator[gpd.GeoDataFrame]:
         """
-        Estimate waste flows for 14th arrondissement based on research data.
+        Stream a dataset in chunks without loading it whole.
+        
+        Partitioned datasets are read with partition pruning and the given
+        filters (arrondissements, since, until, columns, filters); datasets
+        stored as a single GeoJSON file are read once and sliced.
+        """
+        if self.store.has(name):
+            yield from self.store.iter_chunks(name, chunk_rows=chunk_rows, **filters)
+            return
+        
+        file_path = self.processed_dir / f"{name}.geojson"
+        if not file_path.exists():
+            return
+        gdf = compact_dataset(gpd.read_file(file_path), name)
+        for start in range(0, len(gdf), chunk_rows):
+            yield gdf.iloc[start:start + chunk_rows]
+            
+    def count_by(self, name: str, column: str, **filters) -> pd.Series:
+        """Count rows per value of ``column``, reading only that column chunk by chunk."""
+        counts = pd.Series(dtype='int64')
+        for chunk in self.iter_dataset(name, columns=[column], **filters):
+            if column in chunk.columns:
+                counts = counts.add(chunk[column].astype(str).value_counts(), fill_value=0)
+        return counts.astype('int64').sort_values(ascending=False)
+        
+    def estimate_waste_flows(self, period: Optional[PeriodLike] = None, arrondissement: int = 14,
+                             series: Optional[TonnageSeries] = None) -> Dict[str, any]:
+        """
+        Estimate waste flows for an arrondissement (the 14th by default, 0 for
+        Paris as a whole).
+        
+        Generation rates come from the fetched tonnage statistics for ``period``
+        (a year, a month, or the latest year with data by default); waste types
+        without published figures, or with implausible ones, keep
+        research-based rates.
         Sources: ADEME, Paris waste management reports, EU waste statistics.
         """
+        population = (sum(ARRONDISSEMENT_POPULATION.values()) if arrondissement == 0
+                      else ARRONDISSEMENT_POPULATION[arrondissement])
         
-        # Research-based estimates for Paris 14th arrondissement
-        population_14th = 140000  # Approximate population
-        
-        # Waste generation rates (kg/person/year) - based on ADEME data
-        waste_rates = {
-            'household_waste': 254,  # Ordures ménagères résiduelles
-            'recyclables': 85,       # Emballages et papiers
-            'glass': 38,             # Verre
-            'organic_waste': 45,     # Bio-déchets (when collected separately)
-            'bulky_waste': 25,       # Encombrants
-            'electronic_waste': 12   # DEEE
-        }
+        waste_rates = dict(DEFAULT_WASTE_RATES)
+        series = series if series is not None else self.load_tonnage_series()
+        rates_period = None
+        if series is not None:
+            published, rates_period = series.rates(arrondissement, ARRONDISSEMENT_POPULATION, period)
+            for waste_type, rate in published.items():
+                if waste_type not in waste_rates:
+                    continue
+                default = DEFAULT_WASTE_RATES[waste_type]
+                if default / RATE_PLAUSIBILITY_FACTOR <= rate <= default * RATE_PLAUSIBILITY_FACTOR:
+                    waste_rates[waste_type] = rate
+                else:
+                    print(f"Warning: ignoring published {waste_type} rate of {rate:.1f} kg/person/year "
+                          f"(research-based rate {default})")
+        if period is not None and rates_period is None:
+            print(f"No tonnage statistics for {period}; using research-based rates")
         
-        # Calculate annual tonnage for 14th arrondissement
+        # Calculate annual tonnage for the arrondissement
         annual_tonnage = {}
         for waste_type, rate_per_person in waste_rates.items():
-            annual_tonnage[waste_type] = (population_14th * rate_per_person) / 1000  # Convert to tonnes
+            annual_tonnage[waste_type] = (population * rate_per_person) / 1000  # Convert to tonnes
             
         # Collection frequency and flow modeling
         collection_flows = self._model_collection_flows(annual_tonnage)
@@ -67,7 +158,9 @@ class DataEnricher:
         treatment_flows = self._model_treatment_flows(annual_tonnage)
         
         return {
-            'population': population_14th,
+            'population': population,
+            'rates_period': rates_period,
+            'waste_rates': waste_rates,
             'annual_tonnage': annual_tonnage,
             'collection_flows': collection_flows,
             'treatment_flows': treatment_flows
@@ -192,8 +285,14 @@ class DataEnricher:
         emission_factor = 0.8
         return tonnage * distance_km * emission_factor
         
-    def create_flow_network(self, datasets: Dict[str, pd.DataFrame]) -> gpd.GeoDataFrame:
-        """Create a network representation of waste flows."""
+    def create_flow_network(self, datasets: Dict[str, pd.DataFrame],
+                            context: Optional[DatasetContext] = None) -> gpd.GeoDataFrame:
+        """
+        Create a network representation of waste flows.
+        
+        When a context is given, the network is handed to it directly and the
+        enriched files are written in the background.
+        """
         
         flows = self.estimate_waste_flows()
         
@@ -201,17 +300,33 @@ class DataEnricher:
         nodes = []
         edges = []
         
+        # Each physical container once, merged across the overlapping datasets
+        with self.metrics.stage('container_dedup'):
+            containers = ContainerDeduplicator().deduplicate(datasets)
+        
+        arrondissements = pd.to_numeric(
+            containers['arrondissement'].astype(str).str.extract(r'(\d+)')[0], errors='coerce') % 100
+        
+        # Each waste type's daily tonnage is split evenly over the containers collecting it
+        waste_types = containers['container_type'].map(CONTAINER_WASTE_TYPES)
+        per_container = {
+            waste_type: flows['collection_flows']['daily_flows'].get(waste_type, 0) / count
+            for waste_type, count in waste_types.value_counts().items()
+        }
+        
         # Collection points as source nodes
-        if 'waste_collection_points' in datasets:
-            collection_points = datasets['waste_collection_points']
-            for idx, point in collection_points.iterrows():
-                nodes.append({
-                    'id': f"collection_{idx}",
-                    'type': 'collection',
-                    'name': point.get('nom', f'Collection Point {idx}'),
-                    'geometry': point['geometry'],
-                    'daily_capacity_kg': 500  # Estimated
-                })
+        for idx, point in containers.iterrows():
+            nodes.append({
+                'id': f"collection_{idx}",
+                'type': 'collection',
+                'name': point['name'] if pd.notna(point['name']) else f'Collection Point {idx}',
+                'geometry': point['geometry'],
+                'daily_capacity_kg': 500,  # Estimated
+                'container_id': point['container_id'],
+                'sources': point['sources'],
+                'waste_type': waste_types[idx],
+                'arrondissement': arrondissements[idx]
+            })
                 
         # Treatment facilities as destination nodes
         treatment_destinations = [
@@ -230,29 +345,184 @@ class DataEnricher:
                 'treatment_type': dest['type']
             })
             
-        # Create flow edges (simplified)
-        for i, collection_node in enumerate([n for n in nodes if n['type'] == 'collection']):
-            for treatment_node in [n for n in nodes if n['type'] == 'treatment']:
+        # Each container ships its share of its waste type to the facilities treating it
+        facilities = {}
+        for treatment_node in [n for n in nodes if n['type'] == 'treatment']:
+            waste_type = FACILITY_WASTE_TYPES.get(treatment_node['treatment_type'])
+            facilities.setdefault(waste_type, []).append(treatment_node['id'])
+        for collection_node in [n for n in nodes if n['type'] == 'collection']:
+            targets = facilities.get(collection_node['waste_type'], [])
+            for target in targets:
                 edges.append({
                     'source': collection_node['id'],
-                    'target': treatment_node['id'],
+                    'target': target,
                     'flow_type': 'waste_transport',
-                    'estimated_daily_tonnage': flows['collection_flows']['daily_flows'].get('household_waste', 0) / 10
+                    'waste_type': collection_node['waste_type'],
+                    'estimated_daily_tonnage': per_container[collection_node['waste_type']] / len(targets)
                 })
                 
-        # Save enriched data
         nodes_gdf = gpd.GeoDataFrame(nodes)
+        with self.metrics.stage('flow_graph_build'):
+            graph = FlowGraph.from_network(nodes_gdf, edges)
+            
+        # Per-edge, per-day transport emissions, reconciled with the GHG inventory
+        with self.metrics.stage('emissions_ledger'):
+            facility_types = {n['id']: n['treatment_type'] for n in nodes if n['type'] == 'treatment'}
+            ledger = EmissionsLedger.from_graph(graph, flows, facility_types)
+            inventory = self.load_ghg_inventory()
+            flows['transport_emissions'] = ledger.summary(inventory)
+        self.metrics.observe('transport_kg_co2', flows['transport_emissions']['total_kg_co2'])
+        
+        # Save enriched data
+        if context is not None:
+            context.set_enriched('nodes', nodes_gdf)
+            context.set_enriched('edges', edges)
+            context.set_enriched('flow_estimates', flows)
+            context.set_enriched('flow_graph', graph)
+            context.set_enriched('containers', containers)
+            context.set_enriched('emissions_ledger', ledger)
+            context.persist("flow network", self._save_flow_network, nodes_gdf, edges, flows, graph)
+            context.persist("containers.geojson", self._save_containers, containers)
+            context.persist("emissions ledger", ledger.save, self.enriched_dir / "emissions_ledger", inventory)
+        else:
+            with self.metrics.stage('flow_network_write'):
+                self._save_flow_network(nodes_gdf, edges, flows, graph)
+                self._save_containers(containers)
+                ledger.save(self.enriched_dir / "emissions_ledger", inventory)
+            
+        self.metrics.observe('flow_nodes', len(nodes))
+        self.metrics.observe('flow_edges', len(edges))
+        print(f"Created flow network: {len(nodes)} nodes, {len(edges)} edges")
+        return nodes_gdf
+        
+    def analyze_coverage(self, datasets: Dict[str, pd.DataFrame],
+                         context: Optional[DatasetContext] = None,
+                         arrondissements: Optional[Iterable[int]] = None) -> Optional[CoverageRaster]:
+        """
+        Build the nearest drop-off distance raster with per-quartier summaries.
+
+        Only ``arrondissements`` are analysed (by default those whose drop-off
+        points were fetched). When a context is given, the raster is handed to
+        it directly and written in the background.
+        """
+        with self.metrics.stage('coverage_raster'):
+            coverage = CoverageAnalyzer().build(datasets, arrondissements)
+        if coverage is None:
+            return None
+
+        if context is not None:
+            context.set_enriched('coverage', coverage)
+            context.persist("coverage raster", coverage.save, self.enriched_dir / "coverage")
+        else:
+            with self.metrics.stage('coverage_write'):
+                coverage.save(self.enriched_dir / "coverage")
+        self.metrics.observe('coverage_cells', int((coverage.arrondissements > 0).sum()))
+        return coverage
+
+    def propose_sites(self, datasets: Dict[str, pd.DataFrame], k: int = 50,
+                      context: Optional[DatasetContext] = None,
+                      arrondissements: Optional[Iterable[int]] = None) -> Optional[gpd.GeoDataFrame]:
+        """
+        Propose ``k`` new Trilib'/glass stations minimising population-weighted access distance.
+        
+        Sites are only proposed in ``arrondissements`` (by default those whose
+        existing stations were fetched). When a context is given, the sites
+        are handed to it directly and written in the background.
+        """
+        with self.metrics.stage('station_siting'):
+            sites = SitingOptimizer(k=k).propose(datasets, arrondissements)
+        if sites is None:
+            return None
+        
+        if context is not None:
+            context.set_enriched('proposed_sites', sites)
+            context.persist("proposed_sites.geojson", self._save_proposed_sites, sites)
+        else:
+            self._save_proposed_sites(sites)
+        self.metrics.observe('proposed_sites', len(sites))
+        return sites
+        
+    def _save_proposed_sites(self, sites: gpd.GeoDataFrame):
+        sites.to_file(self.enriched_dir / "proposed_sites.geojson", driver='GeoJSON')
+        
+    def _save_containers(self, containers: gpd.GeoDataFrame):
+        """Write the canonical container table with its source lineage."""
+        containers.to_file(self.enriched_dir / "containers.geojson", driver='GeoJSON')
+        
+    def load_ghg_inventory(self) -> Optional[pd.DataFrame]:
+        """The fetched GHG emissions inventory as a flat table, if it was fetched."""
+        return self._load_raw_table('ghg_emissions')
+        
+    def load_tonnage_series(self) -> Optional[TonnageSeries]:
+        """
+        The waste tonnage time series, memory-mapped from disk.
+        
+        It is rebuilt from the fetched per-capita and tonnage statistics when
+        they are newer than the saved series.
+        """
+        series_dir = self.processed_dir / "tonnage_series"
+        header = series_dir / "series.json"
+        raw_files = [self.data_dir / "raw" / f"{name}.json" for name in SERIES_DATASETS]
+        raw_files = [path for path in raw_files if path.exists()]
+        if header.exists() and all(path.stat().st_mtime <= header.stat().st_mtime for path in raw_files):
+            return TonnageSeries.load(series_dir)
+        if not raw_files:
+            return None
+        
+        with self.metrics.stage('tonnage_series'):
+            tables = {name: self._load_raw_table(name) for name in SERIES_DATASETS}
+            series = TonnageSeries.from_tables({name: t for name, t in tables.items() if t is not None})
+            series.save(series_dir)
+        print(f"✓ Tonnage series: {len(series.waste_types)} waste types, "
+              f"{len(series.years)} years")
+        return series
+        
+    def _load_raw_table(self, dataset_name: str) -> Optional[pd.DataFrame]:
+        """A fetched tabular dataset as a flat table of its record fields."""
+        raw_file = self.data_dir / "raw" / f"{dataset_name}.json"
+        if not raw_file.exists():
+            return None
+        try:
+            with open(raw_file, encoding='utf-8') as f:
+                records = json.load(f).get('records', [])
+        except (OSError, ValueError) as e:
+            print(f"Error loading {dataset_name}: {e}")
+            return None
+        return pd.DataFrame([record.get('fields', {}) for record in records])
+        
+    def load_emissions_ledger(self, context: Optional[DatasetContext] = None) -> Optional[EmissionsLedger]:
+        """The emissions ledger built in this run, or the saved one memory-mapped from disk."""
+        if context is not None and context.get_enriched('emissions_ledger') is not None:
+            return context.get_enriched('emissions_ledger')
+        ledger_dir = self.enriched_dir / "emissions_ledger"
+        if not (ledger_dir / "ledger.json").exists():
+            return None
+        return EmissionsLedger.load(ledger_dir)
+        
+    def load_flow_graph(self, context: Optional[DatasetContext] = None) -> Optional[FlowGraph]:
+        """The flow graph built in this run, or the saved one memory-mapped from disk."""
+        if context is not None and context.get_enriched('flow_graph') is not None:
+            return context.get_enriched('flow_graph')
+        graph_dir = self.enriched_dir / "flow_graph"
+        if not (graph_dir / "graph.json").exists():
+            return None
+        return FlowGraph.load(graph_dir)
+        
+    def _save_flow_network(self, nodes_gdf: gpd.GeoDataFrame, edges: List[Dict], flows: Dict[str, any],
+                           graph: Optional[FlowGraph] = None):
+        """Write flow nodes, edges, the CSR flow graph and estimates to the enriched directory."""
         nodes_gdf.to_file(self.enriched_dir / "flow_nodes.geojson", driver='GeoJSON')
         
         edges_df = pd.DataFrame(edges)
-        edges_df.to_json(self.enriched_dir / "flow_edges.json", orient='records', indent=2)
+        edges_df.to_json(self.enriched_dir / "flow_edges.json", orient='records')
+        
+        # Compact adjacency for analytics queries, loadable memory-mapped
+        graph = graph or FlowGraph.from_network(nodes_gdf, edges_df)
+        graph.save(self.enriched_dir / "flow_graph")
         
         # Save flow estimates
         with open(self.enriched_dir / "waste_flow_estimates.json", 'w') as f:
             json.dump(flows, f, indent=2, default=str)
-            
-        print(f"Created flow network: {len(nodes)} nodes, {len(edges)} edges")
-        return nodes_gdf
 
 def main():
     """Main execution function."""
@@ -270,6 +540,8 @@ def main():
         
     # Create flow network
     flow_network = enricher.create_flow_network(datasets)
+    enricher.analyze_coverage(datasets)
+    enricher.propose_sites(datasets)
     
     print("-" * 50)
     print("Data enrichment completed!")
@@ -9,8 +9,21 @@ import pandas as pd
 import geopandas as gpd
 import json
 import os
+import sys
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+# Allow running this file directly, e.g. python scripts/fetch_paris_data.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.dataset_context import DatasetContext
+from scripts.dataset_schemas import (compact_dataset, drop_unused_columns, memory_usage_bytes,
+                                     write_geojson)
+from scripts.partitioned_store import PartitionedStore
+from scripts.schema_registry import SchemaRegistry
+from scripts.snapshot_store import SnapshotStore
+from scripts.pipeline_metrics import PipelineMetrics
 
 class ParisDataFetcher:
     """Fetches and processes Paris open data related to waste management."""
@@ -54,7 +67,19 @@ class ParisDataFetcher:
         'waste_statistics': 'tonnages-des-dechets-collectes'
     }
     
-    def __init__(self):
+    def __init__(self, data_dir: Optional[Path] = None, api_base: Optional[str] = None,
+                 metrics: Optional[PipelineMetrics] = None):
+        # Overrides let benchmarks point the fetcher at a scratch directory and a mock API
+        if data_dir is not None:
+            self.BASE_DATA_DIR = data_dir
+            self.RAW_DATA_DIR = data_dir / "raw"
+            self.PROCESSED_DATA_DIR = data_dir / "processed"
+        if api_base is not None:
+            self.OPENDATA_PARIS_BASE = api_base
+        self.metrics = metrics or PipelineMetrics(enabled=False)
+        self.store = PartitionedStore(self.PROCESSED_DATA_DIR / "partitioned")
+        self.snapshots = SnapshotStore(self.BASE_DATA_DIR / "snapshots")
+        self.registry = SchemaRegistry(self.OPENDATA_PARIS_BASE, self.BASE_DATA_DIR / "schema_cache.json")
         self.setup_directories()
         
     def setup_directories(self):
@@ -78,29 +103,11 @@ class ParisDataFetcher:
             return None
             
         dataset_id = self.DATASETS[dataset_key]
-        url = f"{self.OPENDATA_PARIS_BASE}/search/"
+        params = self.search_params(dataset_key, filters)
         
-        params = {
-            'dataset': dataset_id,
-            'rows': 10000,  # Maximum rows
-            'format': 'json'
-        }
-        
-        if filters:
-            # Add geographic filter for arrondissement (flexible field names)
-            if 'arrondissement' in filters:
-                arr_value = filters['arrondissement']
-                # Try different field names for arrondissement filtering
-                possible_fields = ['c_ar', 'arrondissement', 'code_postal']
-                for field in possible_fields:
-                    params[f'refine.{field}'] = arr_value
-                    
         try:
             print(f"Fetching {dataset_key} from {dataset_id}...")
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = self.fetch_page(dataset_key, params)
             records = data.get('records', [])
             
             if not records:
@@ -111,33 +118,15 @@ class ParisDataFetcher:
                     return self.fetch_dataset(dataset_key, filters=None)
                 return None
                 
-            # Extract fields from records with validation
-            processed_records = []
-            for record in records:
-                fields = record.get('fields', {})
-                geometry = record.get('geometry')
-                
-                # Add geometry if available
-                if geometry:
-                    fields['geometry'] = geometry
-                    
-                # Add record metadata
-                fields['_record_id'] = record.get('recordid')
-                fields['_dataset'] = dataset_key
-                
-                processed_records.append(fields)
-                
-            df = pd.DataFrame(processed_records)
+            self.check_schema(dataset_key, records, params)
+            df = self._records_to_frame(records, dataset_key)
             
             # Data validation
             if len(df.columns) == 0:
                 print(f"Warning: {dataset_key} has no data columns")
                 return None
                 
-            # Save raw data
-            raw_file = self.RAW_DATA_DIR / f"{dataset_key}.json"
-            with open(raw_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.save_raw(dataset_key, data, params)
                 
             print(f"✓ Fetched {len(df)} records for {dataset_key} ({len(df.columns)} columns)")
             return df
@@ -155,49 +144,120 @@ class ParisDataFetcher:
             print(f"✗ Unexpected error fetching {dataset_key}: {e}")
             return None
             
+    def search_params(self, dataset_key: str, filters: Optional[Dict] = None,
+                      rows: int = 10000, start: int = 0) -> Dict:
+        """
+        Query parameters for the records search API.
+        
+        Only the fields downstream consumers read are requested, and the
+        arrondissement filter uses the one field the dataset stores it in.
+        """
+        dataset_id = self.DATASETS[dataset_key]
+        params = {
+            'dataset': dataset_id,
+            'rows': rows,  # Maximum rows
+            'format': 'json'
+        }
+        if start:
+            params['start'] = start
+        
+        fields = self.registry.select_fields(dataset_key, dataset_id)
+        if fields:
+            params['fields'] = ','.join(fields)
+        
+        if filters:
+            # Add geographic filter for arrondissement on the resolved field
+            if 'arrondissement' in filters:
+                params.update(self.registry.refine(dataset_key, dataset_id, filters['arrondissement']))
+        return params
+        
+    def check_schema(self, dataset_key: str, records: List[Dict], params: Dict) -> List[str]:
+        """Warn about responses that don't match the requested schema."""
+        issues = self.registry.validate(dataset_key, records, params)
+        for issue in issues:
+            print(f"  ⚠ {dataset_key}: {issue}")
+        self.metrics.observe('schema_issues', len(issues), dataset=dataset_key)
+        return issues
+        
+    def fetch_page(self, dataset_key: str, params: Dict) -> Dict:
+        """Run one search request and return the decoded response."""
+        url = f"{self.OPENDATA_PARIS_BASE}/search/"
+        with self.metrics.stage('fetch_request', dataset=dataset_key):
+            response = requests.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+        self.metrics.observe('fetch_bytes', len(response.content), dataset=dataset_key)
+        self.metrics.observe('fetch_records', len(data.get('records', [])), dataset=dataset_key)
+        return data
+        
+    def save_raw(self, dataset_key: str, data: Dict, params: Dict):
+        """Record a fetch in the snapshot store and as the latest raw file."""
+        records = data.get('records', [])
+        
+        # Keep the history of every fetch; only changed records take space
+        with self.metrics.stage('snapshot_commit', dataset=dataset_key):
+            snapshot = self.snapshots.commit(dataset_key, records, query=params, meta={
+                'dataset_id': self.DATASETS[dataset_key],
+                'nhits': data.get('nhits')
+            })
+        print(f"  Snapshot {snapshot['snapshot_id']}: +{snapshot['added']} -{snapshot['removed']} records")
+        
+        # Save raw data
+        raw_file = self.RAW_DATA_DIR / f"{dataset_key}.json"
+        with open(raw_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            
+    def load_snapshot(self, dataset_key: str, snapshot_id: Optional[str] = None,
+                      as_of: Optional[datetime] = None,
+                      filters: Optional[Dict] = None) -> Optional[pd.DataFrame]:
+        """
+        Rebuild a dataset as it was fetched in a past run.
+        
+        Args:
+            dataset_key: Key from DATASETS dict
+            snapshot_id: Snapshot to read (latest by default)
+            as_of: Read the latest snapshot taken at or before this time
+            filters: Filters of the fetch whose history is read, as passed
+                to fetch_dataset
+        """
+        params = self.search_params(dataset_key, filters)
+        records = self.snapshots.read(dataset_key, snapshot_id, as_of, query=params)
+        if not records:
+            print(f"No snapshot found for {dataset_key}")
+            return None
+        return self._records_to_frame(records, dataset_key)
+        
+    @staticmethod
+    def _records_to_frame(records: List[Dict], dataset_key: str) -> pd.DataFrame:
+        """Flatten API records into one row of fields per record."""
+        # Extract fields from records with validation
+        processed_records = []
+        for record in records:
+            fields = dict(record.get('fields', {}))
+            geometry = record.get('geometry')
+            
+            # Add geometry if available
+            if geometry:
+                fields['geometry'] = geometry
+                
+            # Add record metadata
+            fields['_record_id'] = record.get('recordid')
+            fields['_dataset'] = dataset_key
+            
+            processed_records.append(fields)
+            
+        return pd.DataFrame(processed_records)
+        
     def fetch_arrondissement_data(self, arrondissement: str = '14'):
         """Fetch all relevant data for specified arrondissement (extendable design)."""
         print(f"Fetching data for {arrondissement}th arrondissement...")
         
-        # Filter for specified arrondissement
-        arr_filter = {'arrondissement': arrondissement}
-        
         datasets = {}
         successful_fetches = 0
         total_datasets = len(self.DATASETS)
         
-        # Priority datasets to fetch first
-        priority_datasets = [
-            'glass_igloos', 'trilib_stations', 'public_composters', 
-            'textile_containers', 'street_bins', 'arrondissement_boundaries'
-        ]
-        
-        # Fetch priority datasets first
-        print(f"\nFetching priority datasets...")
-        for key in priority_datasets:
-            if key in self.DATASETS:
-                if key == 'arrondissement_boundaries':
-                    df = self.fetch_dataset(key)  # Get all arrondissements
-                else:
-                    df = self.fetch_dataset(key, arr_filter)
-                    
-                if df is not None:
-                    datasets[key] = df
-                    successful_fetches += 1
-                    
-        # Fetch remaining datasets
-        print(f"\nFetching additional datasets...")
-        remaining_datasets = [k for k in self.DATASETS.keys() if k not in priority_datasets]
-        
-        for key in remaining_datasets:
-            if key == 'arrondissement_boundaries':
-                continue  # Already fetched
-            elif key in ['neighborhoods', 'road_network', 'ghg_emissions']:
-                # Context datasets - get all data
-                df = self.fetch_dataset(key)
-            else:
-                df = self.fetch_dataset(key, arr_filter)
-                
+        for key, filters in self.fetch_plan(arrondissement):
+            df = self.fetch_dataset(key, filters)
             if df is not None:
                 datasets[key] = df
                 successful_fetches += 1
@@ -208,43 +268,117 @@ class ParisDataFetcher:
         
         return datasets
         
+    def fetch_plan(self, arrondissement: str = '14') -> List[Tuple[str, Optional[Dict]]]:
+        """Datasets to fetch for an arrondissement, priority datasets first, with their filters."""
+        # Filter for specified arrondissement
+        arr_filter = {'arrondissement': arrondissement}
+        
+        # Priority datasets to fetch first
+        priority_datasets = [
+            'glass_igloos', 'trilib_stations', 'public_composters', 
+            'textile_containers', 'street_bins', 'arrondissement_boundaries'
+        ]
+        remaining_datasets = [k for k in self.DATASETS.keys() if k not in priority_datasets]
+        
+        plan = []
+        for key in priority_datasets + remaining_datasets:
+            if key not in self.DATASETS:
+                continue
+            if key in ['arrondissement_boundaries', 'neighborhoods', 'road_network', 'ghg_emissions']:
+                # Context datasets - get all data
+                plan.append((key, None))
+            else:
+                plan.append((key, arr_filter))
+        return plan
+        
     def fetch_14th_arrondissement_data(self):
         """Fetch data for 14th arrondissement (backward compatibility)."""
         return self.fetch_arrondissement_data('14')
         
-    def process_geometric_data(self, df: pd.DataFrame, dataset_name: str) -> gpd.GeoDataFrame:
-        """Convert DataFrame with geometry to GeoDataFrame."""
+    def process_geometric_data(self, df: pd.DataFrame, dataset_name: str,
+                               context: Optional[DatasetContext] = None) -> gpd.GeoDataFrame:
+        """
+        Convert DataFrame with geometry to GeoDataFrame.
+        
+        When a context is given, the GeoDataFrame is handed to it for the
+        following stages and the GeoJSON file is written in the background.
+        """
         if 'geometry' not in df.columns:
             print(f"No geometry found for {dataset_name}")
             return None
             
         try:
-            # Convert to GeoDataFrame and set geometry column
-            gdf = gpd.GeoDataFrame(df)
-            
-            # Handle different geometry formats
-            if df['geometry'].dtype == 'object':
-                from shapely.geometry import shape
-                gdf['geometry'] = df['geometry'].apply(
-                    lambda x: shape(x) if isinstance(x, dict) else x
-                )
-            
-            # Explicitly set the geometry column
-            gdf = gdf.set_geometry('geometry')
-                
-            # Set CRS (Paris uses Lambert 93 - EPSG:2154, but web maps use WGS84)
-            gdf = gdf.set_crs('EPSG:4326', allow_override=True)
-            
-            # Save processed data
-            output_file = self.PROCESSED_DATA_DIR / f"{dataset_name}.geojson"
-            gdf.to_file(output_file, driver='GeoJSON')
-            
-            print(f"✓ Saved {len(gdf)} geometric features for {dataset_name}")
-            return gdf
+            with self.metrics.stage('geometry_conversion', dataset=dataset_name):
+                gdf = self.convert_geometries(df, dataset_name)
+            return self.store_processed(gdf, dataset_name, context)
             
         except Exception as e:
             print(f"Error processing geometry for {dataset_name}: {e}")
             return None
+            
+    def store_processed(self, gdf: gpd.GeoDataFrame, dataset_name: str,
+                        context: Optional[DatasetContext] = None) -> gpd.GeoDataFrame:
+        """
+        Save a converted dataset, or hand it to the context to save in the background.
+
+        The full frame is persisted, so columns no consumer declares are still
+        on disk; only the copy kept in memory (and returned) drops them.
+        """
+        compact = drop_unused_columns(gdf, dataset_name)
+        self.metrics.observe('geometric_features', len(compact), dataset=dataset_name)
+        self.metrics.observe('dataset_memory_bytes', memory_usage_bytes(compact), dataset=dataset_name)
+        
+        # Large datasets go to the partitioned store instead of one GeoJSON file
+        if dataset_name in self.store.PARTITIONED_DATASETS:
+            if context is not None:
+                context.add_dataset(dataset_name, compact)
+                context.persist(f"{dataset_name} partitions", self.store.write, dataset_name, gdf)
+            else:
+                with self.metrics.stage('partition_write', dataset=dataset_name):
+                    partitions = self.store.write(dataset_name, gdf)
+                print(f"✓ Saved {len(gdf)} geometric features for {dataset_name} in {partitions} partitions")
+            return compact
+        
+        # Save processed data
+        output_file = self.PROCESSED_DATA_DIR / f"{dataset_name}.geojson"
+        if context is not None:
+            context.add_dataset(dataset_name, compact)
+            context.persist(output_file.name, write_geojson, gdf, output_file)
+            print(f"✓ Processed {len(gdf)} geometric features for {dataset_name} (saving in background)")
+        else:
+            with self.metrics.stage('geojson_write', dataset=dataset_name):
+                write_geojson(gdf, output_file)
+            print(f"✓ Saved {len(gdf)} geometric features for {dataset_name}")
+        return compact
+        
+    @staticmethod
+    def convert_geometries(df: pd.DataFrame, dataset_name: str) -> gpd.GeoDataFrame:
+        """
+        Geometry conversion and dtype compaction; CPU-bound and safe to run in a worker process.
+
+        All columns are kept; ``store_processed`` drops the undeclared ones
+        from the in-memory copy after the full frame is queued for writing.
+        """
+        return compact_dataset(ParisDataFetcher._to_geodataframe(df), dataset_name, drop_unused=False)
+        
+    @staticmethod
+    def _to_geodataframe(df: pd.DataFrame) -> gpd.GeoDataFrame:
+        """Build a WGS84 GeoDataFrame from API records with GeoJSON geometries."""
+        # Convert to GeoDataFrame and set geometry column
+        gdf = gpd.GeoDataFrame(df)
+        
+        # Handle different geometry formats
+        if df['geometry'].dtype == 'object':
+            from shapely.geometry import shape
+            gdf['geometry'] = df['geometry'].apply(
+                lambda x: shape(x) if isinstance(x, dict) else x
+            )
+        
+        # Explicitly set the geometry column
+        gdf = gdf.set_geometry('geometry')
+            
+        # Set CRS (Paris uses Lambert 93 - EPSG:2154, but web maps use WGS84)
+        return gdf.set_crs('EPSG:4326', allow_override=True)
 
 def main():
     """Main execution function."""
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Partitioned GeoParquet storage for large Paris datasets.
+Splits datasets by arrondissement and month into a hive-style directory
+layout, so reads only open the partitions a query needs and push column
+and row filters down into Parquet instead of loading whole files.
+
+Layout:
+    data/processed/partitioned/<dataset>/_arr=14/_period=2024-05/part-0.parquet
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from scripts.dataset_schemas import DATASET_SCHEMAS, compact_dataset
+
+# Partition value for rows without an arrondissement or a date
+UNKNOWN_ARRONDISSEMENT = 0
+UNKNOWN_PERIOD = 'unknown'
+# Partition value for datasets that have no time column
+ALL_PERIODS = 'all'
+
+DateLike = Union[str, date, datetime, pd.Timestamp]
+
+
+class PartitionedStore:
+    """Reads and writes datasets partitioned by arrondissement and month."""
+
+    PARTITIONED_DATASETS = ['citizen_reports', 'road_network', 'street_bins']
+
+    def __init__(self, root: Path = Path("data") / "processed" / "partitioned",
+                 row_group_rows: int = 50_000):
+        """
+        Args:
+            root: Directory holding one sub-directory per dataset
+            row_group_rows: Rows per Parquet row group (the unit of predicate pushdown)
+        """
+        self.root = root
+        self.row_group_rows = row_group_rows
+
+    def has(self, name: str) -> bool:
+        """Whether the dataset has any partitions on disk."""
+        return any(self._dataset_dir(name).glob('_arr=*/_period=*/*.parquet'))
+
+    def datasets(self) -> List[str]:
+        """Names of all datasets in the store."""
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir() and self.has(p.name))
+
+    def write(self, name: str, gdf: gpd.GeoDataFrame) -> int:
+        """
+        Write a dataset, replacing only the partitions present in ``gdf``.
+
+        Fetching one arrondissement therefore refreshes that arrondissement's
+        partitions and leaves the rest of the city untouched.
+
+        Returns:
+            Number of partitions written
+        """
+        time_column = time_column_for(name)
+        arrondissements, periods = partition_keys(gdf, time_column)
+        frame = gdf.assign(_arr=arrondissements.values, _period=periods.values)
+        if time_column and time_column in frame.columns:
+            # Sorted rows give tight row-group statistics for date filters
+            frame = frame.sort_values(time_column, kind='stable')
+
+        written = 0
+        for (arr, period), part in frame.groupby(['_arr', '_period'], sort=True, observed=True):
+            directory = self._dataset_dir(name) / f"_arr={int(arr)}" / f"_period={period}"
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / "part-0.parquet"
+            tmp_path = directory / "part-0.parquet.tmp"
+            part = _plain_columns(part.drop(columns=['_arr', '_period']))
+            part.to_parquet(tmp_path, index=False, row_group_size=self.row_group_rows)
+            os.replace(tmp_path, path)
+            written += 1
+        return written
+
+    def partitions(self, name: str, arrondissements: Optional[Iterable] = None,
+                   since: Optional[DateLike] = None, until: Optional[DateLike] = None) -> List[Path]:
+        """
+        Parquet files that can contain rows matching the partition filters.
+
+        Pruning only looks at directory names; no file is opened.
+        """
+        wanted = {int(a) for a in arrondissements} if arrondissements is not None else None
+        first = _period(since) if since is not None else None
+        last = _period(until) if until is not None else None
+
+        files = []
+        for path in sorted(self._dataset_dir(name).glob('_arr=*/_period=*/*.parquet')):
+            arr = int(path.parent.parent.name.split('=', 1)[1])
+            period = path.parent.name.split('=', 1)[1]
+            if wanted is not None and arr not in wanted:
+                continue
+            if period != ALL_PERIODS and (first or last):
+                if period == UNKNOWN_PERIOD:
+                    continue
+                if first and period < first or last and period > last:
+                    continue
+            files.append(path)
+        return files
+
+    def iter_chunks(self, name: str, arrondissements: Optional[Iterable] = None,
+                    since: Optional[DateLike] = None, until: Optional[DateLike] = None,
+                    columns: Optional[Sequence[str]] = None,
+                    filters: Optional[List[Tuple]] = None,
+                    chunk_rows: int = 100_000) -> Iterator[gpd.GeoDataFrame]:
+        """
+        Stream matching rows as GeoDataFrames of at most ``chunk_rows`` rows.
+
+        Args:
+            name: Dataset name
+            arrondissements: Arrondissement numbers to read (all by default)
+            since, until: Inclusive date range on the dataset's time column
+            columns: Columns to read; the geometry column is always included
+            filters: Extra row predicates as (column, op, value) tuples, in
+                the pyarrow ``filters`` format, e.g. [('type', '==', 'Propreté')]
+            chunk_rows: Maximum rows per yielded chunk
+        """
+        time_column = time_column_for(name)
+        if columns is not None:
+            columns = list(dict.fromkeys(list(columns) + ['geometry']))
+
+        for path in self.partitions(name, arrondissements, since, until):
+            fragment = ds.dataset(path, format='parquet')
+            schema = fragment.schema
+            read_columns = [c for c in columns if c in schema.names] if columns is not None else None
+            expression = self._row_filter(schema, time_column, since, until, filters)
+            for batch in fragment.to_batches(columns=read_columns, filter=expression, batch_size=chunk_rows):
+                if batch.num_rows == 0:
+                    continue
+                yield self._to_geodataframe(name, batch)
+
+    def read(self, name: str, **kwargs) -> Optional[gpd.GeoDataFrame]:
+        """Read all matching rows into memory; takes the same filters as ``iter_chunks``."""
+        chunks = list(self.iter_chunks(name, **kwargs))
+        if not chunks:
+            return None
+        gdf = pd.concat(chunks, ignore_index=True)
+        return compact_dataset(gpd.GeoDataFrame(gdf, geometry='geometry', crs='EPSG:4326'), name)
+
+    def _dataset_dir(self, name: str) -> Path:
+        return self.root / name
+
+    def _row_filter(self, schema: pa.Schema, time_column: Optional[str],
+                    since: Optional[DateLike], until: Optional[DateLike],
+                    filters: Optional[List[Tuple]]) -> Optional[ds.Expression]:
+        expressions = []
+        if time_column and time_column in schema.names:
+            field_type = schema.field(time_column).type
+            if since is not None:
+                expressions.append(ds.field(time_column) >= _bound(field_type, since))
+            if until is not None:
+                expressions.append(ds.field(time_column) <= _bound(field_type, until))
+        if filters:
+            expressions.append(pq.filters_to_expression(filters))
+        if not expressions:
+            return None
+        combined = expressions[0]
+        for expression in expressions[1:]:
+            combined = combined & expression
+        return combined
+
+    def _to_geodataframe(self, name: str, batch: pa.RecordBatch) -> gpd.GeoDataFrame:
+        df = batch.to_pandas()
+        geometry = gpd.GeoSeries.from_wkb(df.pop('geometry'), crs='EPSG:4326')
+        return compact_dataset(gpd.GeoDataFrame(df, geometry=geometry), name)
+
+
+def time_column_for(name: str) -> Optional[str]:
+    """The column a dataset is partitioned by in time, if any."""
+    return DATASET_SCHEMAS.get(name, {}).get('time_column')
+
+
+def last_days(days: int) -> datetime:
+    """Start of a trailing window, for ``since=last_days(90)``."""
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def partition_keys(gdf: pd.DataFrame, time_column: Optional[str]) -> Tuple[pd.Series, pd.Series]:
+    """Arrondissement number and YYYY-MM period for every row."""
+    column = next((c for c in ('c_ar', 'arrondissement') if c in gdf.columns), None)
+    if column is not None:
+        codes = pd.to_numeric(gdf[column].astype(str).str.extract(r'(\d+)')[0], errors='coerce') % 100
+        arrondissements = codes.fillna(UNKNOWN_ARRONDISSEMENT).astype(int)
+    else:
+        arrondissements = pd.Series(UNKNOWN_ARRONDISSEMENT, index=gdf.index)
+
+    if time_column and time_column in gdf.columns:
+        timestamps = pd.to_datetime(gdf[time_column], errors='coerce', utc=True)
+        periods = timestamps.dt.strftime('%Y-%m').fillna(UNKNOWN_PERIOD)
+    else:
+        periods = pd.Series(ALL_PERIODS, index=gdf.index)
+    return arrondissements, periods
+
+
+def _period(value: DateLike) -> str:
+    return pd.Timestamp(value).strftime('%Y-%m')
+
+
+def _bound(field_type: pa.DataType, value: DateLike) -> pa.Scalar:
+    """A filter bound of the same type as the column it is compared with."""
+    timestamp = pd.Timestamp(value)
+    if pa.types.is_timestamp(field_type):
+        if field_type.tz is not None:
+            timestamp = timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+        elif timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        return pa.scalar(timestamp.to_pydatetime(), type=field_type)
+    # Dates stored as ISO strings compare correctly as strings
+    return pa.scalar(timestamp.isoformat(), type=pa.string())
+
+
+def _plain_columns(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Store categoricals as plain strings so every partition file shares one schema."""
+    casts = {c: object for c, dtype in gdf.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    return gdf.astype(casts) if casts else gdf
+
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Long-running pipeline daemon for Paris garbage flow visualization.
+Keeps datasets (including the partitioned ones) and the flow network in
+memory, watches data/ for changes, and re-runs only the enrichment steps and
+map layers whose inputs changed; the map HTML is then saved again.
+A local control socket accepts fetch, rebuild, status and stop commands.
+"""
+
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import geopandas as gpd
+
+# Allow running this file directly, e.g. python scripts/pipeline_daemon.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.dataset_context import DatasetContext
+from scripts.coverage_raster import COVERAGE_DATASETS
+from scripts.dataset_schemas import compact_dataset
+from scripts.deduplicate_containers import LEGACY_DATASET, TYPED_DATASETS
+from scripts.enrich_data import DataEnricher
+from scripts.fetch_paris_data import ParisDataFetcher
+from scripts.pipeline_metrics import PipelineMetrics
+from scripts.siting_optimizer import STATION_DATASETS
+from scripts.streaming_fetch import StreamingFetcher
+from src.map_visualizer import GarbageFlowVisualizer
+
+# Processed datasets the flow network is built from
+FLOW_NETWORK_INPUTS = {LEGACY_DATASET, *TYPED_DATASETS}
+
+# Processed datasets the drop-off coverage raster is built from
+COVERAGE_INPUTS = {'arrondissement_boundaries', 'neighborhoods', *COVERAGE_DATASETS}
+
+# Processed datasets new station sites are proposed from
+SITING_INPUTS = {'arrondissement_boundaries', *STATION_DATASETS}
+
+# TCP fallback for platforms without Unix domain sockets
+FALLBACK_ADDRESS = ('127.0.0.1', 8765)
+
+
+class PipelineDaemon:
+    """Keeps the pipeline hot and rebuilds incrementally on change.
+
+    Only changed processed files (GeoJSON files and partitions) are re-read,
+    the flow network, coverage raster and siting proposals are only
+    recomputed when one of their inputs changed, and only the map layers
+    drawn from changed data are redrawn. A change to a typed container
+    dataset feeds all three enrichment steps, so it still takes seconds; a
+    change to a layer nothing is derived from is mostly the cost of saving
+    the map.
+    """
+
+    def __init__(self, data_dir: Path = Path("data"), arrondissement: str = '14',
+                 external_assets: bool = False, poll_interval: float = 0.25,
+                 socket_path: Optional[Path] = None, metrics: Optional[PipelineMetrics] = None):
+        self.data_dir = data_dir
+        self.arrondissement = arrondissement
+        self.external_assets = external_assets
+        self.poll_interval = poll_interval
+        self.socket_path = socket_path or data_dir / "daemon.sock"
+
+        self.metrics = metrics or PipelineMetrics(enabled=False)
+        self.context = DatasetContext()
+        self.fetcher = ParisDataFetcher(data_dir, metrics=self.metrics)
+        self.enricher = DataEnricher(data_dir, metrics=self.metrics)
+        self.visualizer = GarbageFlowVisualizer(data_dir, arrondissement=arrondissement, metrics=self.metrics)
+
+        self._rebuild_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watch_paused = threading.Event()
+        self._mtimes: Dict[Path, float] = {}
+        self._server: Optional[socketserver.BaseServer] = None
+        self.last_rebuild: Dict = {}
+
+    def serve_forever(self):
+        """Load everything once, then watch for changes and serve commands until stopped."""
+        print(f"Starting pipeline daemon for the {self.arrondissement}th arrondissement...")
+        self._mtimes = self._scan()
+        self.rebuild(full=True)
+
+        watcher = threading.Thread(target=self._watch, name="watcher", daemon=True)
+        watcher.start()
+        self._server = self._make_server()
+        server_thread = threading.Thread(target=self._server.serve_forever, name="control", daemon=True)
+        server_thread.start()
+        print(f"Control socket listening on {self._address_label()}")
+
+        try:
+            while not self._stop.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            print("\nStopping daemon...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop watching, close the control socket and flush pending writes."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if hasattr(socket, 'AF_UNIX') and self.socket_path.exists():
+            self.socket_path.unlink()
+        self.context.close()
+
+    def fetch(self) -> Dict:
+        """Fetch fresh data from the API and rebuild everything."""
+        # The fetch writes the processed files itself; don't treat them as external changes
+        self._watch_paused.set()
+        try:
+            with self._rebuild_lock:
+                StreamingFetcher(self.fetcher, self.context).run(self.arrondissement)
+            summary = self.rebuild(full=True, reload=False)
+            self._mtimes = self._scan()
+        finally:
+            self._watch_paused.clear()
+        return summary
+
+    def rebuild(self, changed: Optional[Set[Path]] = None, full: bool = False, reload: bool = True) -> Dict:
+        """
+        Re-run the steps affected by ``changed`` files.
+
+        Args:
+            changed: Files that changed since the last rebuild
+            full: Rebuild everything regardless of what changed
+            reload: Re-read processed datasets from disk on a full rebuild
+
+        Returns:
+            Summary of what was rebuilt and how long it took
+        """
+        changed = changed or set()
+        start = time.perf_counter()
+        with self._rebuild_lock:
+            if full:
+                if reload:
+                    self._reload_all()
+                reloaded = sorted(self.context.get_datasets())
+            else:
+                reloaded = self._reload_processed(changed)
+            # Map data keys that changed, for redrawing only the affected layers
+            redraw = set(reloaded)
+
+            enrich = full or bool(FLOW_NETWORK_INPUTS & set(reloaded))
+            if enrich:
+                datasets = self.context.get_datasets()
+                if datasets:
+                    self.enricher.create_flow_network(datasets, context=self.context)
+                    redraw |= {'nodes', 'edges', 'flow_estimates'}
+            elif any(path.parent == self.enricher.enriched_dir for path in changed):
+                # Enriched files were edited outside the daemon: render from disk
+                self._drop_enriched()
+                redraw |= {'nodes', 'edges', 'flow_estimates', 'coverage', 'proposed_sites'}
+
+            if full or COVERAGE_INPUTS & set(reloaded):
+                datasets = self.context.get_datasets()
+                if datasets:
+                    self.enricher.analyze_coverage(datasets, context=self.context)
+                    redraw.add('coverage')
+
+            if full or SITING_INPUTS & set(reloaded):
+                datasets = self.context.get_datasets()
+                if datasets:
+                    self.enricher.propose_sites(datasets, context=self.context)
+                    redraw.add('proposed_sites')
+
+            map_obj = self.visualizer.create_complete_map(self.context, external_assets=self.external_assets,
+                                                          changed=None if full else redraw)
+            output_path = self.visualizer.save_map(map_obj) if map_obj else None
+
+            # Files written by this rebuild are not external changes
+            self.context.flush()
+            self._mtimes.update(self._scan(self.enricher.enriched_dir))
+
+        self.last_rebuild = {
+            'changed': sorted(str(p) for p in changed),
+            'reloaded': reloaded,
+            'enriched': enrich,
+            'map': str(output_path) if output_path else None,
+            'seconds': round(time.perf_counter() - start, 3),
+            'finished_at': time.time()
+        }
+        print(f"✓ Rebuilt in {self.last_rebuild['seconds']}s "
+              f"(reloaded: {', '.join(reloaded) or 'none'}, enriched: {enrich})")
+        return self.last_rebuild
+
+    def status(self) -> Dict:
+        """Current in-memory state of the daemon."""
+        return {
+            'arrondissement': self.arrondissement,
+            'datasets': {name: len(gdf) for name, gdf in self.context.get_datasets().items()},
+            'flow_nodes': len(self.context.get_enriched('nodes') or []),
+            'flow_edges': len(self.context.get_enriched('edges') or []),
+            'pending_writes': self.context.pending_writes,
+            'last_rebuild': self.last_rebuild
+        }
+
+    def handle_command(self, request: Dict) -> Dict:
+        """Execute one control-socket command."""
+        command = request.get('command')
+        if command == 'status':
+            return {'ok': True, 'status': self.status()}
+        if command == 'rebuild':
+            return {'ok': True, 'rebuild': self.rebuild(full=bool(request.get('full', True)))}
+        if command == 'fetch':
+            return {'ok': True, 'rebuild': self.fetch()}
+        if command == 'stop':
+            self._stop.set()
+            return {'ok': True}
+        return {'ok': False, 'error': f"Unknown command: {command}. Use status, rebuild, fetch or stop."}
+
+    def _reload_all(self):
+        for name in list(self.context.get_datasets()):
+            self.context.remove_dataset(name)
+        self.enricher.load_processed_data(self.context)
+        for name in self.fetcher.store.datasets():
+            self._reload_partitioned(name)
+
+    def _reload_processed(self, changed: Set[Path]) -> List[str]:
+        """Re-read only the processed datasets whose files changed."""
+        reloaded = []
+        root = self.fetcher.store.root
+        partitioned = sorted({path.relative_to(root).parts[0] for path in changed if root in path.parents})
+        for name in partitioned:
+            if self._reload_partitioned(name):
+                reloaded.append(name)
+
+        for path in sorted(changed):
+            if path.parent != self.enricher.processed_dir or path.suffix != '.geojson':
+                continue
+            name = path.stem
+            if not path.exists():
+                self.context.remove_dataset(name)
+                reloaded.append(name)
+                continue
+            try:
+                self.context.add_dataset(name, compact_dataset(gpd.read_file(path), name))
+                reloaded.append(name)
+            except Exception as e:
+                print(f"Error reloading {name}: {e}")
+        return reloaded
+
+    def _reload_partitioned(self, name: str) -> bool:
+        """Keep the daemon's arrondissement of a partitioned dataset in memory."""
+        try:
+            gdf = self.fetcher.store.read(name, arrondissements=[self.arrondissement])
+        except Exception as e:
+            print(f"Error reloading {name}: {e}")
+            return False
+        if gdf is None:
+            self.context.remove_dataset(name)
+        else:
+            self.context.add_dataset(name, gdf)
+        return True
+
+    def _drop_enriched(self):
+        """Forget in-memory flow outputs so the visualizer reads the files instead."""
+        for key in ('nodes', 'edges', 'flow_estimates', 'flow_graph', 'containers',
+                    'emissions_ledger', 'coverage', 'proposed_sites'):
+            self.context.set_enriched(key, None)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            if self._watch_paused.is_set():
+                continue
+            current = self._scan()
+            changed = {p for p in set(current) | set(self._mtimes) if current.get(p) != self._mtimes.get(p)}
+            if not changed:
+                continue
+            # Let writers finish before reading (files are usually written in bursts)
+            time.sleep(self.poll_interval)
+            current = self._scan()
+            changed |= {p for p in set(current) | set(self._mtimes) if current.get(p) != self._mtimes.get(p)}
+            self._mtimes = current
+            try:
+                self.rebuild(changed)
+            except Exception as e:
+                print(f"✗ Rebuild failed: {e}")
+
+    def _scan(self, root: Optional[Path] = None) -> Dict[Path, float]:
+        """Modification times of watched files."""
+        mtimes = {}
+        roots = [root] if root is not None else [self.enricher.processed_dir, self.enricher.enriched_dir]
+        for directory in roots:
+            if not directory.exists():
+                continue
+            for path in directory.iterdir():
+                if path.is_file():
+                    mtimes[path] = path.stat().st_mtime_ns
+        if root is None and self.fetcher.store.root.exists():
+            # Partition files sit in <dataset>/_arr=N/_period=P/ below the store root
+            for path in self.fetcher.store.root.rglob('*.parquet'):
+                mtimes[path] = path.stat().st_mtime_ns
+        return mtimes
+
+    def _make_server(self) -> socketserver.BaseServer:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle_command(json.loads(line))
+                    except Exception as e:
+                        response = {'ok': False, 'error': str(e)}
+                    self.wfile.write((json.dumps(response, default=str) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+
+        if hasattr(socket, 'AF_UNIX'):
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            return socketserver.ThreadingUnixStreamServer(str(self.socket_path), Handler)
+        return socketserver.ThreadingTCPServer(FALLBACK_ADDRESS, Handler)
+
+    def _address_label(self) -> str:
+        if hasattr(socket, 'AF_UNIX'):
+            return str(self.socket_path)
+        return f"{FALLBACK_ADDRESS[0]}:{FALLBACK_ADDRESS[1]}"
+
+
+def send_command(command: str, socket_path: Path = Path("data") / "daemon.sock",
+                 timeout: float = 600, **options) -> Dict:
+    """Send a command to a running daemon and return its JSON response."""
+    if hasattr(socket, 'AF_UNIX'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = str(socket_path)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = FALLBACK_ADDRESS
+    sock.settimeout(timeout)
+    with sock:
+        sock.connect(address)
+        sock.sendall((json.dumps({'command': command, **options}) + '\n').encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as reader:
+            return json.loads(reader.readline())
+
+
+def main():
+    """Main execution function."""
+    PipelineDaemon().serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Per-stage metrics for the Paris garbage flow pipeline.
+Records timings, sizes and memory for each stage and sub-step, and exports
+them as JSON and Prometheus text format, with optional cProfile/tracemalloc
+capture for one named stage.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+METRIC_PREFIX = 'poubelles'
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class PipelineMetrics:
+    """Collects stage timings and observations for one pipeline run.
+
+    A disabled instance is a cheap no-op, so components can always call it.
+    """
+
+    def __init__(self, enabled: bool = True, profile_stage: Optional[str] = None,
+                 profile_dir: Path = Path("data") / "metrics"):
+        """
+        Args:
+            enabled: Record anything at all
+            profile_stage: Stage name to run under cProfile and tracemalloc
+            profile_dir: Where profiler output is written
+        """
+        self.enabled = enabled
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.stages: List[Dict] = []
+        self.observations: List[Dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._sampler = RSSSampler()
+        # Profiles of ``profile_stage`` accumulate over all of its invocations
+        self._profiler: Optional[cProfile.Profile] = None
+        self._profile_active = False
+        self._profile_runs = 0
+        self._traced_peak = 0
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        """Time a stage or sub-step; nested stages record their parent path."""
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._stack()
+        stack.append(name)
+        path = '/'.join(stack)
+        profiling = name == self.profile_stage and self._start_profile()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            with self._sampler.window() as rss:
+                yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            stack.pop()
+            if profiling:
+                self._stop_profile(name)
+            record = {
+                'stage': name,
+                'path': path,
+                'labels': {k: str(v) for k, v in labels.items()},
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu, 6),
+                'peak_rss_bytes': rss.peak_bytes
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a value such as a byte count, feature count or file size."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.observations.append({
+                'name': name,
+                'labels': {k: str(v) for k, v in labels.items()},
+                'value': value
+            })
+
+    def to_dict(self) -> Dict:
+        """Machine-readable snapshot of everything recorded so far."""
+        with self._lock:
+            return {
+                'started_at': self.started_at,
+                'peak_rss_bytes': peak_rss_bytes(),
+                'stages': list(self.stages),
+                'observations': list(self.observations)
+            }
+
+    def to_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        snapshot = self.to_dict()
+        lines = []
+
+        durations: Dict[tuple, List[float]] = {}
+        cpu: Dict[tuple, float] = {}
+        for record in snapshot['stages']:
+            key = (record['path'],) + tuple(sorted(record['labels'].items()))
+            durations.setdefault(key, []).append(record['wall_seconds'])
+            cpu[key] = cpu.get(key, 0.0) + record['cpu_seconds']
+
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines.append(f"# HELP {name} Wall-clock time spent in a pipeline stage.")
+        lines.append(f"# TYPE {name} summary")
+        for key, values in durations.items():
+            labels = _format_labels({'stage': key[0], **dict(key[1:])})
+            lines.append(f"{name}_sum{labels} {sum(values):.6f}")
+            lines.append(f"{name}_count{labels} {len(values)}")
+
+        name = f"{METRIC_PREFIX}_stage_cpu_seconds_total"
+        lines.append(f"# HELP {name} CPU time spent in a pipeline stage.")
+        lines.append(f"# TYPE {name} counter")
+        for key, value in cpu.items():
+            lines.append(f"{name}{_format_labels({'stage': key[0], **dict(key[1:])})} {value:.6f}")
+
+        gauges: Dict[str, Dict[tuple, float]] = {}
+        for obs in snapshot['observations']:
+            key = tuple(sorted(obs['labels'].items()))
+            series = gauges.setdefault(obs['name'], {})
+            series[key] = series.get(key, 0) + obs['value']
+        for metric, series in sorted(gauges.items()):
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(dict(key))} {value}")
+
+        name = f"{METRIC_PREFIX}_peak_rss_bytes"
+        lines.append(f"# HELP {name} Peak resident set size of the pipeline process.")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {snapshot['peak_rss_bytes']}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, output_dir: Path, basename: str = "pipeline_metrics") -> Dict[str, Path]:
+        """Write JSON and Prometheus files and return their paths."""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        json_path = output_dir / f"{basename}.json"
+        prom_path = output_dir / f"{basename}.prom"
+        with open(json_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        prom_path.write_text(self.to_prometheus())
+        return {'json': json_path, 'prometheus': prom_path}
+
+    def _stack(self) -> List[str]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _start_profile(self) -> bool:
+        """Resume the stage's profiler; concurrent invocations in other threads are not profiled."""
+        with self._lock:
+            if self._profile_active:
+                return False
+            self._profile_active = True
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+        tracemalloc.start(25)
+        self._profiler.enable()
+        return True
+
+    def _stop_profile(self, name: str):
+        profiler = self._profiler
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self._traced_peak = max(self._traced_peak, traced_peak)
+        self._profile_runs += 1
+
+        # Rewritten after every invocation, so the files always cover all of them
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        prof_path = self.profile_dir / f"{name}.prof"
+        profiler.dump_stats(str(prof_path))
+
+        report = StringIO()
+        report.write(f"Stage '{name}', {self._profile_runs} invocation(s)\n")
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(30)
+        report.write(f"\nPeak traced Python memory: {self._traced_peak / 2 ** 20:.1f} MB\n")
+        report.write("Top allocation sites (last invocation):\n")
+        for stat in snapshot.statistics('lineno')[:25]:
+            report.write(f"  {stat}\n")
+        (self.profile_dir / f"{name}.profile.txt").write_text(report.getvalue())
+
+        self.observe('traced_peak_bytes', traced_peak, stage=name)
+        with self._lock:
+            self._profile_active = False
+        if self._profile_runs == 1:
+            print(f"Profile for stage '{name}' saved to {prof_path}")
+
+
+class RSSWindow:
+    """Peak resident set size seen while a sampling window was open."""
+
+    def __init__(self, start_bytes: int):
+        self.peak_bytes = start_bytes
+
+
+class RSSSampler:
+    """Samples resident set size on one background thread while any window is open.
+
+    Unlike the process high-water mark, a window's peak covers only the time
+    it was open, so nested and consecutive stages each get their own peak.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self._windows: List[RSSWindow] = []
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def window(self) -> Iterator[RSSWindow]:
+        """Track the peak RSS until the block exits."""
+        window = RSSWindow(current_rss_bytes())
+        with self._lock:
+            self._windows.append(window)
+            self._active.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        try:
+            yield window
+        finally:
+            with self._lock:
+                self._windows.remove(window)
+                if not self._windows:
+                    self._active.clear()
+            window.peak_bytes = max(window.peak_bytes, current_rss_bytes())
+
+    def _run(self):
+        while True:
+            self._active.wait()
+            rss = current_rss_bytes()
+            with self._lock:
+                for window in self._windows:
+                    window.peak_bytes = max(window.peak_bytes, rss)
+            time.sleep(self.interval)
+
+
+def current_rss_bytes() -> int:
+    """Current resident set size, or the high-water mark where procfs is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """High-water mark of the process resident set size."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + '}'
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
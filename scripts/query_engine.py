@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Embedded SQL analytics over processed and enriched Paris data.
+Registers every dataset on disk as a DuckDB view, so queries scan the
+partitioned Parquet store and the GeoJSON outputs in place (with partition
+pruning and column/row pushdown) instead of loading them into pandas first.
+Spatial functions (ST_Area, ST_Within, ...) come from DuckDB's spatial
+extension when it can be loaded; an installed extension is used as is,
+otherwise it is downloaded once, which needs network access (offline, run
+``INSTALL spatial`` on a connected machine or geometry stays WKB). Results are cached as Parquet, keyed by a
+hash of the SQL, its parameters and the state of the source files.
+
+Examples:
+    python main.py query "SELECT _arr, count(*) FROM street_bins GROUP BY 1"
+    python -m scripts.query_engine          # list tables
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import duckdb
+import pandas as pd
+
+# Allow running this file directly, e.g. python scripts/query_engine.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.emissions_ledger import EmissionsLedger
+from scripts.partitioned_store import PartitionedStore
+
+# Enriched outputs exposed as views, by file name
+ENRICHED_GEOJSON = {
+    'flow_nodes': 'flow_nodes.geojson',
+    'containers': 'containers.geojson',
+    'proposed_sites': 'proposed_sites.geojson',
+}
+
+Params = Optional[Union[Sequence, Dict[str, object]]]
+
+
+class QueryEngine:
+    """Runs SQL over the pipeline's datasets through an in-process DuckDB."""
+
+    def __init__(self, data_dir: Path = Path("data"), cache_dir: Optional[Path] = None,
+                 max_cache_entries: int = 256, threads: Optional[int] = None):
+        """
+        Args:
+            data_dir: Root data directory holding processed/ and enriched/
+            cache_dir: Directory for cached results (default: data/query_cache)
+            max_cache_entries: Oldest cached results beyond this count are removed
+            threads: DuckDB worker threads (default: one per core)
+        """
+        self.processed_dir = data_dir / "processed"
+        self.enriched_dir = data_dir / "enriched"
+        self.cache_dir = cache_dir or data_dir / "query_cache"
+        self.max_cache_entries = max_cache_entries
+        self.store = PartitionedStore(self.processed_dir / "partitioned")
+
+        self.con = duckdb.connect(database=':memory:')
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self.spatial = self._load_spatial()
+        self._lock = threading.Lock()
+        # View name -> source paths whose size and mtime form the cache key
+        self.sources: Dict[str, List[Path]] = {}
+        # Tables built from Python objects, only when a query first names them
+        self._deferred: Dict[str, Callable[[], pd.DataFrame]] = {}
+        self._tables: List[str] = []
+        self.refresh()
+
+    def __enter__(self) -> "QueryEngine":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Close the DuckDB connection."""
+        self.con.close()
+
+    def refresh(self):
+        """(Re)register a view for every dataset currently on disk."""
+        with self._lock:
+            for name in list(self.sources):
+                kind = 'TABLE' if name in self._tables else 'VIEW'
+                self.con.execute(f'DROP {kind} IF EXISTS "{name}"')
+            self.sources = {}
+            self._deferred = {}
+            self._tables = []
+
+            for name in self.store.datasets():
+                self._register_partitioned(name)
+            if self.processed_dir.exists():
+                for path in sorted(self.processed_dir.glob('*.geojson')):
+                    if path.stem not in self.sources:
+                        self._register_geojson(path.stem, path)
+            for name, filename in ENRICHED_GEOJSON.items():
+                path = self.enriched_dir / filename
+                if path.exists():
+                    self._register_geojson(name, path)
+            self._register_enriched_tables()
+
+    def tables(self) -> pd.DataFrame:
+        """Registered views with their column names and types."""
+        rows = []
+        with self._lock:
+            for name in sorted(self.sources):
+                self._materialize(name)
+                columns = self.con.execute(f'DESCRIBE SELECT * FROM "{name}"').fetchall()
+                rows.append({'table': name, 'columns': ', '.join(f"{c[0]} {c[1]}" for c in columns)})
+        return pd.DataFrame(rows, columns=['table', 'columns'])
+
+    def query(self, sql: str, params: Params = None, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Run a query and return the result as a DataFrame.
+
+        Args:
+            sql: DuckDB SQL over the registered views
+            params: Positional (``?``) or named (``$name``) query parameters
+            use_cache: Reuse a cached result when the query and its sources are unchanged
+
+        Returns:
+            Query result; select ST_AsText(geometry) or ST_AsWKB(geometry)
+            to get geometries in a portable form
+        """
+        key = self.cache_key(sql, params)
+        path = self.cache_dir / f"{key}.parquet"
+        if use_cache and path.exists():
+            path.touch()
+            return pd.read_parquet(path)
+
+        with self._lock:
+            self._materialize(sql)
+            relation = self.con.execute(sql, params) if params is not None else self.con.execute(sql)
+            result = relation.df()
+
+        if use_cache:
+            self._store(path, result)
+        return result
+
+    def cache_key(self, sql: str, params: Params = None) -> str:
+        """Hash of the normalised SQL, its parameters and the source files' sizes and mtimes."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(' '.join(sql.split()).encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+        for name, (size, mtime) in sorted(self._fingerprint().items()):
+            digest.update(f"{name}:{size}:{mtime}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def clear_cache(self) -> int:
+        """Delete all cached results; returns the number removed."""
+        removed = 0
+        for path in self.cache_dir.glob('*.parquet'):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+    def _load_spatial(self) -> bool:
+        """Load the spatial extension, installing it (a download) only if it isn't installed yet."""
+        try:
+            self.con.execute("LOAD spatial")
+            return True
+        except duckdb.Error:
+            pass
+        try:
+            self.con.execute("INSTALL spatial")
+            self.con.execute("LOAD spatial")
+            return True
+        except duckdb.Error as e:
+            print(f"Warning: DuckDB spatial extension unavailable, geometry stays WKB: {e}")
+            return False
+
+    def _materialize(self, sql: str):
+        """Create the deferred tables a query refers to; call with the lock held."""
+        for name in [n for n in self._deferred if re.search(rf'\b{n}\b', sql)]:
+            frame = self._deferred.pop(name)()
+            self.con.register('_deferred_frame', frame)
+            try:
+                self.con.execute(f'CREATE OR REPLACE TABLE "{name}" AS SELECT * FROM _deferred_frame')
+            finally:
+                self.con.unregister('_deferred_frame')
+            self._tables.append(name)
+
+    def _register_partitioned(self, name: str):
+        """View over a hive-partitioned dataset; _arr and _period filters prune files."""
+        pattern = (self.store.root / name / '_arr=*' / '_period=*' / '*.parquet').as_posix()
+        scan = f"read_parquet('{_quote(pattern)}', hive_partitioning = true)"
+        columns = dict(row[:2] for row in self.con.execute(f'DESCRIBE SELECT * FROM {scan}').fetchall())
+        # GeoParquet geometry is WKB; newer spatial versions already decode it
+        select = 'SELECT *'
+        if self.spatial and columns.get('geometry') == 'BLOB':
+            select = 'SELECT * REPLACE (ST_GeomFromWKB(geometry) AS geometry)'
+        self.con.execute(f'CREATE OR REPLACE VIEW "{name}" AS {select} FROM {scan}')
+        self.sources[name] = [self.store.root / name]
+
+    def _register_geojson(self, name: str, path: Path):
+        """View over a GeoJSON file read in place by GDAL."""
+        if self.spatial:
+            self.con.execute(
+                f'CREATE OR REPLACE VIEW "{name}" AS '
+                f"SELECT * EXCLUDE (geom), geom AS geometry FROM ST_Read('{_quote(path.as_posix())}')"
+            )
+        else:
+            # Without GDAL the features are read as JSON; geometry stays a struct
+            self.con.execute(
+                f'CREATE OR REPLACE VIEW "{name}" AS '
+                f"SELECT unnest(f.properties), f.geometry FROM "
+                f"(SELECT unnest(features) AS f FROM read_json_auto('{_quote(path.as_posix())}', "
+                f"maximum_object_size = 1073741824))"
+            )
+        self.sources[name] = [path]
+
+    def _register_enriched_tables(self):
+        """Views over non-spatial enrichment outputs."""
+        edges = self.enriched_dir / "flow_edges.json"
+        if edges.exists():
+            self.con.execute(
+                f"CREATE OR REPLACE VIEW flow_edges AS SELECT * FROM read_json_auto('{_quote(edges.as_posix())}')"
+            )
+            self.sources['flow_edges'] = [edges]
+
+        summary = self.enriched_dir / "coverage" / "coverage_summary.json"
+        if summary.exists():
+            self.con.execute(
+                f"CREATE OR REPLACE VIEW coverage_quartiers AS SELECT unnest(quartiers, recursive := true) "
+                f"FROM read_json_auto('{_quote(summary.as_posix())}')"
+            )
+            self.sources['coverage_quartiers'] = [summary]
+
+        ledger_dir = self.enriched_dir / "emissions_ledger"
+        if (ledger_dir / "ledger.json").exists():
+            # Summing the edges x days arrays is only worth it for queries that use them
+            self._deferred['edge_emissions'] = lambda: _edge_emissions(EmissionsLedger.load(ledger_dir))
+            self.sources['edge_emissions'] = [ledger_dir / "ledger.json"]
+
+    def _fingerprint(self) -> Dict[str, Tuple[int, int]]:
+        """Total size and latest mtime of every registered source."""
+        state = {}
+        for name, paths in self.sources.items():
+            size, mtime = 0, 0
+            for path in paths:
+                files = path.rglob('*.parquet') if path.is_dir() else [path]
+                for file in files:
+                    try:
+                        stat = file.stat()
+                    except FileNotFoundError:
+                        continue
+                    size += stat.st_size
+                    mtime = max(mtime, stat.st_mtime_ns)
+            state[name] = (size, mtime)
+        return state
+
+    def _store(self, path: Path, result: pd.DataFrame):
+        """Write a result to the cache and evict the least recently used entries."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.parquet.tmp')
+        try:
+            result.to_parquet(tmp_path, index=False)
+            tmp_path.replace(path)
+        except (ValueError, TypeError) as e:
+            # Nested or extension types pyarrow cannot write are simply not cached
+            tmp_path.unlink(missing_ok=True)
+            print(f"Warning: query result not cached: {e}")
+            return
+
+        entries = sorted(self.cache_dir.glob('*.parquet'), key=lambda p: p.stat().st_mtime)
+        for stale in entries[:max(0, len(entries) - self.max_cache_entries)]:
+            stale.unlink(missing_ok=True)
+
+
+def _edge_emissions(ledger: EmissionsLedger) -> pd.DataFrame:
+    """Per-edge totals of the emissions ledger."""
+    emissions = ledger.emissions()
+    return pd.DataFrame({
+        'source': ledger.node_ids[ledger.sources],
+        'target': ledger.node_ids[ledger.targets],
+        'waste_type': pd.Categorical.from_codes(ledger.waste_codes, ledger.waste_types),
+        'vehicle_class': pd.Categorical.from_codes(ledger.class_codes, ledger.class_names),
+        'distance_km': ledger.distance_km,
+        'tonnes': ledger.tonnage.sum(axis=1),
+        'kg_co2': emissions.sum(axis=1),
+    })
+
+
+def _quote(value: str) -> str:
+    """Escape a string for use inside a SQL single-quoted literal."""
+    return value.replace("'", "''")
+
+
+def main():
+    """Run a query from the command line and print the result."""
+    parser = argparse.ArgumentParser(description="Run SQL over processed and enriched data")
+    parser.add_argument('sql', nargs='?', help='SQL query; omit to list the registered tables')
+    parser.add_argument('--data-dir', type=Path, default=Path("data"))
+    parser.add_argument('--no-cache', action='store_true', help='Ignore and do not write cached results')
+    parser.add_argument('--output', type=Path, help='Write the result to a .csv or .parquet file')
+    args = parser.parse_args()
+    run_query(args.sql, args.data_dir, use_cache=not args.no_cache, output=args.output)
+
+
+def run_query(sql: Optional[str], data_dir: Path = Path("data"), use_cache: bool = True,
+              output: Optional[Path] = None):
+    """Print (or save) a query result, or the table listing when no SQL is given."""
+    with QueryEngine(data_dir) as engine:
+        if not sql:
+            for row in engine.tables().itertuples():
+                print(f"{row.table}: {row.columns}")
+            return
+        result = engine.query(sql, use_cache=use_cache)
+
+    if output is not None:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        if output.suffix == '.parquet':
+            result.to_parquet(output, index=False)
+        else:
+            result.to_csv(output, index=False)
+        print(f"{len(result)} rows saved to: {output}")
+    else:
+        with pd.option_context('display.max_rows', 100, 'display.width', 200):
+            print(result.to_string(index=False, max_rows=100))
+        print(f"({len(result)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Schema registry for Paris Open Data queries.
+Resolves, once per dataset, which field holds the arrondissement, so queries
+refine on a single field and ask only for the fields downstream consumers
+read. Responses are checked against the declared schema.
+"""
+
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+from scripts.dataset_schemas import DATASET_SCHEMAS, consumer_fields
+
+# Fields that can identify an arrondissement, in order of preference
+REFINE_CANDIDATES = ['c_ar', 'arrondissement', 'code_postal']
+
+POSTAL_CODE = re.compile(r'^750\d{2}$')
+
+
+class SchemaRegistry:
+    """Per-dataset field list and arrondissement filter field, cached on disk."""
+
+    def __init__(self, api_base: str, cache_path: Path = Path("data") / "schema_cache.json",
+                 max_age_days: int = 7, probe_rows: int = 20):
+        """
+        Args:
+            api_base: Records API base URL
+            cache_path: JSON file holding resolved schemas
+            max_age_days: Re-probe datasets resolved longer ago than this
+            probe_rows: Records sampled to discover a dataset's fields
+        """
+        self.api_base = api_base
+        self.cache_path = cache_path
+        self.max_age = timedelta(days=max_age_days)
+        self.probe_rows = probe_rows
+        self._lock = threading.Lock()
+        self._cache: Optional[Dict[str, Dict]] = None
+
+    def describe(self, dataset_key: str, dataset_id: str) -> Dict:
+        """
+        Fields served for a dataset and its resolved arrondissement field.
+
+        Returns an empty dict when the dataset could not be probed, in which
+        case queries fall back to fetching every field without a filter.
+        """
+        with self._lock:
+            cache = self._load_cache()
+            entry = cache.get(dataset_key)
+            if entry and entry.get('dataset_id') == dataset_id and not self._expired(entry):
+                return entry
+
+        entry = self._probe(dataset_key, dataset_id)
+        if entry:
+            with self._lock:
+                self._cache[dataset_key] = entry
+                self._save_cache()
+        return entry
+
+    def select_fields(self, dataset_key: str, dataset_id: str) -> Optional[List[str]]:
+        """
+        Fields to request, or None to request everything.
+
+        Every declared consumer field is requested, whether or not the probe
+        saw it: records omit null fields, so a field missing from a small
+        sample may still be served, and the API ignores projected fields a
+        dataset doesn't have.
+        """
+        return consumer_fields(dataset_key)
+
+    def refine(self, dataset_key: str, dataset_id: str, arrondissement: str) -> Dict[str, str]:
+        """``refine.<field>`` parameter selecting one arrondissement, if the dataset has such a field."""
+        entry = self.describe(dataset_key, dataset_id)
+        field = entry.get('refine_field')
+        if field is None:
+            return {}
+        number = int(arrondissement)
+        value = f"750{number:02d}" if entry.get('refine_format') == 'postal' else str(number)
+        return {f"refine.{field}": value}
+
+    def validate(self, dataset_key: str, records: List[Dict], params: Dict) -> List[str]:
+        """Describe every way a response departs from the requested schema."""
+        issues = []
+        if not records:
+            return issues
+
+        requested = set(params['fields'].split(',')) if params.get('fields') else None
+        seen: Dict[str, int] = {}
+        for record in records:
+            for name in record.get('fields', {}):
+                seen[name] = seen.get(name, 0) + 1
+
+        if requested is not None:
+            # Declared fields a dataset doesn't have are requested too; only
+            # flag the ones the probe has seen served
+            with self._lock:
+                probed = set(self._load_cache().get(dataset_key, {}).get('fields', requested))
+            missing = sorted((requested & probed) - set(seen))
+            if missing:
+                issues.append(f"requested fields never returned: {', '.join(missing)}")
+            extra = sorted(set(seen) - requested)
+            if extra:
+                issues.append(f"fields returned outside the projection: {', '.join(extra[:10])}")
+
+        declared = DATASET_SCHEMAS.get(dataset_key, {}).get('columns')
+        if declared is not None:
+            without_geometry = sum(1 for r in records if not r.get('geometry'))
+            if without_geometry:
+                issues.append(f"{without_geometry}/{len(records)} records without geometry")
+            for name, kind in declared.items():
+                if kind not in ('int', 'float32') or name not in seen:
+                    continue
+                bad = sum(1 for r in records if not _is_number(r.get('fields', {}).get(name)))
+                if bad:
+                    issues.append(f"{bad} non-numeric values in '{name}'")
+
+        refines = {k[len('refine.'):]: v for k, v in params.items() if k.startswith('refine.')}
+        for field, value in refines.items():
+            mismatched = sum(1 for r in records if str(r.get('fields', {}).get(field)) != value)
+            if mismatched:
+                issues.append(f"{mismatched} records outside refine.{field}={value}")
+        return issues
+
+    def _probe(self, dataset_key: str, dataset_id: str) -> Dict:
+        try:
+            response = requests.get(f"{self.api_base}/search/", timeout=30, params={
+                'dataset': dataset_id,
+                'rows': self.probe_rows,
+                'format': 'json'
+            })
+            response.raise_for_status()
+            records = response.json().get('records', [])
+        except (requests.RequestException, ValueError) as e:
+            print(f"✗ Could not resolve schema for {dataset_key}: {e}")
+            return {}
+
+        # Records omit null fields, so take the union over the sample
+        samples: Dict[str, List] = {}
+        for record in records:
+            for name, value in record.get('fields', {}).items():
+                samples.setdefault(name, []).append(value)
+
+        refine_field = next((f for f in REFINE_CANDIDATES if f in samples), None)
+        refine_format = None
+        if refine_field is not None:
+            values = [str(v) for v in samples[refine_field]]
+            is_postal = refine_field == 'code_postal' or all(POSTAL_CODE.match(v) for v in values)
+            refine_format = 'postal' if is_postal else 'number'
+
+        return {
+            'dataset_id': dataset_id,
+            'fields': sorted(samples),
+            'refine_field': refine_field,
+            'refine_format': refine_format,
+            'resolved_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    def _expired(self, entry: Dict) -> bool:
+        resolved_at = datetime.fromisoformat(entry['resolved_at'])
+        return datetime.now(timezone.utc) - resolved_at > self.max_age
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_path.exists():
+                try:
+                    with open(self.cache_path) as f:
+                        self._cache = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"Ignoring unreadable schema cache: {e}")
+        return self._cache
+
+    def _save_cache(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._cache, f, indent=2, sort_keys=True)
+        tmp_path.replace(self.cache_path)
+
+
+def _is_number(value) -> bool:
+    if value is None:
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Geometry simplification for Paris garbage flow visualization.
+Produces per-zoom, topology-preserving simplified polygons and lines with
+quantized coordinates, cached next to the processed datasets. Cache entries
+are keyed by the content of the input, so the subsets read for different
+arrondissements are cached side by side.
+"""
+
+import hashlib
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Allow running this file directly, e.g. python scripts/simplify_geometries.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.dataset_schemas import write_geojson
+from scripts.partitioned_store import PartitionedStore
+
+# Paris Lambert 93 projection, used so tolerances are expressed in metres
+METRIC_CRS = 'EPSG:2154'
+
+# Web Mercator ground resolution at the equator for zoom 0 (metres per pixel)
+EQUATOR_RESOLUTION_M = 156543.03392
+
+
+class GeometrySimplifier:
+    """Builds and caches simplified versions of polygon and line datasets."""
+
+    SIMPLIFIED_DATASETS = ['arrondissement_boundaries', 'neighborhoods', 'road_network']
+    ZOOM_LEVELS = (11, 12, 13, 14, 15, 16)
+
+    def __init__(self, data_dir: Path = Path("data"), pixel_tolerance: float = 0.5,
+                 reference_lat: float = 48.86):
+        """
+        Args:
+            data_dir: Root data directory
+            pixel_tolerance: Maximum displacement allowed, in screen pixels
+            reference_lat: Latitude used to convert pixels to metres
+        """
+        self.processed_dir = data_dir / "processed"
+        self.cache_dir = self.processed_dir / "simplified"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.pixel_tolerance = pixel_tolerance
+        self.reference_lat = reference_lat
+
+    def tolerance_m(self, zoom: int) -> float:
+        """Simplification tolerance in metres for a zoom level."""
+        ground_resolution = EQUATOR_RESOLUTION_M * math.cos(math.radians(self.reference_lat)) / (2 ** zoom)
+        return ground_resolution * self.pixel_tolerance
+
+    def quantization_decimals(self, zoom: int) -> int:
+        """Decimal places of WGS84 coordinates kept at a zoom level (grid ~ tolerance / 4)."""
+        grid_deg = self.tolerance_m(zoom) / 4 / 111320.0
+        return max(0, int(math.ceil(-math.log10(grid_deg))))
+
+    def simplify(self, gdf: gpd.GeoDataFrame, zoom: int) -> gpd.GeoDataFrame:
+        """Return a simplified, quantized copy of ``gdf`` for display at ``zoom``."""
+        if len(gdf) == 0:
+            return gdf.copy()
+
+        source_crs = gdf.crs or 'EPSG:4326'
+        metric = gdf.set_crs(source_crs, allow_override=True).to_crs(METRIC_CRS)
+        geoms = np.asarray(metric.geometry.values)
+        tolerance = self.tolerance_m(zoom)
+
+        geom_types = shapely.get_type_id(geoms)
+        polygonal = np.isin(geom_types, [3, 6])  # Polygon, MultiPolygon
+        simplified = geoms.copy()
+        if polygonal.any():
+            simplified[polygonal] = simplify_coverage(geoms[polygonal], tolerance)
+        if (~polygonal).any():
+            # Douglas-Peucker keeps line end points, so network junctions stay connected
+            simplified[~polygonal] = shapely.simplify(geoms[~polygonal], tolerance, preserve_topology=True)
+
+        result = metric.copy()
+        result = result.set_geometry(gpd.GeoSeries(simplified, index=metric.index, crs=METRIC_CRS))
+        result = result.to_crs(source_crs)
+
+        # Shared vertices round to the same values, so quantization keeps borders aligned
+        decimals = self.quantization_decimals(zoom)
+        quantized = shapely.transform(np.asarray(result.geometry.values), lambda coords: np.round(coords, decimals))
+        invalid = ~shapely.is_valid(quantized)
+        if invalid.any():
+            quantized[invalid] = shapely.make_valid(quantized[invalid])
+        result = result.set_geometry(gpd.GeoSeries(quantized, index=result.index, crs=source_crs))
+        return result
+
+    def for_zoom(self, name: str, gdf: gpd.GeoDataFrame, zoom: int) -> gpd.GeoDataFrame:
+        """Return the cached simplified dataset for ``zoom``, building it if stale."""
+        fingerprint = dataset_fingerprint(gdf)
+        cached = self._load_cached(name, zoom, fingerprint)
+        if cached is not None:
+            return cached
+
+        simplified = self.simplify(gdf, zoom)
+        self._write_cached(name, zoom, fingerprint, simplified)
+        return simplified
+
+    def build_all(self, datasets: Dict[str, gpd.GeoDataFrame],
+                  zoom_levels: Optional[Iterable[int]] = None) -> Dict[str, Dict[int, int]]:
+        """Simplify every supported dataset at every zoom level and report sizes."""
+        zoom_levels = list(zoom_levels or self.ZOOM_LEVELS)
+        report = {}
+        for name in self.SIMPLIFIED_DATASETS:
+            gdf = datasets.get(name)
+            if gdf is None or len(gdf) == 0 or 'geometry' not in gdf:
+                continue
+            source_vertices = int(shapely.get_num_coordinates(np.asarray(gdf.geometry.values)).sum())
+            report[name] = {}
+            for zoom in zoom_levels:
+                simplified = self.for_zoom(name, gdf, zoom)
+                vertices = int(shapely.get_num_coordinates(np.asarray(simplified.geometry.values)).sum())
+                report[name][zoom] = vertices
+            print(f"✓ Simplified {name}: {source_vertices} vertices -> "
+                  + ", ".join(f"z{z}: {v}" for z, v in report[name].items()))
+        return report
+
+    def _cache_paths(self, name: str, zoom: int, fingerprint: str):
+        stem = f"{name}.{fingerprint[:16]}.z{zoom}"
+        return (
+            self.cache_dir / f"{stem}.geojson",
+            self.cache_dir / f"{stem}.meta.json"
+        )
+
+    def _load_cached(self, name: str, zoom: int, fingerprint: str) -> Optional[gpd.GeoDataFrame]:
+        data_path, meta_path = self._cache_paths(name, zoom, fingerprint)
+        if not data_path.exists() or not meta_path.exists():
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('fingerprint') != fingerprint or meta.get('pixel_tolerance') != self.pixel_tolerance:
+                return None
+            return gpd.read_file(data_path)
+        except Exception as e:
+            print(f"Error loading simplified {name} (z{zoom}): {e}")
+            return None
+
+    def _write_cached(self, name: str, zoom: int, fingerprint: str, gdf: gpd.GeoDataFrame):
+        data_path, meta_path = self._cache_paths(name, zoom, fingerprint)
+        try:
+            write_geojson(gdf, data_path)
+            with open(meta_path, 'w') as f:
+                json.dump({
+                    'fingerprint': fingerprint,
+                    'pixel_tolerance': self.pixel_tolerance,
+                    'tolerance_m': self.tolerance_m(zoom),
+                    'decimals': self.quantization_decimals(zoom)
+                }, f, indent=2)
+        except Exception as e:
+            print(f"Error caching simplified {name} (z{zoom}): {e}")
+
+
+def simplify_coverage(polygons: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplify a set of polygons so that shared borders stay shared.
+
+    Uses GEOS coverage simplification when available. Otherwise the borders
+    are split into arcs between junctions, each arc is simplified once and
+    the faces are rebuilt, so neighbouring polygons reuse the same vertices.
+    """
+    if hasattr(shapely, 'coverage_simplify'):
+        return np.asarray(shapely.coverage_simplify(polygons, tolerance))
+
+    noded = shapely.union_all(shapely.boundary(polygons))
+    arcs = shapely.get_parts(shapely.line_merge(noded))
+    arcs = shapely.simplify(arcs, tolerance, preserve_topology=True)
+    faces = shapely.get_parts(shapely.polygonize(arcs))
+    if len(faces) == 0:
+        return shapely.simplify(polygons, tolerance, preserve_topology=True)
+
+    # Assign each rebuilt face to the source polygon containing its interior point
+    tree = shapely.STRtree(polygons)
+    face_idx, poly_idx = tree.query(shapely.point_on_surface(faces), predicate='within')
+
+    result = np.empty(len(polygons), dtype=object)
+    for i in range(len(polygons)):
+        owned = faces[face_idx[poly_idx == i]]
+        if len(owned) == 0:
+            # Polygon collapsed below the tolerance; keep a simplified standalone version
+            result[i] = shapely.simplify(polygons[i], tolerance, preserve_topology=True)
+        else:
+            result[i] = shapely.union_all(owned)
+    return result
+
+
+def dataset_fingerprint(gdf: gpd.GeoDataFrame) -> str:
+    """Content hash of a dataset's geometries and column names."""
+    digest = hashlib.sha256()
+    digest.update(','.join(map(str, gdf.columns)).encode('utf-8'))
+    for wkb in shapely.to_wkb(np.asarray(gdf.geometry.values)):
+        if wkb is not None:
+            digest.update(wkb)
+    return digest.hexdigest()
+
+
+def main():
+    """Main execution function."""
+    simplifier = GeometrySimplifier()
+
+    print("Simplifying context geometries...")
+    print("-" * 50)
+
+    store = PartitionedStore(simplifier.processed_dir / "partitioned")
+    datasets = {}
+    for name in GeometrySimplifier.SIMPLIFIED_DATASETS:
+        path = simplifier.processed_dir / f"{name}.geojson"
+        if name in store.datasets():
+            gdf = store.read(name)
+            if gdf is not None:
+                datasets[name] = gdf
+        elif path.exists():
+            datasets[name] = gpd.read_file(path)
+
+    if not datasets:
+        print("No processed data found. Run fetch_paris_data.py first.")
+        return
+
+    simplifier.build_all(datasets)
+
+    print("-" * 50)
+    print(f"Simplified geometries saved to: {simplifier.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Facility siting for new drop-off stations in Paris.
+Proposes K new stations that minimise population-weighted distance to the
+nearest station (p-median) or the population left farther than a walking
+radius (maximal covering). Candidate sites are scored against a demand grid
+through a precomputed candidate-to-demand distance matrix, so every greedy
+step and swap move is a few vectorised NumPy operations. Demand and candidates
+are limited to the arrondissements whose existing stations were fetched.
+"""
+
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+# Allow running this file directly, e.g. python scripts/siting_optimizer.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.coverage_raster import (arrondissement_grid, arrondissements_with_points, cell_centres,
+                                     point_tree, select_boundaries)
+from scripts.deduplicate_containers import METRIC_CRS
+
+# Municipal population per arrondissement (INSEE legal populations, 2021)
+ARRONDISSEMENT_POPULATION = {
+    1: 15919, 2: 20744, 3: 32793, 4: 28324, 5: 56882, 6: 40916, 7: 48354,
+    8: 35418, 9: 59389, 10: 83543, 11: 142583, 12: 140311, 13: 177833, 14: 134382,
+    15: 228107, 16: 162820, 17: 164413, 18: 188446, 19: 182952, 20: 194994
+}
+
+STATION_DATASETS = ['trilib_stations', 'glass_igloos']
+
+OBJECTIVES = ('median', 'covering')
+
+
+class CandidateMatrix:
+    """
+    Candidate-to-demand distances in CSR form.
+
+    Only pairs where a candidate would serve a demand cell better than the
+    existing stations are kept. Any other pair can never change the
+    objective, so dropping them is exact and keeps the matrix small.
+    """
+
+    def __init__(self, indptr: np.ndarray, demand: np.ndarray, distance: np.ndarray, cost: np.ndarray):
+        self.indptr = indptr
+        self.demand = demand
+        self.distance = distance
+        self.cost = cost
+        self.candidates = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+
+    @property
+    def n_candidates(self) -> int:
+        return len(self.indptr) - 1
+
+    def row(self, candidate: int) -> slice:
+        return slice(self.indptr[candidate], self.indptr[candidate + 1])
+
+    def gains(self, current: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Weighted cost reduction of opening each candidate, given each demand cell's current cost."""
+        reduction = np.maximum(current[self.demand] - self.cost, 0) * weights[self.demand]
+        return np.bincount(self.candidates, weights=reduction, minlength=self.n_candidates)
+
+    def open(self, current: np.ndarray, candidate: int):
+        """Lower ``current`` in place to the costs offered by ``candidate``."""
+        row = self.row(candidate)
+        demand = self.demand[row]
+        current[demand] = np.minimum(current[demand], self.cost[row])
+
+    def nearest_two(self, base: np.ndarray, selected: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Best and second-best cost of each demand cell over the existing
+        stations and the selected sites, and the slot in ``selected``
+        providing the best (-1 for the existing stations, which win ties).
+        """
+        n = len(base)
+        rows = [np.arange(self.indptr[c], self.indptr[c + 1]) for c in selected]
+        positions = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        slots = np.repeat(np.arange(len(selected)), [len(r) for r in rows])
+
+        demand = np.concatenate([np.arange(n), self.demand[positions]])
+        cost = np.concatenate([base, self.cost[positions]])
+        slot = np.concatenate([np.full(n, -1), slots])
+        # lexsort is stable, so the existing stations come first among equal costs
+        order = np.lexsort((cost, demand))
+        demand, cost, slot = demand[order], cost[order], slot[order]
+
+        first = np.searchsorted(demand, np.arange(n))
+        second = np.minimum(first + 1, len(demand) - 1)
+        has_second = (first + 1 < len(demand)) & (demand[second] == np.arange(n))
+        return cost[first], np.where(has_second, cost[second], np.inf), slot[first]
+
+
+class SitingOptimizer:
+    """Greedy + swap p-median / maximal covering search for new station sites."""
+
+    def __init__(self, k: int = 50, objective: str = 'median', station_types: Optional[List[str]] = None,
+                 demand_resolution_m: float = 100.0, candidate_resolution_m: float = 100.0,
+                 coverage_radius_m: float = 300.0, restarts: int = 8, candidate_pool: int = 5,
+                 workers: Optional[int] = None, max_swap_rounds: int = 10, seed: int = 0):
+        """
+        Args:
+            k: Number of new stations to site
+            objective: 'median' (weighted distance to the nearest station) or
+                'covering' (weighted demand farther than ``coverage_radius_m``)
+            station_types: Datasets whose points are the existing stations
+            demand_resolution_m: Cell size of the population demand grid
+            candidate_resolution_m: Spacing of candidate sites
+            coverage_radius_m: Walking radius of the covering objective
+            restarts: Independent greedy + swap runs; the first is purely greedy,
+                the others pick each site at random among the ``candidate_pool`` best
+            candidate_pool: Candidates considered by each randomised greedy step
+            workers: Processes running restarts (CPU count by default)
+            max_swap_rounds: Upper bound on passes of the swap heuristic
+            seed: Seed of the randomised restarts
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}'. Use one of: {', '.join(OBJECTIVES)}")
+        self.k = k
+        self.objective = objective
+        self.station_types = station_types or STATION_DATASETS
+        self.demand_resolution_m = demand_resolution_m
+        self.candidate_resolution_m = candidate_resolution_m
+        self.coverage_radius_m = coverage_radius_m
+        self.restarts = restarts
+        self.candidate_pool = candidate_pool
+        self.workers = workers or multiprocessing.cpu_count()
+        self.max_swap_rounds = max_swap_rounds
+        self.seed = seed
+
+    def propose(self, datasets: Dict[str, gpd.GeoDataFrame],
+                arrondissements: Optional[Iterable[int]] = None) -> Optional[gpd.GeoDataFrame]:
+        """
+        Site ``k`` new stations.
+
+        Args:
+            datasets: Arrondissement boundaries and the existing station datasets
+            arrondissements: Arrondissements whose existing stations were fetched
+                (default: those containing at least one station). Elsewhere
+                every cell would look unserved and attract all the sites.
+
+        Returns:
+            One row per proposed site with its 'rank' (1 is the most valuable),
+            'arrondissement', 'population_served' (demand for which it becomes
+            the nearest station), 'distance_saved_m' (mean distance reduction
+            for that demand) and WGS84 geometry; None without boundaries or
+            existing stations
+        """
+        boundaries = datasets.get('arrondissement_boundaries')
+        if boundaries is None or len(boundaries) == 0:
+            print("No arrondissement boundaries: skipping station siting")
+            return None
+        boundaries = boundaries[boundaries.geometry.notna()].to_crs(METRIC_CRS)
+        if arrondissements is None:
+            arrondissements = arrondissements_with_points(boundaries, datasets, self.station_types)
+        boundaries = select_boundaries(boundaries, arrondissements)
+        if len(boundaries) == 0:
+            print("No existing stations inside the arrondissement boundaries: skipping station siting")
+            return None
+
+        demand_xy, demand_arr = self._grid_points(boundaries, self.demand_resolution_m)
+        candidate_xy, candidate_arr = self._grid_points(boundaries, self.candidate_resolution_m)
+        if len(demand_xy) == 0 or len(candidate_xy) == 0:
+            return None
+        weights = self._population_weights(demand_arr)
+
+        existing = self._existing_distance(datasets, demand_xy)
+        base = self._costs(existing)
+        matrix = self._candidate_matrix(candidate_xy, demand_xy, base)
+
+        k = min(self.k, matrix.n_candidates)
+        methods = multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        with ProcessPoolExecutor(max_workers=min(self.workers, self.restarts), mp_context=mp_context) as pool:
+            futures = [pool.submit(_solve_restart, self, matrix, base, weights, k, run)
+                       for run in range(self.restarts)]
+            runs = [future.result() for future in futures]
+        selected, objective = min(runs, key=lambda r: r[1])
+
+        print(f"✓ Sited {k} stations over {len(demand_xy)} demand cells, {len(candidate_xy)} candidates "
+              f"and {len(matrix.demand)} useful pairs: {self.objective} objective "
+              f"{float(base @ weights):,.0f} -> {objective:,.0f} (best of {self.restarts} restarts)")
+        return self._sites(matrix, selected, existing, base, weights, candidate_xy, candidate_arr)
+
+    def solve(self, matrix: CandidateMatrix, base: np.ndarray, weights: np.ndarray, k: int,
+              run: int = 0) -> Tuple[np.ndarray, float]:
+        """One greedy construction followed by swap improvement; returns sites and objective."""
+        rng = np.random.default_rng(self.seed + run)
+        pool = 1 if run == 0 else max(1, min(self.candidate_pool, matrix.n_candidates - k + 1))
+
+        # Greedy: add the site with the largest weighted cost reduction
+        current = base.copy()
+        selected = []
+        for _ in range(k):
+            gains = matrix.gains(current, weights)
+            gains[selected] = -np.inf
+            if pool > 1:
+                choice = int(rng.choice(np.argpartition(-gains, pool - 1)[:pool]))
+            else:
+                choice = int(np.argmax(gains))
+            selected.append(choice)
+            matrix.open(current, choice)
+
+        selected = np.array(selected, dtype=np.int64)
+        return selected, self._swap(matrix, base, weights, selected)
+
+    def _swap(self, matrix: CandidateMatrix, base: np.ndarray, weights: np.ndarray,
+              selected: np.ndarray) -> float:
+        """
+        Interchange heuristic: replace a site with the best outside candidate while it helps.
+
+        The best and second-best open station of every demand cell give the
+        cost of closing any one site without re-evaluating the others.
+        ``selected`` is updated in place; returns the final objective.
+        """
+        best1, best2, best_slot = matrix.nearest_two(base, selected)
+        tolerance = 1e-9 * max(float(best1 @ weights), 1.0)
+        for _ in range(self.max_swap_rounds):
+            improved = False
+            for slot in range(len(selected)):
+                without = np.where(best_slot == slot, best2, best1)
+                loss = float((without - best1) @ weights)
+                gains = matrix.gains(without, weights)
+                gains[selected] = -np.inf
+                candidate = int(np.argmax(gains))
+                if gains[candidate] - loss > tolerance:
+                    selected[slot] = candidate
+                    best1, best2, best_slot = matrix.nearest_two(base, selected)
+                    improved = True
+            if not improved:
+                break
+        return float(best1 @ weights)
+
+    def _grid_points(self, boundaries: gpd.GeoDataFrame, resolution_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Metric centres of the grid cells inside Paris and their arrondissement."""
+        labels, origin, _ = arrondissement_grid(boundaries, resolution_m)
+        flat = labels.ravel()
+        inside = np.flatnonzero(flat > 0)
+        xs, ys = cell_centres(inside, labels.shape, origin, resolution_m)
+        return np.column_stack([xs, ys]), flat[inside].astype(np.int64)
+
+    @staticmethod
+    def _population_weights(arrondissements: np.ndarray) -> np.ndarray:
+        """Each arrondissement's population spread evenly over its demand cells."""
+        cells = np.bincount(arrondissements, minlength=21).astype(np.float64)
+        totals = np.array([ARRONDISSEMENT_POPULATION.get(a, 0) for a in range(len(cells))], dtype=np.float64)
+        per_cell = np.divide(totals, cells, out=np.zeros_like(totals), where=cells > 0)
+        return per_cell[arrondissements]
+
+    def _existing_distance(self, datasets: Dict[str, gpd.GeoDataFrame], demand_xy: np.ndarray) -> np.ndarray:
+        """Distance from each demand cell to the nearest existing station."""
+        # Without stations of a type nearby, a cell is at most the city's diameter away
+        nearest = np.full(len(demand_xy), float(np.hypot(*np.ptp(demand_xy, axis=0))))
+        cells = shapely.points(demand_xy)
+        for name in self.station_types:
+            tree = point_tree(datasets.get(name))
+            if tree is None:
+                continue
+            (cell_idx, _), distance = tree.query_nearest(cells, return_distance=True, all_matches=False)
+            nearest[cell_idx] = np.minimum(nearest[cell_idx], distance)
+        return nearest.astype(np.float32)
+
+    def _costs(self, distances: np.ndarray) -> np.ndarray:
+        """Cost of serving demand at a distance; both objectives minimise it."""
+        if self.objective == 'covering':
+            return (distances > self.coverage_radius_m).astype(np.float32)
+        return distances.astype(np.float32)
+
+    def _candidate_matrix(self, candidate_xy: np.ndarray, demand_xy: np.ndarray,
+                          base: np.ndarray) -> CandidateMatrix:
+        """Distances of the candidate/demand pairs that improve on the existing stations."""
+        # Search each demand cell only as far as a candidate could still improve on it
+        if self.objective == 'covering':
+            radius = np.where(base > 0, self.coverage_radius_m, 0.0)
+        else:
+            radius = base.astype(np.float64)
+        active = np.flatnonzero(radius > 0)
+        tree = shapely.STRtree(shapely.points(candidate_xy))
+        local, candidate = tree.query(shapely.points(demand_xy[active]), predicate='dwithin',
+                                      distance=radius[active])
+        demand = active[local]
+
+        distance = np.hypot(*(candidate_xy[candidate] - demand_xy[demand]).T).astype(np.float32)
+        cost = self._costs(distance)
+        useful = cost < base[demand]
+        candidate, demand, distance, cost = candidate[useful], demand[useful], distance[useful], cost[useful]
+
+        order = np.argsort(candidate, kind='stable')
+        indptr = np.zeros(len(candidate_xy) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(candidate, minlength=len(candidate_xy)), out=indptr[1:])
+        return CandidateMatrix(indptr, demand[order], distance[order], cost[order])
+
+    def _sites(self, matrix: CandidateMatrix, selected: np.ndarray, existing: np.ndarray, base: np.ndarray,
+               weights: np.ndarray, candidate_xy: np.ndarray, candidate_arr: np.ndarray) -> gpd.GeoDataFrame:
+        """Proposed sites ranked by their marginal contribution."""
+        # Re-rank greedily within the final selection so rank 1 is the most valuable site
+        current = base.copy()
+        remaining = list(selected)
+        ranked = []
+        for _ in range(len(selected)):
+            gains = matrix.gains(current, weights)[remaining]
+            ranked.append(remaining.pop(int(np.argmax(gains))))
+            matrix.open(current, ranked[-1])
+
+        _, _, served_by = matrix.nearest_two(base, np.array(ranked, dtype=np.int64))
+        rows = []
+        for rank, candidate in enumerate(ranked):
+            row = matrix.row(candidate)
+            served = served_by[matrix.demand[row]] == rank
+            demand = matrix.demand[row][served]
+            population = float(weights[demand].sum())
+            saved = (existing[demand] - matrix.distance[row][served]) @ weights[demand]
+            rows.append({
+                'rank': rank + 1,
+                'arrondissement': int(candidate_arr[candidate]),
+                'population_served': int(round(population)),
+                'distance_saved_m': round(float(saved) / population, 1) if population > 0 else 0.0,
+                'geometry': shapely.Point(candidate_xy[candidate])
+            })
+        sites = gpd.GeoDataFrame(rows, geometry='geometry', crs=METRIC_CRS).to_crs('EPSG:4326')
+        sites['station_types'] = ';'.join(self.station_types)
+        return sites
+
+
+def _solve_restart(optimizer: SitingOptimizer, matrix: CandidateMatrix, base: np.ndarray,
+                   weights: np.ndarray, k: int, run: int) -> Tuple[np.ndarray, float]:
+    """Run one restart (in a worker)."""
+    return optimizer.solve(matrix, base, weights, k, run)
+
+
+def main():
+    """Propose new station sites from processed data."""
+    processed_dir = Path("data") / "processed"
+    datasets = {}
+    for name in STATION_DATASETS + ['arrondissement_boundaries']:
+        path = processed_dir / f"{name}.geojson"
+        if path.exists():
+            datasets[name] = gpd.read_file(path)
+    sites = SitingOptimizer().propose(datasets)
+    if sites is None:
+        return
+    output = Path("data") / "enriched" / "proposed_sites.geojson"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    sites.to_file(output, driver='GeoJSON')
+    print(f"Proposed sites saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Versioned snapshot store for fetched Paris Open Data records.
+Every unique record is stored once, addressed by a hash of its content, and
+each fetch is kept as a manifest of record hashes. Manifests are stored as
+deltas against the previous snapshot, so storage grows with the amount of
+change rather than the number of runs, and diffs between snapshots are set
+operations on hashes.
+
+A history is kept per dataset and query: fetches that request different
+fields or a different refine filter return different subsets of the same
+dataset, so each query shape gets its own chain of manifests, addressed by a
+hash of its parameters (paging parameters excluded).
+
+Layout:
+    data/snapshots/packs/<pack>.jsonl.gz      new records of one commit
+    data/snapshots/index.tsv                  hash -> pack, line, record id
+    data/snapshots/manifests/<dataset>/<query>/<id>.json
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# API fields that change on every publication without the record changing
+VOLATILE_KEYS = ('record_timestamp',)
+
+# Store the full hash list every this many snapshots to bound delta chains
+CHECKPOINT_INTERVAL = 20
+
+# Query parameters that only page through a result set
+PAGING_KEYS = ('rows', 'start')
+
+
+class SnapshotStore:
+    """Append-only, content-deduplicated history of fetched datasets."""
+
+    def __init__(self, root: Path = Path("data") / "snapshots"):
+        self.root = root
+        self.packs_dir = root / "packs"
+        self.manifests_dir = root / "manifests"
+        self.index_path = root / "index.tsv"
+        self._index: Optional[Dict[str, Tuple[str, int, str]]] = None
+        self._manifest_cache: Dict[Tuple[str, str], Dict] = {}
+        self._lock = threading.Lock()
+
+    def commit(self, dataset: str, records: List[Dict], query: Optional[Dict] = None,
+               meta: Optional[Dict] = None) -> Dict:
+        """
+        Record one fetch of a dataset.
+
+        Args:
+            dataset: Dataset key
+            records: Raw API records
+            query: Query parameters of the fetch; snapshots are only compared
+                with earlier fetches of the same query
+            meta: Extra information kept with the snapshot (nhits)
+
+        Returns:
+            Summary with the snapshot id and how many records were added,
+            removed and newly stored
+        """
+        with self._lock:
+            index = self._load_index()
+            current = set()
+            new_objects = []
+            for record in records:
+                clean = _strip_volatile(record)
+                digest = record_hash(clean)
+                if digest not in index and digest not in current:
+                    new_objects.append((digest, clean))
+                current.add(digest)
+
+            created_at = datetime.now(timezone.utc)
+            snapshot_id = created_at.strftime('%Y%m%dT%H%M%S%fZ')
+            if new_objects:
+                self._write_pack(f"{dataset}-{snapshot_id}", new_objects)
+
+            history = self.snapshots(dataset, query)
+            parent = history[-1] if history else None
+            previous = self.hashes(dataset, parent['snapshot_id'], query) if parent else set()
+            added, removed = sorted(current - previous), sorted(previous - current)
+
+            manifest = {
+                'snapshot_id': snapshot_id,
+                'dataset': dataset,
+                'created_at': created_at.isoformat(),
+                'record_count': len(current),
+                'query': query_scope(query),
+                'meta': meta or {}
+            }
+            depth = parent.get('depth', 0) + 1 if parent else 0
+            if parent is None or depth >= CHECKPOINT_INTERVAL:
+                manifest.update({'parent': None, 'depth': 0, 'hashes': sorted(current)})
+            else:
+                manifest.update({'parent': parent['snapshot_id'], 'depth': depth,
+                                 'added': added, 'removed': removed})
+
+            path = self._manifest_path(history_key(dataset, query), snapshot_id)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f)
+            tmp_path.replace(path)
+
+        return {
+            'snapshot_id': snapshot_id,
+            'records': len(current),
+            'added': len(added),
+            'removed': len(removed),
+            'new_objects': len(new_objects)
+        }
+
+    def snapshots(self, dataset: str, query: Optional[Dict] = None) -> List[Dict]:
+        """Snapshots of one query of a dataset, oldest first, without their hash lists."""
+        key = history_key(dataset, query)
+        directory = self.manifests_dir / key
+        if not directory.exists():
+            return []
+        summaries = []
+        for path in sorted(directory.glob('*.json')):
+            manifest = self._manifest(key, path.stem)
+            summaries.append({k: manifest.get(k) for k in
+                              ('snapshot_id', 'created_at', 'record_count', 'parent', 'depth',
+                               'query', 'meta')})
+        return summaries
+
+    def queries(self, dataset: str) -> List[Optional[Dict]]:
+        """Queries a dataset has a history for, as passed to ``commit``."""
+        directory = self.manifests_dir / dataset
+        if not directory.exists():
+            return []
+        found = []
+        for scope in sorted(p for p in directory.iterdir() if p.is_dir()):
+            latest = max(scope.glob('*.json'), default=None)
+            if latest is not None:
+                found.append(self._manifest(f"{dataset}/{scope.name}", latest.stem).get('query'))
+        return found
+
+    def resolve(self, dataset: str, snapshot_id: Optional[str] = None,
+                as_of: Optional[datetime] = None, query: Optional[Dict] = None) -> Optional[str]:
+        """
+        Snapshot id for a time-travel read.
+
+        Returns ``snapshot_id`` itself if given, the latest snapshot of the
+        query taken at or before ``as_of``, or its latest snapshot.
+        """
+        if snapshot_id is not None:
+            return snapshot_id
+        history = self.snapshots(dataset, query)
+        if as_of is not None:
+            if as_of.tzinfo is None:
+                as_of = as_of.replace(tzinfo=timezone.utc)
+            history = [s for s in history if datetime.fromisoformat(s['created_at']) <= as_of]
+        return history[-1]['snapshot_id'] if history else None
+
+    def hashes(self, dataset: str, snapshot_id: str, query: Optional[Dict] = None) -> Set[str]:
+        """Record hashes in a snapshot, replaying deltas from the last checkpoint."""
+        key = history_key(dataset, query)
+        chain = []
+        current = snapshot_id
+        while current is not None:
+            manifest = self._manifest(key, current)
+            chain.append(manifest)
+            current = manifest.get('parent')
+
+        result = set(chain[-1]['hashes'])
+        for manifest in reversed(chain[:-1]):
+            result.difference_update(manifest['removed'])
+            result.update(manifest['added'])
+        return result
+
+    def read(self, dataset: str, snapshot_id: Optional[str] = None,
+             as_of: Optional[datetime] = None, query: Optional[Dict] = None) -> List[Dict]:
+        """Records of any past snapshot of a query (the latest by default)."""
+        resolved = self.resolve(dataset, snapshot_id, as_of, query)
+        if resolved is None:
+            return []
+        return list(self.load_objects(self.hashes(dataset, resolved, query)).values())
+
+    def diff(self, dataset: str, old_id: str, new_id: str,
+             query: Optional[Dict] = None) -> Dict[str, List]:
+        """
+        Records added, removed and modified between two snapshots of a query.
+
+        Only the records that differ are read from the packs. A record whose
+        API record id appears on both sides is reported as modified.
+        """
+        old, new = self.hashes(dataset, old_id, query), self.hashes(dataset, new_id, query)
+        added_hashes, removed_hashes = new - old, old - new
+        index = self._load_index()
+
+        added_ids = {index[h][2]: h for h in added_hashes if h in index}
+        removed_ids = {index[h][2]: h for h in removed_hashes if h in index}
+        modified_ids = {rid for rid in set(added_ids) & set(removed_ids) if rid}
+
+        objects = self.load_objects(added_hashes | removed_hashes)
+        return {
+            'added': [objects[h] for h in sorted(added_hashes)
+                      if index.get(h, ('', 0, ''))[2] not in modified_ids],
+            'removed': [objects[h] for h in sorted(removed_hashes)
+                        if index.get(h, ('', 0, ''))[2] not in modified_ids],
+            'modified': [(objects[removed_ids[rid]], objects[added_ids[rid]]) for rid in sorted(modified_ids)]
+        }
+
+    def load_objects(self, hashes: Iterable[str]) -> Dict[str, Dict]:
+        """Read records by hash, opening each pack that holds any of them once."""
+        index = self._load_index()
+        wanted: Dict[str, Dict[int, str]] = {}
+        for digest in hashes:
+            pack, line, _ = index[digest]
+            wanted.setdefault(pack, {})[line] = digest
+
+        objects = {}
+        for pack, lines in wanted.items():
+            last = max(lines)
+            with gzip.open(self.packs_dir / f"{pack}.jsonl.gz", 'rt', encoding='utf-8') as f:
+                for number, text in enumerate(f):
+                    if number in lines:
+                        objects[lines[number]] = json.loads(text)
+                    if number >= last:
+                        break
+        return objects
+
+    def stats(self) -> Dict:
+        """Object count and bytes used by packs and manifests."""
+        index = self._load_index()
+        return {
+            'objects': len(index),
+            'pack_bytes': _directory_size(self.packs_dir),
+            'manifest_bytes': _directory_size(self.manifests_dir),
+            'index_bytes': self.index_path.stat().st_size if self.index_path.exists() else 0
+        }
+
+    def _write_pack(self, pack: str, objects: List[Tuple[str, Dict]]):
+        self.packs_dir.mkdir(parents=True, exist_ok=True)
+        pack_path = self.packs_dir / f"{pack}.jsonl.gz"
+        tmp_path = pack_path.with_suffix('.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for _, record in objects:
+                f.write(_canonical_json(record) + '\n')
+        tmp_path.replace(pack_path)
+
+        # The index is appended only after the pack is complete
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            for line, (digest, record) in enumerate(objects):
+                record_id = str(record.get('recordid', ''))
+                f.write(f"{digest}\t{pack}\t{line}\t{record_id}\n")
+                self._index[digest] = (pack, line, record_id)
+
+    def _load_index(self) -> Dict[str, Tuple[str, int, str]]:
+        if self._index is None:
+            self._index = {}
+            if self.index_path.exists():
+                with open(self.index_path, encoding='utf-8') as f:
+                    for text in f:
+                        parts = text.rstrip('\n').split('\t')
+                        if len(parts) == 4:
+                            self._index[parts[0]] = (parts[1], int(parts[2]), parts[3])
+        return self._index
+
+    def _manifest(self, history: str, snapshot_id: str) -> Dict:
+        key = (history, snapshot_id)
+        if key not in self._manifest_cache:
+            with open(self._manifest_path(history, snapshot_id)) as f:
+                self._manifest_cache[key] = json.load(f)
+        return self._manifest_cache[key]
+
+    def _manifest_path(self, history: str, snapshot_id: str) -> Path:
+        return self.manifests_dir / history / f"{snapshot_id}.json"
+
+
+def record_hash(record: Dict) -> str:
+    """Content hash of a record, independent of key order."""
+    return hashlib.blake2b(_canonical_json(record).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def query_scope(query: Optional[Dict]) -> Optional[Dict]:
+    """Query parameters that select which records a fetch returns."""
+    if query is None:
+        return None
+    return {k: v for k, v in query.items() if k not in PAGING_KEYS}
+
+
+def history_key(dataset: str, query: Optional[Dict] = None) -> str:
+    """Manifest directory of a dataset's history for one query shape."""
+    scope = query_scope(query)
+    if scope is None:
+        return dataset
+    return f"{dataset}/{record_hash(scope)[:12]}"
+
+
+def _canonical_json(record: Dict) -> str:
+    return json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def _strip_volatile(record: Dict) -> Dict:
+    return {k: v for k, v in record.items() if k not in VOLATILE_KEYS}
+
+
+def _directory_size(path: Path) -> int:
+    if not path.exists():
+        return 0
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def main():
+    """List snapshots or diff two of them."""
+    parser = argparse.ArgumentParser(description="Inspect the fetched data snapshot store")
+    parser.add_argument('dataset', nargs='?', help='Dataset key')
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'), help='Diff two snapshot ids')
+    parser.add_argument('--query', help='Query hash of the history to diff (as listed)')
+    parser.add_argument('--root', type=Path, default=Path("data") / "snapshots", help='Store directory')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.root)
+    if not args.dataset:
+        print(json.dumps(store.stats(), indent=2))
+        return
+
+    queries = {history_key(args.dataset, q).rpartition('/')[2]: q for q in store.queries(args.dataset)}
+    if args.diff:
+        if args.query is None and len(queries) > 1:
+            parser.error(f"--query is required, {args.dataset} has histories {', '.join(queries)}")
+        query = queries[args.query] if args.query else next(iter(queries.values()), None)
+        changes = store.diff(args.dataset, *args.diff, query=query)
+        print(f"{len(changes['added'])} added, {len(changes['removed'])} removed, "
+              f"{len(changes['modified'])} modified")
+        return
+
+    for scope, query in queries.items():
+        print(f"{scope}  {json.dumps(query, sort_keys=True)}")
+        for snapshot in store.snapshots(args.dataset, query):
+            kind = 'checkpoint' if snapshot['parent'] is None else 'delta'
+            print(f"  {snapshot['snapshot_id']}  {snapshot['record_count']:>7} records  {kind}")
+
+
+if __name__ == "__main__":
+    main()
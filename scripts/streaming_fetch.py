@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Overlapped fetch-and-process pipeline for Paris garbage flow visualization.
+Fetch threads page through the Open Data API and push pages onto a bounded
+queue; geometry conversion runs on a process pool as pages arrive, and each
+dataset is handed to the DatasetContext as soon as its last page is
+converted, so network waits and CPU work overlap instead of adding up.
+"""
+
+import multiprocessing
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+import geopandas as gpd
+import pandas as pd
+
+from scripts.dataset_context import DatasetContext
+from scripts.dataset_schemas import compact_dataset
+from scripts.fetch_paris_data import ParisDataFetcher
+
+
+class StreamingFetcher:
+    """Fetches datasets page by page and converts pages while later ones download."""
+
+    def __init__(self, fetcher: ParisDataFetcher, context: Optional[DatasetContext] = None,
+                 fetch_workers: int = 4, cpu_workers: Optional[int] = None,
+                 queue_size: int = 8, page_rows: int = 2000, inline_rows: int = 500):
+        """
+        Args:
+            fetcher: Fetcher providing requests, conversion and persistence
+            context: Context receiving converted datasets (a private one is used if None)
+            fetch_workers: Concurrent API requests
+            cpu_workers: Geometry conversion processes (CPU count by default)
+            queue_size: Pages buffered ahead of conversion; fetch threads block when full
+            page_rows: Records per API request
+            inline_rows: Pages smaller than this are converted in-process, where
+                the pickling round trip would cost more than the conversion
+        """
+        self.fetcher = fetcher
+        self.context = context
+        self.fetch_workers = fetch_workers
+        self.cpu_workers = cpu_workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.page_rows = page_rows
+        self.inline_rows = inline_rows
+        self.metrics = fetcher.metrics
+
+    def run(self, arrondissement: str = '14') -> Dict[str, pd.DataFrame]:
+        """
+        Fetch and process every dataset of an arrondissement.
+
+        Returns:
+            Datasets keyed by name: GeoDataFrames for geometric datasets,
+            plain DataFrames for tabular ones
+        """
+        print(f"Streaming data for {arrondissement}th arrondissement...")
+        plan = self.fetcher.fetch_plan(arrondissement)
+        start = time.perf_counter()
+
+        if self.context is not None:
+            datasets = self._run(plan, self.context)
+        else:
+            with DatasetContext() as context:
+                datasets = self._run(plan, context)
+
+        print("\n📊 Data fetching summary:")
+        print(f"   Successfully fetched: {len(datasets)}/{len(plan)} datasets")
+        print(f"   Fetched and processed in {time.perf_counter() - start:.1f}s")
+        return datasets
+
+    def _run(self, plan: List, context: DatasetContext) -> Dict[str, pd.DataFrame]:
+        pages: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        page_futures: Dict[str, Dict[int, Future]] = {}
+        expected_pages: Dict[str, int] = {}
+        in_flight = set()
+        datasets = {}
+
+        # Workers get a clean interpreter: forking while fetch threads hold locks is unsafe
+        methods = multiprocessing.get_all_start_methods()
+        mp_context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="fetch") as fetch_pool, \
+                ProcessPoolExecutor(max_workers=self.cpu_workers, mp_context=mp_context) as cpu_pool:
+            for key, filters in plan:
+                fetch_pool.submit(self._produce, pages, key, filters)
+
+            remaining = {key for key, _ in plan}
+            while remaining:
+                try:
+                    kind, key, index, payload = pages.get(timeout=0.05)
+                except queue.Empty:
+                    kind = None
+
+                if kind == 'page':
+                    # Bound conversions in flight so backpressure reaches the fetch threads
+                    while len(in_flight) >= self.cpu_workers * 2:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        in_flight -= done
+                    if len(payload) >= self.inline_rows:
+                        future = cpu_pool.submit(_convert_page, payload, key)
+                        in_flight.add(future)
+                    else:
+                        future = Future()
+                        try:
+                            future.set_result(_convert_page(payload, key))
+                        except Exception as e:
+                            # A bad page fails only its own dataset, in _finish
+                            future.set_exception(e)
+                    page_futures.setdefault(key, {})[index] = future
+                elif kind == 'done':
+                    expected_pages[key] = index
+
+                # Hand on every dataset whose pages have all been converted
+                for name in [k for k in remaining if k in expected_pages]:
+                    futures = page_futures.get(name, {})
+                    if len(futures) == expected_pages[name] and all(f.done() for f in futures.values()):
+                        remaining.discard(name)
+                        frame = self._finish(name, futures, context)
+                        if frame is not None:
+                            datasets[name] = frame
+
+        return datasets
+
+    def _produce(self, pages: "queue.Queue", key: str, filters: Optional[Dict]):
+        """Fetch all pages of one dataset onto the queue, then a completion marker."""
+        count = 0
+        try:
+            params = self.fetcher.search_params(key, filters, rows=self.page_rows)
+            print(f"Fetching {key} from {params['dataset']}...")
+            data = self.fetcher.fetch_page(key, params)
+            if not data.get('records') and filters:
+                print(f"No records found for {key}, retrying without filters...")
+                params = self.fetcher.search_params(key, None, rows=self.page_rows)
+                data = self.fetcher.fetch_page(key, params)
+
+            records = list(data.get('records', []))
+            nhits = data.get('nhits', len(records))
+            page = data.get('records', [])
+            while page:
+                pages.put(('page', key, count, page))
+                count += 1
+                offset = count * self.page_rows
+                if len(page) < self.page_rows or offset >= nhits:
+                    break
+                try:
+                    page = self.fetcher.fetch_page(key, {**params, 'start': offset}).get('records', [])
+                except Exception as e:
+                    # The API caps how deep a search can page; keep what arrived
+                    print(f"✗ Stopped paging {key} at {offset} records: {e}")
+                    break
+                records.extend(page)
+
+            if records:
+                self.fetcher.check_schema(key, records, params)
+                self.metrics.observe('fetch_pages', count, dataset=key)
+                self.fetcher.save_raw(key, {'nhits': nhits, 'parameters': params, 'records': records}, params)
+                print(f"✓ Fetched {len(records)} records for {key} in {count} pages")
+            else:
+                print(f"No records found for {key}")
+        except Exception as e:
+            print(f"✗ Error fetching {key}: {e}")
+        finally:
+            pages.put(('done', key, count, None))
+
+    def _finish(self, name: str, futures: Dict[int, Future], context: DatasetContext) -> Optional[pd.DataFrame]:
+        """Assemble a dataset's converted pages and hand it on."""
+        if not futures:
+            return None
+        try:
+            frames = [futures[i].result() for i in sorted(futures)]
+            frame = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+            if 'geometry' not in frame.columns:
+                return frame
+            if len(frames) > 1:
+                # Pages carry their own categories; re-compact the combined frame
+                frame = compact_dataset(gpd.GeoDataFrame(frame, geometry='geometry', crs='EPSG:4326'), name,
+                                        drop_unused=False)
+            return self.fetcher.store_processed(frame, name, context)
+        except Exception as e:
+            print(f"Error processing geometry for {name}: {e}")
+            return None
+
+
+def _convert_page(records: List[Dict], dataset_key: str) -> pd.DataFrame:
+    """Flatten one page of API records and convert its geometries (runs in a worker)."""
+    df = ParisDataFetcher._records_to_frame(records, dataset_key)
+    if 'geometry' not in df.columns:
+        return df
+    return ParisDataFetcher.convert_geometries(df, dataset_key)
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Waste tonnage time series for Paris garbage flow analytics.
+Loads the fetched per-capita and collected-tonnage statistics into dense
+arrondissement x waste type x month arrays, so range queries are array
+slices and yearly rollups are one reshape and sum. Annual figures are spread
+evenly over their twelve months; months without data are NaN. Arrondissement
+0 holds Paris-wide figures and is the fallback for arrondissements without
+their own series.
+
+Layout:
+    data/processed/tonnage_series/series.json      periods, waste types, measures
+    data/processed/tonnage_series/<measure>.npy    one file per measure
+"""
+
+import argparse
+import json
+import re
+import unicodedata
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+# Fetched datasets and the measure their values are
+SERIES_DATASETS = {
+    'waste_per_capita': 'kg_per_capita',
+    'waste_statistics': 'tonnage',
+}
+MEASURES = ['tonnage', 'kg_per_capita']
+
+# Arrondissement axis: 0 is Paris as a whole, 1-20 the arrondissements
+ARRONDISSEMENTS = 21
+
+# Source labels (accent-free, lowercase) mapped to the flow model's waste types
+WASTE_TYPE_PATTERNS = [
+    (r'verre|glass', 'glass'),
+    (r'encombrant|bulky', 'bulky_waste'),
+    (r'deee|electr', 'electronic_waste'),
+    (r'textile', 'textiles'),
+    (r'bio ?dechet|alimentaire|organi|compost', 'organic_waste'),
+    (r'emballage|multi ?materiau|jaune|recycl|papier|collecte selective', 'recyclables'),
+    (r'\bomr\b|ordure|residuel|menager|household', 'household_waste'),
+]
+
+# Numeric columns of wide tables that are not waste types
+NON_WASTE_COLUMNS = r'population|(nombre|nb) (d )?habitants?$|surface|geo|id$'
+
+# Arrondissement columns, in order of preference; label columns such as
+# 'granularite' (whose values read "Arrondissement") are never used
+ARRONDISSEMENT_COLUMNS = [r'^(c )?ar$|^arrondissement$', r'arrond|arrdt', r'code ?postal', r'insee|commune']
+
+# Value column of a long table, per measure, before the generic fallback
+VALUE_COLUMNS = {
+    'kg_per_capita': r'kg.*hab|par hab',
+    'tonnage': r'tonnage|tonne',
+}
+GENERIC_VALUE_COLUMN = r'tonnage|tonne|quantite|poids|kg|valeur|value'
+
+PeriodLike = Union[int, str, date, datetime, pd.Timestamp]
+
+
+class TonnageSeries:
+    """Monthly waste statistics per arrondissement and waste type."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], waste_types: List[str], first_year: int):
+        """
+        Args:
+            arrays: One (arrondissements x waste types x months) float32 array per
+                measure; the month axis starts in January of ``first_year`` and
+                covers whole years
+            waste_types: Categories of the waste type axis
+            first_year: Year of the first month column
+        """
+        self.arrays = arrays
+        self.waste_types = list(waste_types)
+        self.first_year = first_year
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    @property
+    def years(self) -> np.ndarray:
+        months = next(iter(self.arrays.values())).shape[2] if self.arrays else 0
+        return np.arange(self.first_year, self.first_year + months // 12)
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, pd.DataFrame]) -> "TonnageSeries":
+        """
+        Build the series from the fetched statistics tables.
+
+        Args:
+            tables: Flat tables keyed by dataset name (see SERIES_DATASETS), long
+                (one waste type column) or wide (one column per waste type)
+        """
+        frames = []
+        for name, measure in SERIES_DATASETS.items():
+            table = tables.get(name)
+            if table is not None and len(table):
+                frames.append(tidy_table(table, measure).assign(measure=measure))
+        rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=['arrondissement', 'waste_type', 'year', 'month', 'value', 'measure'])
+        if rows.empty:
+            return cls({measure: np.full((ARRONDISSEMENTS, 0, 0), np.nan, dtype=np.float32)
+                        for measure in MEASURES}, [], date.today().year)
+
+        # Annual rows become twelve monthly rows of a twelfth each
+        annual = rows['month'].isna()
+        spread = rows[annual].loc[lambda r: r.index.repeat(12)].assign(
+            month=np.tile(np.arange(1, 13), int(annual.sum())))
+        spread['value'] = spread['value'] / 12
+        rows = pd.concat([rows[~annual], spread], ignore_index=True)
+
+        known = [w for _, w in WASTE_TYPE_PATTERNS]
+        waste_types = sorted(rows['waste_type'].unique(), key=lambda w: (w not in known, w))
+        first_year = int(rows['year'].min())
+        months = (int(rows['year'].max()) - first_year + 1) * 12
+
+        waste_codes = pd.Categorical(rows['waste_type'], categories=waste_types).codes
+        month_codes = (rows['year'].to_numpy(dtype=np.int64) - first_year) * 12 + rows['month'].to_numpy(dtype=np.int64) - 1
+        flat = (rows['arrondissement'].to_numpy(dtype=np.int64) * len(waste_types) + waste_codes) * months + month_codes
+        size = ARRONDISSEMENTS * len(waste_types) * months
+
+        arrays = {}
+        for measure in MEASURES:
+            mask = (rows['measure'] == measure).to_numpy()
+            total = np.bincount(flat[mask], weights=rows['value'].to_numpy(dtype=np.float64)[mask], minlength=size)
+            count = np.bincount(flat[mask], minlength=size)
+            values = np.where(count > 0, total, np.nan).astype(np.float32)
+            arrays[measure] = values.reshape(ARRONDISSEMENTS, len(waste_types), months)
+        return cls(arrays, waste_types, first_year)
+
+    def range(self, measure: str = 'tonnage', since: Optional[PeriodLike] = None,
+              until: Optional[PeriodLike] = None, arrondissements: Optional[Iterable[int]] = None,
+              waste_types: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Monthly values between two periods (inclusive), as a long table.
+
+        Returns:
+            'arrondissement', 'waste_type', 'period' (YYYY-MM) and 'value' for
+            every month with data
+        """
+        values = self.arrays[measure]
+        start = self._month(since, end=False) if since is not None else 0
+        stop = self._month(until, end=True) + 1 if until is not None else values.shape[2]
+        start, stop = max(start, 0), min(stop, values.shape[2])
+        arr_idx = np.arange(ARRONDISSEMENTS) if arrondissements is None else np.asarray(list(arrondissements), dtype=int)
+        type_idx = (np.arange(len(self.waste_types)) if waste_types is None
+                    else np.array([self.waste_types.index(w) for w in waste_types if w in self.waste_types], dtype=int))
+
+        window = values[np.ix_(arr_idx, type_idx, np.arange(start, max(start, stop)))]
+        a, w, m = np.nonzero(~np.isnan(window))
+        month = start + m
+        return pd.DataFrame({
+            'arrondissement': arr_idx[a],
+            'waste_type': np.asarray(self.waste_types, dtype=object)[type_idx[w]],
+            'period': [f"{self.first_year + i // 12}-{i % 12 + 1:02d}" for i in month],
+            'value': window[a, w, m]
+        })
+
+    def annual(self, measure: str = 'tonnage') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Yearly totals (arrondissements x waste types x years) and the number
+        of months with data behind each total.
+        """
+        values = self.arrays[measure]
+        by_year = values.reshape(values.shape[0], values.shape[1], values.shape[2] // 12, 12)
+        observed = (~np.isnan(by_year)).sum(axis=3)
+        return np.nansum(by_year, axis=3, dtype=np.float64), observed
+
+    def rollup(self, measure: str = 'tonnage', by_arrondissement: bool = True) -> pd.DataFrame:
+        """
+        Yearly totals as a table, per arrondissement or summed over them.
+
+        Returns:
+            'arrondissement' (if ``by_arrondissement``), 'waste_type', 'year',
+            'value' and 'months' (months with data)
+        """
+        totals, observed = self.annual(measure)
+        if not by_arrondissement:
+            # Paris-wide figures (arrondissement 0) would double count the arrondissements
+            local = observed[1:].sum(axis=0) > 0
+            totals = np.where(local, totals[1:].sum(axis=0), totals[0])[None]
+            observed = np.where(local, observed[1:].max(axis=0), observed[0])[None]
+        a, w, y = np.nonzero(observed)
+        result = pd.DataFrame({
+            'arrondissement': a,
+            'waste_type': np.asarray(self.waste_types, dtype=object)[w],
+            'year': self.years[y],
+            'value': totals[a, w, y],
+            'months': observed[a, w, y]
+        })
+        return result if by_arrondissement else result.drop(columns='arrondissement')
+
+    def annual_rates(self, population: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generation rates in kg per person per year for every arrondissement,
+        waste type and year at once.
+
+        Per-capita figures are used where published, otherwise collected
+        tonnage divided by ``population``. Partial years are annualised and
+        arrondissements without data take the Paris-wide rate.
+
+        Returns:
+            Rates (arrondissements x waste types x years, NaN without data) and
+            a matching mask of arrondissement-specific rates
+        """
+        return _generation_rates(self.annual('kg_per_capita'), self.annual('tonnage'), population)
+
+    def monthly_rates(self, period: PeriodLike, population: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Like ``annual_rates`` for a single month, annualised (arrondissements x waste types x 1)."""
+        month = self._month(period, end=False)
+        windows = []
+        for measure in ('kg_per_capita', 'tonnage'):
+            values = self.arrays[measure]
+            window = (values[:, :, month:month + 1] if 0 <= month < values.shape[2]
+                      else np.full(values.shape[:2] + (1,), np.nan, dtype=np.float32))
+            windows.append((np.nan_to_num(window, nan=0.0), (~np.isnan(window)).astype(np.int64)))
+        return _generation_rates(*windows, population)
+
+    def rates(self, arrondissement: int, population: Dict[int, float],
+              period: Optional[PeriodLike] = None) -> Tuple[Dict[str, float], Optional[str]]:
+        """
+        Generation rates (kg per person per year) of one arrondissement.
+
+        Args:
+            arrondissement: Arrondissement number (0 for Paris)
+            population: Residents per arrondissement, for tonnage-only series
+            period: Year ('2022'), month ('2022-05', annualised) or None for
+                the latest year with data
+
+        Returns:
+            Rates per waste type (types without data are left out) and the
+            period they were taken from (None if there is no data)
+        """
+        if period is not None and _is_month(period):
+            column = self.monthly_rates(period, population)[0][arrondissement, :, 0]
+            label = pd.Timestamp(str(period)[:7]).strftime('%Y-%m')
+        else:
+            yearly = self.annual_rates(population)[0][arrondissement]
+            with_data = np.flatnonzero((~np.isnan(yearly)).any(axis=0))
+            if period is None:
+                year = int(with_data[-1]) if len(with_data) else -1
+            else:
+                year = int(str(period)[:4]) - self.first_year
+            if year not in with_data:
+                return {}, None
+            column, label = yearly[:, year], str(self.first_year + year)
+        rates = {w: float(v) for w, v in zip(self.waste_types, column) if not np.isnan(v)}
+        return rates, label if rates else None
+
+    def save(self, directory: Path) -> Path:
+        """Write every measure as .npy next to a JSON header."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+        with open(directory / "series.json", 'w') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'first_year': self.first_year,
+                'waste_types': self.waste_types,
+                'measures': list(self.arrays)
+            }, f, indent=2)
+        return directory
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "TonnageSeries":
+        """Load a saved series; arrays are memory-mapped unless ``mmap`` is False."""
+        with open(directory / "series.json") as f:
+            header = json.load(f)
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported tonnage series version: {header.get('version')}")
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in header['measures']}
+        return cls(arrays, header['waste_types'], header['first_year'])
+
+    def _month(self, period: PeriodLike, end: bool) -> int:
+        """Month column of a period; a bare year means its first (or last) month."""
+        if isinstance(period, (date, datetime, pd.Timestamp)):
+            year, month = period.year, period.month
+        else:
+            text = str(period)
+            year = int(text[:4])
+            month = int(text[5:7]) if len(text) >= 7 else (12 if end else 1)
+        return (year - self.first_year) * 12 + month - 1
+
+
+def _generation_rates(per_capita: Tuple[np.ndarray, np.ndarray], tonnage: Tuple[np.ndarray, np.ndarray],
+                      population: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Annualised kg per person from (totals, months with data) of both measures."""
+    people = np.array([population.get(a, 0) for a in range(ARRONDISSEMENTS)], dtype=np.float64)
+    people[0] = people[0] or people[1:].sum()
+    people = people[:, None, None]
+
+    (capita_total, capita_months), (tonnage_total, tonnage_months) = per_capita, tonnage
+    with np.errstate(divide='ignore', invalid='ignore'):
+        from_capita = capita_total * 12 / capita_months
+        from_tonnage = tonnage_total * 1000 * 12 / (tonnage_months * people)
+    rates = np.where(capita_months > 0, from_capita,
+                     np.where((tonnage_months > 0) & (people > 0), from_tonnage, np.nan))
+    local = ~np.isnan(rates)
+    local[0] = False
+    return np.where(local, rates, rates[0:1]), local
+
+
+def _is_month(period: PeriodLike) -> bool:
+    """Whether a period names a month rather than a year."""
+    return isinstance(period, (date, datetime, pd.Timestamp)) or bool(re.match(r'\d{4}-\d{2}', str(period)))
+
+
+def tidy_table(table: pd.DataFrame, measure: Optional[str] = None) -> pd.DataFrame:
+    """
+    One row per arrondissement, waste type and period of a fetched table.
+
+    Columns are recognised by name: a year or date column, an optional month
+    column, an optional arrondissement column (missing or non-numeric means
+    Paris as a whole) and either a waste type column with a value column or
+    one numeric column per waste type. With several candidate value columns,
+    the one matching ``measure`` (see VALUE_COLUMNS) wins, then the first in
+    table order.
+
+    Returns:
+        'arrondissement', 'waste_type', 'year', 'month' (NaN for annual
+        figures) and 'value'
+    """
+    columns = {column: _normalize(column) for column in table.columns if not str(column).startswith('_')}
+    numeric = [c for c in columns if pd.api.types.is_numeric_dtype(table[c])]
+
+    def find(pattern: str, pool) -> Optional[str]:
+        return next((c for c in pool if re.search(pattern, columns[c])), None)
+
+    def find_first(patterns: List[str], pool) -> Optional[str]:
+        return next((c for c in (find(p, pool) for p in patterns) if c is not None), None)
+
+    date_col = find(r'date|periode|period', columns)
+    year_col = find(r'^(annee|year|an)$|annee', columns)
+    month_col = find(r'^(mois|month)$', columns)
+    arr_col = find_first(ARRONDISSEMENT_COLUMNS, [c for c in columns if 'granularite' not in columns[c]])
+    skip = {date_col, year_col, month_col, arr_col}
+    type_col = find(r'type|flux|nature|categor|dechet', [c for c in columns if c not in numeric and c not in skip])
+    candidates = [c for c in numeric if c not in skip]
+    value_patterns = [VALUE_COLUMNS[measure]] if measure in VALUE_COLUMNS else []
+    value_col = find_first(value_patterns + [GENERIC_VALUE_COLUMN], candidates) if type_col else None
+
+    if date_col is not None:
+        text = table[date_col].astype(str)
+        dates = pd.to_datetime(text, errors='coerce')
+        # A bare year in a date column is an annual figure
+        years, months = dates.dt.year, dates.dt.month.where(text.str.len() > 4)
+        if year_col is not None:
+            years = years.fillna(pd.to_numeric(table[year_col], errors='coerce'))
+    elif year_col is not None:
+        years = pd.to_numeric(table[year_col].astype(str).str[:4], errors='coerce')
+        months = (pd.to_numeric(table[month_col], errors='coerce') if month_col is not None
+                  else pd.Series(np.nan, index=table.index))
+    else:
+        return pd.DataFrame(columns=['arrondissement', 'waste_type', 'year', 'month', 'value'])
+
+    arrondissement = (pd.Series(0, index=table.index) if arr_col is None else
+                      pd.to_numeric(table[arr_col].astype(str).str.extract(r'(\d+)')[0], errors='coerce')
+                      .mod(100).where(lambda a: a.between(1, 20), 0))
+    base = pd.DataFrame({'arrondissement': arrondissement.astype(int), 'year': years, 'month': months})
+
+    if type_col is not None and value_col is not None:
+        long = base.assign(waste_type=table[type_col].map(waste_type_for),
+                           value=pd.to_numeric(table[value_col], errors='coerce'))
+    else:
+        value_cols = [c for c in numeric if c not in skip and not re.match(NON_WASTE_COLUMNS, columns[c])]
+        long = pd.concat([base.assign(waste_type=waste_type_for(c), value=table[c]) for c in value_cols],
+                         ignore_index=True) if value_cols else base.assign(waste_type=None, value=np.nan)
+
+    long = long.dropna(subset=['year', 'value', 'waste_type'])
+    long = long[long['month'].isna() | long['month'].between(1, 12)]
+    return long.astype({'year': int})[['arrondissement', 'waste_type', 'year', 'month', 'value']]
+
+
+def waste_type_for(label) -> Optional[str]:
+    """The flow model's waste type for a source label, or the label as a slug."""
+    text = _normalize(label)
+    if not text:
+        return None
+    for pattern, waste_type in WASTE_TYPE_PATTERNS:
+        if re.search(pattern, text):
+            return waste_type
+    return text.replace(' ', '_')
+
+
+def _normalize(value) -> str:
+    """Lowercase, accent-free, single-spaced text ('' when missing)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii').lower()
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9_ ]+', ' ', text).replace('_', ' ')).strip()
+
+
+def main():
+    """Print yearly rollups or a range of the saved tonnage series."""
+    parser = argparse.ArgumentParser(description="Query the waste tonnage time series")
+    parser.add_argument('--series', type=Path, default=Path("data") / "processed" / "tonnage_series",
+                        help='Saved series directory')
+    parser.add_argument('--measure', choices=MEASURES, default='tonnage')
+    parser.add_argument('--arrondissement', type=int, action='append', help='Restrict to arrondissements')
+    parser.add_argument('--since', help='First period (YYYY or YYYY-MM)')
+    parser.add_argument('--until', help='Last period (YYYY or YYYY-MM)')
+    args = parser.parse_args()
+
+    series = TonnageSeries.load(args.series)
+    if args.since or args.until:
+        result = series.range(args.measure, args.since, args.until, args.arrondissement)
+    else:
+        result = series.rollup(args.measure)
+        if args.arrondissement:
+            result = result[result['arrondissement'].isin(args.arrondissement)]
+    print(result.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
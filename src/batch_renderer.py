@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Batch rendering of many garbage flow maps.
+Loads the shared datasets once and fans map rendering out over a process pool,
+one map per arrondissement, waste type or scenario.
+"""
+
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import geopandas as gpd
+import pandas as pd
+
+# Allow running this file directly, e.g. python src/batch_renderer.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.dataset_context import DatasetContext
+from src.map_visualizer import GarbageFlowVisualizer
+
+# Datasets shared with worker processes. Populated in the parent before the
+# pool starts so forked workers inherit it copy-on-write instead of reloading.
+_SHARED_DATA: Dict[str, any] = {}
+_WORKER_SETTINGS: Dict[str, any] = {}
+
+
+class BatchMapRenderer:
+    """Renders many maps from a single load of the shared datasets."""
+
+    def __init__(self, data_dir: Path = Path("data"), output_dir: Path = Path("static") / "batch",
+                 prefix: str = "garbage_flow", max_workers: Optional[int] = None,
+                 external_assets: bool = False):
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_workers = max_workers
+        self.external_assets = external_assets
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Set when the shared data came from an in-memory context, which
+        # workers that were not forked cannot reload from disk
+        self.in_memory = False
+
+    def load(self, context: Optional[DatasetContext] = None) -> Dict[str, any]:
+        """Load the shared datasets once for every job in the batch."""
+        data = GarbageFlowVisualizer(self.data_dir).load_data(context, all_arrondissements=True)
+        self.in_memory = context is not None
+        _SHARED_DATA.clear()
+        _SHARED_DATA.update(data)
+        return data
+
+    def output_path(self, job: Dict) -> Path:
+        """Consistent output file name for a job: ``<prefix>_<job name>.html``."""
+        return self.output_dir / f"{self.prefix}_{_slugify(job['name'])}.html"
+
+    def render(self, jobs: List[Dict]) -> List[Dict]:
+        """
+        Render all jobs and return one result per job.
+
+        Args:
+            jobs: Job dicts with a unique 'name' and optional 'arrondissement',
+                'collection_types' and 'overrides' (dataset key -> replacement data)
+
+        Returns:
+            Result dicts with 'name', 'path', 'seconds' and 'error'
+        """
+        if not _SHARED_DATA:
+            self.load()
+
+        _WORKER_SETTINGS.update({
+            'data_dir': self.data_dir,
+            'output_dir': self.output_dir,
+            'external_assets': self.external_assets
+        })
+
+        tasks = [(job, self.output_path(job)) for job in jobs]
+        results = []
+        start = time.perf_counter()
+
+        # Fork keeps the loaded datasets shared copy-on-write; other start
+        # methods reload them once per worker in the initializer, or receive
+        # them pickled when they were not loaded from disk.
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        ctx = multiprocessing.get_context(method)
+        initargs = (None,)
+        if method != 'fork':
+            settings = dict(_WORKER_SETTINGS)
+            if self.in_memory:
+                settings['shared_data'] = dict(_SHARED_DATA)
+            initargs = (settings,)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=initargs) as pool:
+            futures = {pool.submit(_render_job, job, path): job for job, path in tasks}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'name': job['name'], 'path': None, 'seconds': None, 'error': str(e)}
+                results.append(result)
+                status = "✓" if result['error'] is None else "✗"
+                print(f"{status} [{len(results)}/{len(tasks)}] {result['name']}")
+
+        failures = sum(1 for r in results if r['error'] is not None)
+        print(f"Rendered {len(results) - failures}/{len(tasks)} maps in {time.perf_counter() - start:.1f}s")
+        return sorted(results, key=lambda r: r['name'])
+
+    @staticmethod
+    def arrondissement_jobs(arrondissements: Optional[List[str]] = None) -> List[Dict]:
+        """One job per arrondissement (all 20 by default)."""
+        arrondissements = arrondissements or [str(i) for i in range(1, 21)]
+        return [{'name': f"arr_{int(a):02d}", 'arrondissement': str(a)} for a in arrondissements]
+
+    @staticmethod
+    def collection_type_jobs(collection_types: List[str], arrondissement: str = '14') -> List[Dict]:
+        """One job per collection infrastructure type within an arrondissement."""
+        return [
+            {'name': f"arr_{int(arrondissement):02d}_{t}", 'arrondissement': arrondissement,
+             'collection_types': [t]}
+            for t in collection_types
+        ]
+
+
+def filter_for_arrondissement(data: Dict[str, any], arrondissement: str) -> Dict[str, any]:
+    """Restrict point datasets to one arrondissement, keeping context layers whole."""
+    target = int(arrondissement)
+    boundary = None
+    boundaries = data.get('arrondissement_boundaries')
+    if boundaries is not None and 'c_ar' in boundaries.columns:
+        selected = boundaries[pd.to_numeric(boundaries['c_ar'], errors='coerce') == target]
+        if len(selected) > 0:
+            boundary = selected.geometry.unary_union
+
+    filtered = {}
+    for key, value in data.items():
+        if not isinstance(value, gpd.GeoDataFrame) or key == 'arrondissement_boundaries':
+            filtered[key] = value
+            continue
+
+        column = next((c for c in ('arrondissement', 'c_ar') if c in value.columns), None)
+        if column is not None:
+            codes = pd.to_numeric(value[column].astype(str).str.extract(r'(\d+)')[0], errors='coerce') % 100
+            filtered[key] = value[_with_treatment(value, codes == target)]
+        elif boundary is not None and (value.geom_type == 'Point').all():
+            filtered[key] = value[_with_treatment(value, value.within(boundary))]
+        else:
+            filtered[key] = value
+    return filtered
+
+
+def _with_treatment(value: gpd.GeoDataFrame, keep: pd.Series) -> pd.Series:
+    """Add treatment facilities to a row mask: they sit outside Paris and serve every arrondissement."""
+    if 'type' in value.columns:
+        return keep | (value['type'] == 'treatment')
+    return keep
+
+
+def _init_worker(settings: Optional[Dict]):
+    """Load shared data in workers that were not forked from the parent."""
+    if settings is None:
+        return
+    shared = settings.pop('shared_data', None)
+    _WORKER_SETTINGS.update(settings)
+    if not _SHARED_DATA:
+        if shared is None:
+            # Same load as BatchMapRenderer.load: every arrondissement, filtered per job
+            shared = GarbageFlowVisualizer(settings['data_dir']).load_data(all_arrondissements=True)
+        _SHARED_DATA.update(shared)
+
+
+def _render_job(job: Dict, output_path: Path) -> Dict:
+    """Render one job in a worker process."""
+    start = time.perf_counter()
+    arrondissement = str(job.get('arrondissement', '14'))
+
+    data = dict(_SHARED_DATA)
+    data.update(job.get('overrides', {}))
+    if 'arrondissement' in job:
+        data = filter_for_arrondissement(data, arrondissement)
+
+    visualizer = GarbageFlowVisualizer(_WORKER_SETTINGS['data_dir'], arrondissement=arrondissement)
+    visualizer.output_dir = _WORKER_SETTINGS['output_dir']
+    if 'collection_types' in job:
+        visualizer.collection_types = list(job['collection_types'])
+
+    if 'arrondissement_boundaries' in data:
+        selected = visualizer.select_arrondissement_boundary(data['arrondissement_boundaries'])
+        if len(selected) > 0:
+            centroid = selected.geometry.unary_union.centroid
+            visualizer.center_lat, visualizer.center_lon = centroid.y, centroid.x
+
+    map_obj = visualizer.build_map(data, external_assets=_WORKER_SETTINGS['external_assets'])
+    # Assets are shared between maps of the batch, so nothing is pruned here
+    map_obj.save(str(output_path))
+
+    return {
+        'name': job['name'],
+        'path': str(output_path),
+        'seconds': time.perf_counter() - start,
+        'error': None
+    }
+
+
+def _slugify(name: str) -> str:
+    """File-name-safe version of a job name."""
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', name).strip('-') or 'map'
+
+
+def main():
+    """Render one map per arrondissement."""
+    renderer = BatchMapRenderer()
+
+    print("Rendering garbage flow maps for every arrondissement...")
+    print("-" * 50)
+
+    renderer.load()
+    results = renderer.render(BatchMapRenderer.arrondissement_jobs())
+
+    print("-" * 50)
+    print(f"Maps saved to: {renderer.output_dir}")
+    for result in results:
+        if result['error']:
+            print(f"  {result['name']}: {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
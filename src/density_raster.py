@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Server-side kernel density rasters for the Paris garbage flow map.
+Bins weighted points on a grid and smooths them with an FFT convolution so the
+browser only has to display a pre-rendered image.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Approximate length of one degree of latitude in metres
+METERS_PER_DEGREE = 111320.0
+
+
+class DensityRasterizer:
+    """Rasterizes weighted point intensity on a regular grid."""
+
+    def __init__(self, bandwidth_m: float = 120.0, base_resolution_m: float = 10.0,
+                 max_pixels: int = 4_000_000):
+        """
+        Args:
+            bandwidth_m: Standard deviation of the Gaussian kernel in metres
+            base_resolution_m: Finest cell size
+            max_pixels: Upper bound on the number of cells; the cell size is
+                doubled until the grid fits
+        """
+        self.bandwidth_m = bandwidth_m
+        self.base_resolution_m = base_resolution_m
+        self.max_pixels = max_pixels
+
+    def rasterize(self, lons: np.ndarray, lats: np.ndarray,
+                  weights: Optional[np.ndarray] = None,
+                  bounds: Optional[Tuple[float, float, float, float]] = None,
+                  zoom: Optional[int] = None) -> Optional[Dict]:
+        """
+        Build a density grid for weighted points.
+
+        Args:
+            lons: Point longitudes (WGS84)
+            lats: Point latitudes (WGS84)
+            weights: Per-point weights; defaults to 1
+            bounds: Optional (min_lon, min_lat, max_lon, max_lat) extent
+            zoom: Web map zoom the grid is displayed at; cells finer than half
+                a screen pixel there are not computed
+
+        Returns:
+            Dict with 'resolution_m', 'bounds' and 'grid' (rows ordered north
+            to south), or None without valid points
+        """
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        weights = np.ones_like(lons) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        valid = np.isfinite(lons) & np.isfinite(lats) & np.isfinite(weights)
+        lons, lats, weights = lons[valid], lats[valid], weights[valid]
+        if len(lons) == 0:
+            return None
+
+        if bounds is None:
+            bounds = self._padded_bounds(lons, lats)
+        min_lon, min_lat, max_lon, max_lat = bounds
+        lat0 = (min_lat + max_lat) / 2
+        m_per_deg_lon = METERS_PER_DEGREE * np.cos(np.radians(lat0))
+
+        width_m = (max_lon - min_lon) * m_per_deg_lon
+        height_m = (max_lat - min_lat) * METERS_PER_DEGREE
+        resolution = self.base_resolution_m
+        if zoom is not None:
+            resolution = max(resolution, ground_resolution(lat0, zoom) / 2)
+        while (width_m / resolution) * (height_m / resolution) > self.max_pixels:
+            resolution *= 2
+
+        nx = max(int(np.ceil(width_m / resolution)), 1)
+        ny = max(int(np.ceil(height_m / resolution)), 1)
+        max_lon = min_lon + nx * resolution / m_per_deg_lon
+        max_lat = min_lat + ny * resolution / METERS_PER_DEGREE
+
+        binned, _, _ = np.histogram2d(
+            lats, lons, bins=(ny, nx),
+            range=((min_lat, max_lat), (min_lon, max_lon)),
+            weights=weights
+        )
+        grid = self._gaussian_smooth(binned, self.bandwidth_m / resolution)
+        return {
+            'resolution_m': resolution,
+            'bounds': (min_lon, min_lat, max_lon, max_lat),
+            'grid': grid[::-1].astype(np.float32)
+        }
+
+    def to_rgba(self, grid: np.ndarray, cmap: str = 'YlOrRd',
+                max_alpha: float = 0.85) -> np.ndarray:
+        """Colour a density grid, fading transparent where intensity is low."""
+        peak = float(grid.max()) if grid.size else 0.0
+        if peak <= 0:
+            return np.zeros(grid.shape + (4,), dtype=np.uint8)
+
+        normalized = np.clip(grid / peak, 0, 1)
+        rgba = plt.get_cmap(cmap)(normalized)
+        rgba[..., 3] = np.sqrt(normalized) * max_alpha
+        return (rgba * 255).astype(np.uint8)
+
+    def _padded_bounds(self, lons: np.ndarray, lats: np.ndarray) -> Tuple[float, float, float, float]:
+        """Extent of the points padded by three kernel bandwidths."""
+        lat0 = float(np.mean(lats))
+        pad_lat = 3 * self.bandwidth_m / METERS_PER_DEGREE
+        pad_lon = 3 * self.bandwidth_m / (METERS_PER_DEGREE * np.cos(np.radians(lat0)))
+        return (
+            float(lons.min() - pad_lon), float(lats.min() - pad_lat),
+            float(lons.max() + pad_lon), float(lats.max() + pad_lat)
+        )
+
+    @staticmethod
+    def _gaussian_smooth(grid: np.ndarray, sigma_cells: float) -> np.ndarray:
+        """Convolve a grid with a Gaussian kernel using zero-padded real FFTs."""
+        if sigma_cells < 0.5:
+            return grid.copy()
+
+        radius = int(np.ceil(3 * sigma_cells))
+        offsets = np.arange(-radius, radius + 1)
+        kernel_1d = np.exp(-0.5 * (offsets / sigma_cells) ** 2)
+        kernel = np.outer(kernel_1d, kernel_1d)
+        kernel /= kernel.sum()
+
+        shape = (grid.shape[0] + kernel.shape[0] - 1, grid.shape[1] + kernel.shape[1] - 1)
+        spectrum = np.fft.rfft2(grid, shape) * np.fft.rfft2(kernel, shape)
+        full = np.fft.irfft2(spectrum, shape)
+
+        smoothed = full[radius:radius + grid.shape[0], radius:radius + grid.shape[1]]
+        # FFT round-off can leave tiny negative values in empty areas
+        return np.maximum(smoothed, 0)
+
+
+def ground_resolution(lat: float, zoom: int) -> float:
+    """Metres per screen pixel of a Web Mercator map at ``lat`` and ``zoom``."""
+    return 156543.03392 * np.cos(np.radians(lat)) / (2 ** zoom)
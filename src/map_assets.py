@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Externalized layer assets for the Paris garbage flow map.
+Writes per-layer data as content-hashed, gzip-compressed files next to the map
+and provides a Leaflet layer that fetches them the first time it is shown.
+"""
+
+import gzip
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.plugins import MarkerCluster
+from folium.raster_layers import ImageOverlay
+from jinja2 import Template
+
+
+class LayerAssetWriter:
+    """Writes layer payloads as immutable, content-addressed files.
+
+    File names embed a hash of their content, so an unchanged layer keeps the
+    same URL across rebuilds and stays in the browser cache, while a changed
+    layer gets a new URL.
+    """
+
+    def __init__(self, output_dir: Path, subdir: str = "layers"):
+        self.subdir = subdir
+        self.asset_dir = output_dir / subdir
+        self.asset_dir.mkdir(parents=True, exist_ok=True)
+        self.written: Dict[str, str] = {}
+
+    def write_json(self, layer_name: str, payload: Dict) -> str:
+        """Write a JSON payload and return its URL relative to the map file."""
+        raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # mtime=0 keeps the gzip header, and therefore the hash, deterministic
+        return self._write(layer_name, gzip.compress(raw, compresslevel=9, mtime=0), 'json.gz')
+
+    def write_bytes(self, layer_name: str, data: bytes, extension: str) -> str:
+        """Write an already-encoded payload (e.g. a PNG) and return its URL."""
+        return self._write(layer_name, data, extension)
+
+    def prune(self) -> int:
+        """Delete older versions of the layers written by this writer."""
+        current = set(self.written.values())
+        slugs: Set[str] = {name.split('.', 1)[0] for name in current}
+        removed = 0
+        for path in self.asset_dir.iterdir():
+            if path.name in current or path.name.split('.', 1)[0] not in slugs:
+                continue
+            path.unlink()
+            removed += 1
+        return removed
+
+    def _write(self, layer_name: str, data: bytes, extension: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        filename = f"{_slugify(layer_name)}.{digest}.{extension}"
+        path = self.asset_dir / filename
+        if not path.exists():
+            path.write_bytes(data)
+        self.written[layer_name] = filename
+        return f"{self.subdir}/{filename}"
+
+
+class LazyGeoJson(JSCSSMixin, Layer):
+    """GeoJSON overlay whose data is fetched the first time the layer is shown.
+
+    Features may carry ``popup``, ``tooltip``, ``icon``, ``color`` and
+    ``style`` properties. Payloads are gzip files decoded in the browser with
+    ``DecompressionStream``, so the map must be served over HTTP
+    (``main.py --serve``) rather than opened from ``file://``.
+    """
+
+    _template = Template(u"""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = {% if this.cluster %}L.markerClusterGroup(){% else %}L.featureGroup(){% endif %};
+            {{ this.get_name() }}.on('add', function() {
+                var group = {{ this.get_name() }};
+                if (group._lazyLoaded) { return; }
+                group._lazyLoaded = true;
+                fetch({{ this.url|tojson }})
+                    .then(function(response) {
+                        if (response.headers.get('Content-Encoding') || typeof DecompressionStream === 'undefined') {
+                            return response.json();
+                        }
+                        return new Response(response.body.pipeThrough(new DecompressionStream('gzip'))).json();
+                    })
+                    .then(function(data) {
+                        L.geoJSON(data, {
+                            pointToLayer: function(feature, latlng) {
+                                var p = feature.properties || {};
+                                if (p.icon) {
+                                    return L.marker(latlng, {icon: L.AwesomeMarkers.icon(
+                                        {icon: p.icon, markerColor: p.color || 'gray', prefix: 'fa'}
+                                    )});
+                                }
+                                return L.circleMarker(latlng, p.style || {radius: 5});
+                            },
+                            style: function(feature) {
+                                return (feature.properties || {}).style || {};
+                            },
+                            onEachFeature: function(feature, layer) {
+                                var p = feature.properties || {};
+                                if (p.popup) { layer.bindPopup(p.popup, {maxWidth: {{ this.popup_max_width }}}); }
+                                if (p.tooltip) { layer.bindTooltip(p.tooltip); }
+                            }
+                        }).eachLayer(function(layer) { group.addLayer(layer); });
+                    })
+                    .catch(function(error) {
+                        group._lazyLoaded = false;
+                        console.error('Failed to load layer {{ this.layer_name }}', error);
+                    });
+            });
+            {% if this.show %}
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+            {% endif %}
+        {% endmacro %}
+        """)
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, url: str, name: Optional[str] = None, cluster: bool = False,
+                 popup_max_width: int = 280, show: bool = True, **kwargs):
+        super().__init__(name=name, show=show, **kwargs)
+        self._name = 'LazyGeoJson'
+        self.url = url
+        self.cluster = cluster
+        self.popup_max_width = popup_max_width
+
+
+class LazyImageOverlay(ImageOverlay):
+    """Image overlay referencing an image file by URL instead of embedding it.
+
+    Leaflet only creates the ``<img>`` element, and so only requests the
+    file, when the layer is first added to the map. The image must already
+    be Web Mercator projected.
+    """
+
+    def __init__(self, url: str, bounds, name: Optional[str] = None, show: bool = True,
+                 pixelated: bool = True, **kwargs):
+        # ImageOverlay.__init__ would open a relative URL as a local file and inline it
+        Layer.__init__(self, name=name, show=show)
+        self._name = 'ImageOverlay'
+        self.bounds = bounds
+        self.options = kwargs
+        self.pixelated = pixelated
+        self.url = url
+
+
+def feature_collection(features: List[Dict]) -> Dict:
+    """Wrap GeoJSON features in a FeatureCollection."""
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def point_feature(lon: float, lat: float, properties: Dict) -> Dict:
+    """Build a GeoJSON point feature with coordinates rounded to ~10 cm."""
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+        'properties': properties
+    }
+
+
+def _slugify(name: str) -> str:
+    """Turn a layer name into a file-name-safe slug without dots."""
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'layer'
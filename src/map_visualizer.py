@@ -8,18 +8,47 @@ import folium
 import geopandas as gpd
 import pandas as pd
 import json
+import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import numpy as np
-from folium.plugins import HeatMap, MarkerCluster
+from folium.plugins import MarkerCluster
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
+# Allow running this file directly, e.g. python src/map_visualizer.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.coverage_raster import ANY_LAYER, CoverageRaster
+from scripts.dataset_context import DatasetContext
+from scripts.dataset_schemas import compact_dataset
+from scripts.deduplicate_containers import legacy_only
+from scripts.partitioned_store import PartitionedStore
+from scripts.pipeline_metrics import PipelineMetrics
+from scripts.simplify_geometries import GeometrySimplifier
+from src.density_raster import DensityRasterizer
+from src.map_assets import LayerAssetWriter, LazyGeoJson, LazyImageOverlay, feature_collection, point_feature
+
 class GarbageFlowVisualizer:
     """Creates interactive maps for garbage flow visualization."""
     
-    def __init__(self, data_dir: Path = Path("data")):
+    # Data keys each map layer is drawn from (collection infrastructure also
+    # reads every collection type, see ``layer_inputs``)
+    LAYER_INPUTS = {
+        'treatment_facilities': {'nodes'},
+        'collection_intensity': {'nodes', 'edges'},
+        'flow_lines': {'nodes', 'edges'},
+        'proposed_sites': {'proposed_sites'},
+        'dropoff_coverage': {'coverage'},
+        'waste_statistics': {'flow_estimates'},
+        'arrondissement_boundary': {'arrondissement_boundaries'},
+    }
+    
+    def __init__(self, data_dir: Path = Path("data"), arrondissement: str = '14',
+                 metrics: Optional[PipelineMetrics] = None):
         self.data_dir = data_dir
+        self.arrondissement = arrondissement
+        self.metrics = metrics or PipelineMetrics(enabled=False)
         self.enriched_dir = data_dir / "enriched"
         self.processed_dir = data_dir / "processed"
         self.output_dir = Path("static")
@@ -28,6 +57,23 @@ class GarbageFlowVisualizer:
         # Paris 14th arrondissement center coordinates
         self.center_lat = 48.8332
         self.center_lon = 2.3270
+        self.zoom_start = 14
+        
+        # Server-side kernel density for the collection intensity layer
+        self.density_rasterizer = DensityRasterizer()
+        
+        # Per-zoom simplified polygons and lines for context layers
+        self.simplifier = GeometrySimplifier(data_dir)
+        
+        # Large datasets partitioned by arrondissement and month
+        self.store = PartitionedStore(self.processed_dir / "partitioned")
+        
+        # Set while building a map whose layer data is written as separate files
+        self.asset_writer: Optional[LayerAssetWriter] = None
+        
+        # Elements drawn for the previous map, per layer, for incremental rebuilds
+        self._layer_cache: Dict[str, List[Tuple[str, folium.Element]]] = {}
+        self._layer_cache_assets: Optional[bool] = None
         
         # Color schemes for different waste types
         self.waste_colors = {
@@ -39,6 +85,12 @@ class GarbageFlowVisualizer:
             'electronic_waste': '#008080'
         }
         
+        # Collection point types to display
+        self.collection_types = [
+            'glass_igloos', 'trilib_stations', 'public_composters', 
+            'textile_containers', 'street_bins', 'recycling_centers'
+        ]
+        
         # Collection point colors by type (mapped to valid Folium colors)
         self.collection_colors = {
             'collection': 'red',
@@ -51,7 +103,8 @@ class GarbageFlowVisualizer:
             'public_composters': 'darkgreen',
             'textile_containers': 'purple',
             'street_bins': 'orange',
-            'recycling_centers': 'cadetblue'
+            'recycling_centers': 'cadetblue',
+            'proposed_site': 'pink'
         }
         
         # Icons for different collection point types
@@ -63,40 +116,89 @@ class GarbageFlowVisualizer:
             'street_bins': 'trash',
             'recycling_centers': 'industry',
             'collection': 'trash',
-            'treatment': 'industry'
+            'treatment': 'industry',
+            'proposed_site': 'plus'
         }
         
-    def load_data(self) -> Dict[str, any]:
-        """Load all necessary data for visualization."""
+    def load_data(self, context: Optional[DatasetContext] = None,
+                  all_arrondissements: bool = False) -> Dict[str, any]:
+        """
+        Load all necessary data for visualization.
+        
+        Anything produced earlier in the same run is taken from the context;
+        only the remaining files are read from disk. Partitioned datasets are
+        read for the map's arrondissement only, unless ``all_arrondissements``.
+        """
         data = {}
         
+        if context is not None:
+            for key in ('nodes', 'edges', 'flow_estimates', 'coverage', 'proposed_sites'):
+                value = context.get_enriched(key)
+                if value is not None:
+                    data[key] = value
+            data.update(context.get_datasets())
+            if data:
+                print(f"Reusing {len(data)} in-memory layers")
+        
         try:
             # Load flow network
-            if (self.enriched_dir / "flow_nodes.geojson").exists():
+            if 'nodes' not in data and (self.enriched_dir / "flow_nodes.geojson").exists():
                 data['nodes'] = gpd.read_file(self.enriched_dir / "flow_nodes.geojson")
                 print(f"Loaded {len(data['nodes'])} flow nodes")
                 
-            if (self.enriched_dir / "flow_edges.json").exists():
+            if 'edges' not in data and (self.enriched_dir / "flow_edges.json").exists():
                 with open(self.enriched_dir / "flow_edges.json") as f:
                     data['edges'] = json.load(f)
                 print(f"Loaded {len(data['edges'])} flow edges")
                 
             # Load waste flow estimates
-            if (self.enriched_dir / "waste_flow_estimates.json").exists():
+            if 'flow_estimates' not in data and (self.enriched_dir / "waste_flow_estimates.json").exists():
                 with open(self.enriched_dir / "waste_flow_estimates.json") as f:
                     data['flow_estimates'] = json.load(f)
                 print("Loaded waste flow estimates")
                 
+            # Load the drop-off coverage raster
+            if 'coverage' not in data:
+                coverage = CoverageRaster.load(self.enriched_dir / "coverage")
+                if coverage is not None:
+                    data['coverage'] = coverage
+                    print(f"Loaded coverage raster: {coverage.shape[1]}x{coverage.shape[0]} cells")
+                
+            if 'proposed_sites' not in data and (self.enriched_dir / "proposed_sites.geojson").exists():
+                data['proposed_sites'] = gpd.read_file(self.enriched_dir / "proposed_sites.geojson")
+                print(f"Loaded {len(data['proposed_sites'])} proposed station sites")
+                
             # Load processed datasets
             for geojson_file in self.processed_dir.glob("*.geojson"):
                 name = geojson_file.stem
+                if name in data:
+                    continue
                 try:
-                    gdf = gpd.read_file(geojson_file)
+                    gdf = compact_dataset(gpd.read_file(geojson_file), name)
                     data[name] = gdf
                     print(f"Loaded {name}: {len(gdf)} features")
                 except Exception as e:
                     print(f"Error loading {name}: {e}")
                     
+            # Load the partitioned datasets the map draws
+            drawn = self.drawn_datasets()
+            arrondissements = None if all_arrondissements else [self.arrondissement]
+            for name in self.store.datasets():
+                if name in data or name not in drawn:
+                    continue
+                try:
+                    gdf = self.store.read(name, arrondissements=arrondissements)
+                    if gdf is not None:
+                        data[name] = gdf
+                        print(f"Loaded {name}: {len(gdf)} features from partitions")
+                except Exception as e:
+                    print(f"Error loading {name}: {e}")
+                    
+            # Swap drawn context layers for versions simplified for the map's zoom
+            for name in GeometrySimplifier.SIMPLIFIED_DATASETS:
+                if name in drawn and name in data and len(data[name]) > 0:
+                    data[name] = self.simplifier.for_zoom(name, data[name], self.zoom_start)
+                    
         except Exception as e:
             print(f"Error loading data: {e}")
             
@@ -108,7 +210,7 @@ class GarbageFlowVisualizer:
         # Create map
         m = folium.Map(
             location=[self.center_lat, self.center_lon],
-            zoom_start=14,
+            zoom_start=self.zoom_start,
             tiles='OpenStreetMap'
         )
         
@@ -133,13 +235,7 @@ class GarbageFlowVisualizer:
     def add_collection_infrastructure(self, map_obj: folium.Map, data: Dict[str, any]):
         """Add all collection infrastructure to the map with type-specific styling."""
         
-        # Collection point types to display
-        collection_types = [
-            'glass_igloos', 'trilib_stations', 'public_composters', 
-            'textile_containers', 'street_bins', 'recycling_centers'
-        ]
-        
-        for collection_type in collection_types:
+        for collection_type in self.collection_types:
             if collection_type in data:
                 gdf = data[collection_type]
                 if gdf is not None and len(gdf) > 0:
@@ -154,11 +250,11 @@ class GarbageFlowVisualizer:
         
         # Create layer group for this collection type
         type_name = collection_type.replace('_', ' ').title()
-        cluster = MarkerCluster(name=f"{type_name} ({len(gdf)})").add_to(map_obj)
         
         color = self.collection_colors.get(collection_type, 'gray')
         icon = self.collection_icons.get(collection_type, 'circle')
         
+        points = []
         for idx, point in gdf.iterrows():
             if 'geometry' in point and point.geometry is not None:
                 # Extract useful information from the data
@@ -175,18 +271,28 @@ class GarbageFlowVisualizer:
                 </div>
                 """
                 
-                folium.Marker(
-                    location=[point.geometry.y, point.geometry.x],
-                    popup=folium.Popup(popup_content, max_width=280),
-                    tooltip=name,
-                    icon=folium.Icon(color=color, icon=icon, prefix='fa')
-                ).add_to(cluster)
+                points.append({
+                    'lat': point.geometry.y,
+                    'lon': point.geometry.x,
+                    'popup': popup_content,
+                    'tooltip': name,
+                    'color': color,
+                    'icon': icon
+                })
+                
+        self._add_marker_layer(map_obj, collection_type, f"{type_name} ({len(gdf)})", points, max_width=280)
                 
     def _add_legacy_collection_points(self, map_obj: folium.Map, nodes_data: gpd.GeoDataFrame):
-        """Add legacy collection points for backward compatibility."""
+        """
+        Add legacy collection points for backward compatibility.
         
-        collection_cluster = MarkerCluster(name="Legacy Collection Points").add_to(map_obj)
+        Points matched to a typed container are already drawn in that type's
+        layer, so only containers known solely from the legacy dataset are added.
+        """
+        if 'sources' in nodes_data.columns:
+            nodes_data = nodes_data[(nodes_data['type'] != 'collection') | legacy_only(nodes_data)]
         
+        points = []
         for idx, node in nodes_data.iterrows():
             if node['type'] == 'collection':
                 popup_content = f"""
@@ -197,18 +303,21 @@ class GarbageFlowVisualizer:
                 </div>
                 """
                 
-                folium.Marker(
-                    location=[node.geometry.y, node.geometry.x],
-                    popup=folium.Popup(popup_content, max_width=250),
-                    tooltip=node['name'],
-                    icon=folium.Icon(color='red', icon='trash', prefix='fa')
-                ).add_to(collection_cluster)
+                points.append({
+                    'lat': node.geometry.y,
+                    'lon': node.geometry.x,
+                    'popup': popup_content,
+                    'tooltip': node['name'],
+                    'color': 'red',
+                    'icon': 'trash'
+                })
+                
+        self._add_marker_layer(map_obj, 'legacy_collection_points', "Legacy Collection Points", points, max_width=250)
                 
     def add_treatment_facilities(self, map_obj: folium.Map, nodes_data: gpd.GeoDataFrame):
         """Add treatment facilities to the map."""
         
-        treatment_cluster = MarkerCluster(name="Treatment Facilities").add_to(map_obj)
-        
+        points = []
         for idx, node in nodes_data.iterrows():
             if node['type'] == 'treatment':
                 
@@ -224,12 +333,64 @@ class GarbageFlowVisualizer:
                 </div>
                 """
                 
-                folium.Marker(
-                    location=[node.geometry.y, node.geometry.x],
-                    popup=folium.Popup(popup_content, max_width=250),
-                    tooltip=node['name'],
-                    icon=folium.Icon(color=color, icon='industry', prefix='fa')
-                ).add_to(treatment_cluster)
+                points.append({
+                    'lat': node.geometry.y,
+                    'lon': node.geometry.x,
+                    'popup': popup_content,
+                    'tooltip': node['name'],
+                    'color': color,
+                    'icon': 'industry'
+                })
+                
+        self._add_marker_layer(map_obj, 'treatment_facilities', "Treatment Facilities", points, max_width=250)
+        
+    def add_proposed_sites(self, map_obj: folium.Map, sites: gpd.GeoDataFrame):
+        """Add the stations proposed by the siting optimizer to the map."""
+        
+        points = []
+        for _, site in sites.iterrows():
+            popup_content = f"""
+            <div style="font-family: Arial, sans-serif; width: 200px;">
+                <h4>Proposed station #{site['rank']}</h4>
+                <p><strong>Arrondissement:</strong> {site['arrondissement']}</p>
+                <p><strong>Residents served:</strong> {site['population_served']:,}</p>
+                <p><strong>Distance saved:</strong> {site['distance_saved_m']:.0f} m on average</p>
+            </div>
+            """
+            points.append({
+                'lat': site.geometry.y,
+                'lon': site.geometry.x,
+                'popup': popup_content,
+                'tooltip': f"Proposed station #{site['rank']}",
+                'color': self.collection_colors['proposed_site'],
+                'icon': self.collection_icons['proposed_site']
+            })
+            
+        self._add_marker_layer(map_obj, 'proposed_sites', "Proposed Stations", points, max_width=250)
+        
+    def _add_marker_layer(self, map_obj: folium.Map, layer_key: str, layer_name: str,
+                          points: List[Dict], max_width: int):
+        """Add clustered markers, inline or as a lazily fetched layer asset."""
+        
+        if self.asset_writer is not None:
+            features = [
+                point_feature(p['lon'], p['lat'], {
+                    'popup': p['popup'], 'tooltip': p['tooltip'], 'color': p['color'], 'icon': p['icon']
+                })
+                for p in points
+            ]
+            url = self.asset_writer.write_json(layer_key, feature_collection(features))
+            LazyGeoJson(url, name=layer_name, cluster=True, popup_max_width=max_width).add_to(map_obj)
+            return
+            
+        cluster = MarkerCluster(name=layer_name).add_to(map_obj)
+        for p in points:
+            folium.Marker(
+                location=[p['lat'], p['lon']],
+                popup=folium.Popup(p['popup'], max_width=max_width),
+                tooltip=p['tooltip'],
+                icon=folium.Icon(color=p['color'], icon=p['icon'], prefix='fa')
+            ).add_to(cluster)
                 
     def add_flow_lines(self, map_obj: folium.Map, nodes_data: gpd.GeoDataFrame, edges_data: List[Dict]):
         """Add flow lines between collection and treatment points."""
@@ -239,6 +400,8 @@ class GarbageFlowVisualizer:
         for idx, node in nodes_data.iterrows():
             node_coords[node['id']] = [node.geometry.y, node.geometry.x]
             
+        features = []
+        
         # Add flow lines
         for edge in edges_data:
             source_id = edge['source']
@@ -252,6 +415,23 @@ class GarbageFlowVisualizer:
                 tonnage = edge.get('estimated_daily_tonnage', 0)
                 weight = max(2, min(8, tonnage * 2))  # Scale line weight
                 
+                if self.asset_writer is not None:
+                    features.append({
+                        'type': 'Feature',
+                        'geometry': {
+                            'type': 'LineString',
+                            'coordinates': [
+                                [round(source_coords[1], 6), round(source_coords[0], 6)],
+                                [round(target_coords[1], 6), round(target_coords[0], 6)]
+                            ]
+                        },
+                        'properties': {
+                            'popup': f"Daily Flow: {tonnage:.1f} tonnes",
+                            'style': {'color': '#FF6B6B', 'weight': weight, 'opacity': 0.7}
+                        }
+                    })
+                    continue
+                
                 # Create flow line
                 folium.PolyLine(
                     locations=[source_coords, target_coords],
@@ -261,6 +441,10 @@ class GarbageFlowVisualizer:
                     popup=f"Daily Flow: {tonnage:.1f} tonnes"
                 ).add_to(map_obj)
                 
+        if self.asset_writer is not None and features:
+            url = self.asset_writer.write_json('flow_lines', feature_collection(features))
+            LazyGeoJson(url, name="Waste Flows").add_to(map_obj)
+                
     def add_waste_statistics_overlay(self, map_obj: folium.Map, flow_estimates: Dict):
         """Add waste statistics as an overlay."""
         
@@ -268,9 +452,9 @@ class GarbageFlowVisualizer:
             return
             
         # Create statistics popup
-        stats_html = """
+        stats_html = f"""
         <div style="font-family: Arial, sans-serif; padding: 10px; background: white; border-radius: 5px;">
-            <h3>14th Arrondissement Waste Statistics</h3>
+            <h3>{self.arrondissement}th Arrondissement Waste Statistics</h3>
             <table style="width: 100%; border-collapse: collapse;">
         """
         
@@ -303,95 +487,242 @@ class GarbageFlowVisualizer:
         ).add_to(map_obj)
         
     def add_arrondissement_boundary(self, map_obj: folium.Map, boundary_data: Optional[gpd.GeoDataFrame]):
-        """Add 14th arrondissement boundary to the map."""
+        """Add the selected arrondissement boundary to the map."""
         
         if boundary_data is None:
             return
             
-        # Filter for 14th arrondissement
-        arr_14 = boundary_data[boundary_data['c_ar'] == 14] if 'c_ar' in boundary_data.columns else boundary_data
-        
-        if len(arr_14) > 0:
+        # Filter for the selected arrondissement
+        arr_boundary = self.select_arrondissement_boundary(boundary_data)
+        
+        if len(arr_boundary) > 0:
+            if self.asset_writer is not None:
+                from shapely.geometry import mapping
+                feature = {
+                    'type': 'Feature',
+                    'geometry': mapping(arr_boundary.iloc[0].geometry),
+                    'properties': {
+                        'tooltip': f"{self.arrondissement}th Arrondissement",
+                        'style': {'fillColor': 'blue', 'color': 'darkblue', 'weight': 3, 'fillOpacity': 0.1}
+                    }
+                }
+                url = self.asset_writer.write_json('arrondissement_boundary', feature_collection([feature]))
+                LazyGeoJson(url, name="Arrondissement Boundary").add_to(map_obj)
+                return
+                
             # Add boundary outline
             folium.GeoJson(
-                arr_14.iloc[0].geometry,
+                arr_boundary.iloc[0].geometry,
                 style_function=lambda x: {
                     'fillColor': 'blue',
                     'color': 'darkblue',
                     'weight': 3,
                     'fillOpacity': 0.1
                 },
-                tooltip="14th Arrondissement"
+                tooltip=f"{self.arrondissement}th Arrondissement"
             ).add_to(map_obj)
             
-    def create_flow_heatmap(self, map_obj: folium.Map, nodes_data: gpd.GeoDataFrame):
-        """Create heatmap showing waste collection intensity."""
+    def select_arrondissement_boundary(self, boundary_data: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Return the boundary rows of the selected arrondissement."""
+        if 'c_ar' not in boundary_data.columns:
+            return boundary_data
+        return boundary_data[pd.to_numeric(boundary_data['c_ar'], errors='coerce') == int(self.arrondissement)]
+        
+    def create_flow_heatmap(self, map_obj: folium.Map, nodes_data: gpd.GeoDataFrame,
+                            edges_data: Optional[List[Dict]] = None):
+        """
+        Create heatmap showing waste collection intensity.
+        
+        Each collection point is weighted by the tonnage its flow edges carry
+        away per day. The kernel density is computed here and shipped as a
+        single image overlay, so the browser does no per-point work.
+        """
         
         # Extract collection points
         collection_points = nodes_data[nodes_data['type'] == 'collection']
+        collection_points = collection_points[collection_points.geometry.notna()]
         
         if len(collection_points) == 0:
             return
             
-        # Create heat data
-        heat_data = []
-        for idx, point in collection_points.iterrows():
-            # Use daily capacity as heat intensity
-            intensity = point.get('daily_capacity_kg', 500) / 100  # Scale down
-            heat_data.append([point.geometry.y, point.geometry.x, intensity])
+        # Weight each point by its outgoing daily tonnage; points that ship
+        # nothing add no intensity
+        weights = None
+        edges = pd.DataFrame(edges_data or [])
+        if 'estimated_daily_tonnage' in edges.columns:
+            tonnage = pd.to_numeric(edges['estimated_daily_tonnage'], errors='coerce')
+            outgoing = tonnage.groupby(edges['source'].astype(str)).sum()
+            weights = collection_points['id'].astype(str).map(outgoing).fillna(0).to_numpy(dtype=float)
+            shipping = weights > 0
+            if not shipping.any():
+                return
+            collection_points, weights = collection_points[shipping], weights[shipping]
+            
+        level = self.density_rasterizer.rasterize(
+            collection_points.geometry.x.to_numpy(),
+            collection_points.geometry.y.to_numpy(),
+            weights,
+            zoom=self.zoom_start
+        )
+        if level is None:
+            return
+            
+        min_lon, min_lat, max_lon, max_lat = level['bounds']
+        image = self.density_rasterizer.to_rgba(level['grid'])
+        self._add_image_overlay(map_obj, image, (min_lon, min_lat, max_lon, max_lat),
+                                "Collection Intensity", 'collection_intensity')
+        
+    def add_coverage_overlay(self, map_obj: folium.Map, coverage: CoverageRaster,
+                             max_distance_m: float = 500.0):
+        """
+        Add the distance to the nearest drop-off point as an image overlay.
+        
+        Green cells are close to a drop-off of any type, red cells are
+        ``max_distance_m`` or more away.
+        """
+        resampled = coverage.to_wgs84(ANY_LAYER, int(self.arrondissement))
+        if resampled is None:
+            return
+        grid, bounds = resampled
+        
+        inside = ~np.isnan(grid)
+        rgba = plt.get_cmap('RdYlGn_r')(np.clip(np.nan_to_num(grid) / max_distance_m, 0, 1))
+        rgba[..., 3] = np.where(inside, 0.6, 0.0)
+        image = (rgba * 255).astype(np.uint8)
+        self._add_image_overlay(map_obj, image, bounds, "Drop-off Coverage", 'dropoff_coverage')
+        
+    def _add_image_overlay(self, map_obj: folium.Map, image: np.ndarray,
+                           bounds: Tuple[float, float, float, float], name: str, asset_key: str):
+        """Add an RGBA image (rows north to south) covering lon/lat ``bounds``, hidden by default."""
+        min_lon, min_lat, max_lon, max_lat = bounds
+        leaflet_bounds = [[min_lat, min_lon], [max_lat, max_lon]]
+        if self.asset_writer is not None:
+            # The browser only requests the PNG when the layer is switched on
+            from folium.utilities import mercator_transform, write_png
+            projected = mercator_transform(image, (min_lat, max_lat), origin='upper')
+            url = self.asset_writer.write_bytes(asset_key, write_png(projected), 'png')
+            LazyImageOverlay(url, leaflet_bounds, name=name, show=False).add_to(map_obj)
+            return
             
-        # Add heatmap
-        HeatMap(
-            heat_data,
-            name="Collection Intensity",
-            radius=20,
-            blur=15,
-            max_zoom=1,
+        folium.raster_layers.ImageOverlay(
+            image=image,
+            bounds=leaflet_bounds,
+            name=name,
+            mercator_project=True,
             show=False  # Start hidden
         ).add_to(map_obj)
         
-    def create_complete_map(self) -> folium.Map:
-        """Create complete interactive map with all layers."""
+    def create_complete_map(self, context: Optional[DatasetContext] = None,
+                            external_assets: bool = False,
+                            changed: Optional[Iterable[str]] = None) -> folium.Map:
+        """
+        Create complete interactive map with all layers.
+        
+        Args:
+            context: Optional in-memory datasets from the current run
+            external_assets: Write layer data as separate content-hashed files
+                fetched when each layer is first shown, instead of inlining it
+            changed: Data keys that changed since the previous map from this
+                visualizer; layers drawn only from other keys are reused
+                (None redraws every layer)
+        """
         
         print("Creating complete garbage flow map...")
         
         # Load data
-        data = self.load_data()
+        with self.metrics.stage('load_data'):
+            data = self.load_data(context)
         
         if not data:
             print("No data available for visualization")
             return None
             
+        return self.build_map(data, external_assets=external_assets, changed=changed)
+        
+    def build_map(self, data: Dict[str, any], external_assets: bool = False,
+                  changed: Optional[Iterable[str]] = None) -> folium.Map:
+        """
+        Build the interactive map from already loaded data.
+        
+        With ``changed``, layers whose input keys (see ``layer_inputs``) are
+        all unchanged reuse the elements drawn for the previous map.
+        """
+        
+        self.asset_writer = LayerAssetWriter(self.output_dir) if external_assets else None
+        reuse = changed is not None and self._layer_cache_assets == external_assets
+        changed = set(changed or ())
+        rendered = {}
+        
         # Create base map
         m = self.create_base_map()
         
+        def layer(name: str, draw):
+            cached = self._layer_cache.get(name)
+            if reuse and cached is not None and not (self.layer_inputs(name) & changed):
+                for key, child in cached:
+                    m.add_child(child, name=key)
+                rendered[name] = cached
+                return
+            before = set(m._children)
+            with self.metrics.stage('render_layer', layer=name):
+                draw()
+            rendered[name] = [(key, child) for key, child in m._children.items() if key not in before]
+        
         # Add layers if data is available
-        self.add_collection_infrastructure(m, data)
+        layer('collection_infrastructure', lambda: self.add_collection_infrastructure(m, data))
         
         if 'nodes' in data:
-            self.add_treatment_facilities(m, data['nodes'])
-            self.create_flow_heatmap(m, data['nodes'])
+            layer('treatment_facilities', lambda: self.add_treatment_facilities(m, data['nodes']))
+            layer('collection_intensity', lambda: self.create_flow_heatmap(m, data['nodes'], data.get('edges')))
             
             if 'edges' in data:
-                self.add_flow_lines(m, data['nodes'], data['edges'])
+                layer('flow_lines', lambda: self.add_flow_lines(m, data['nodes'], data['edges']))
+                
+        if data.get('proposed_sites') is not None and len(data['proposed_sites']) > 0:
+            layer('proposed_sites', lambda: self.add_proposed_sites(m, data['proposed_sites']))
+                
+        if data.get('coverage') is not None:
+            layer('dropoff_coverage', lambda: self.add_coverage_overlay(m, data['coverage']))
                 
         if 'flow_estimates' in data:
-            self.add_waste_statistics_overlay(m, data['flow_estimates'])
+            layer('waste_statistics', lambda: self.add_waste_statistics_overlay(m, data['flow_estimates']))
             
         if 'arrondissement_boundaries' in data:
-            self.add_arrondissement_boundary(m, data['arrondissement_boundaries'])
+            layer('arrondissement_boundary',
+                  lambda: self.add_arrondissement_boundary(m, data['arrondissement_boundaries']))
+            
+        self._layer_cache = rendered
+        self._layer_cache_assets = external_assets
             
         # Add layer control
         folium.LayerControl().add_to(m)
         
         return m
         
+    def layer_inputs(self, layer: str) -> Set[str]:
+        """Data keys a map layer is drawn from."""
+        if layer == 'collection_infrastructure':
+            return {*self.collection_types, 'nodes'}
+        return self.LAYER_INPUTS.get(layer, set())
+        
+    def drawn_datasets(self) -> Set[str]:
+        """Data keys any map layer is drawn from."""
+        layers = ['collection_infrastructure', *self.LAYER_INPUTS]
+        return set().union(*(self.layer_inputs(layer) for layer in layers))
+        
     def save_map(self, map_obj: folium.Map, filename: str = "garbage_flow_map.html"):
         """Save map to HTML file."""
         
         output_path = self.output_dir / filename
-        map_obj.save(str(output_path))
+        with self.metrics.stage('html_write'):
+            map_obj.save(str(output_path))
+        self.metrics.observe('html_bytes', output_path.stat().st_size, file=filename)
         print(f"Map saved to: {output_path}")
+        
+        if self.asset_writer is not None:
+            removed = self.asset_writer.prune()
+            print(f"Layer assets in {self.asset_writer.asset_dir} ({removed} stale files removed)")
+            
         return output_path
 
 def main():
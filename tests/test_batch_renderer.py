@@ -0,0 +1,51 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point, box
+
+from scripts.partitioned_store import PartitionedStore
+from src import batch_renderer
+from src.batch_renderer import filter_for_arrondissement
+
+
+def test_filter_keeps_treatment_nodes_without_arrondissement():
+    nodes = gpd.GeoDataFrame({
+        'id': ['c1', 'c2', 't1'],
+        'type': ['collection', 'collection', 'treatment'],
+        'arrondissement': [14.0, 15.0, np.nan],
+    }, geometry=[Point(2.32, 48.83), Point(2.29, 48.84), Point(2.45, 48.95)], crs='EPSG:4326')
+
+    filtered = filter_for_arrondissement({'flow_nodes': nodes}, '14')
+    assert filtered['flow_nodes']['id'].tolist() == ['c1', 't1']
+
+
+def test_filter_by_boundary_keeps_treatment_nodes():
+    boundaries = gpd.GeoDataFrame({'c_ar': [14]}, geometry=[box(2.30, 48.82, 2.34, 48.84)], crs='EPSG:4326')
+    points = gpd.GeoDataFrame({'type': ['bin', 'bin', 'treatment']},
+                              geometry=[Point(2.32, 48.83), Point(2.29, 48.86), Point(2.45, 48.95)],
+                              crs='EPSG:4326')
+
+    filtered = filter_for_arrondissement({'arrondissement_boundaries': boundaries, 'points': points}, '14')
+    assert filtered['points']['type'].tolist() == ['bin', 'treatment']
+
+
+def test_spawned_worker_loads_every_arrondissement(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    bins = gpd.GeoDataFrame({'c_ar': [3, 14]}, geometry=[Point(2.36, 48.86), Point(2.32, 48.83)],
+                            crs='EPSG:4326')
+    PartitionedStore(tmp_path / "processed" / "partitioned").write('street_bins', bins)
+    monkeypatch.setattr(batch_renderer, '_SHARED_DATA', {})
+    monkeypatch.setattr(batch_renderer, '_WORKER_SETTINGS', {})
+
+    batch_renderer._init_worker({'data_dir': tmp_path, 'output_dir': tmp_path, 'external_assets': False})
+    assert sorted(batch_renderer._SHARED_DATA['street_bins']['c_ar'].tolist()) == [3, 14]
+
+
+def test_spawned_worker_uses_data_passed_from_context(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batch_renderer, '_SHARED_DATA', {})
+    monkeypatch.setattr(batch_renderer, '_WORKER_SETTINGS', {})
+
+    batch_renderer._init_worker({'data_dir': tmp_path, 'output_dir': tmp_path, 'external_assets': False,
+                                 'shared_data': {'edges': []}})
+    assert batch_renderer._SHARED_DATA == {'edges': []}
+    assert 'shared_data' not in batch_renderer._WORKER_SETTINGS
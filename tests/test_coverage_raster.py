@@ -0,0 +1,47 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point, box
+
+from scripts.coverage_raster import ANY_LAYER, NODATA, CoverageAnalyzer
+from scripts.deduplicate_containers import METRIC_CRS
+
+X0, Y0 = 650_000.0, 6_860_000.0
+
+
+@pytest.fixture
+def datasets():
+    # Two 1 km square arrondissements side by side; one igloo at the centre of the first
+    boundaries = gpd.GeoDataFrame({'c_ar': [1, 2]}, geometry=[
+        box(X0, Y0, X0 + 1000, Y0 + 1000), box(X0 + 1000, Y0, X0 + 2000, Y0 + 1000)], crs=METRIC_CRS)
+    igloos = gpd.GeoDataFrame(geometry=[Point(X0 + 500, Y0 + 500)], crs=METRIC_CRS)
+    return {'arrondissement_boundaries': boundaries, 'glass_igloos': igloos.to_crs('EPSG:4326')}
+
+
+def _centre_distances(raster):
+    ny, nx = raster.shape
+    xs = raster.origin[0] + (np.arange(nx) + 0.5) * raster.resolution_m
+    ys = raster.origin[1] - (np.arange(ny) + 0.5) * raster.resolution_m
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return np.hypot(grid_x - (X0 + 500), grid_y - (Y0 + 500))
+
+
+def test_distances_to_a_single_point(datasets):
+    raster = CoverageAnalyzer(resolution_m=100).build(datasets, arrondissements=[1, 2])
+    assert raster.shape == (10, 20)
+    assert (raster.arrondissements > 0).all()
+    expected = np.rint(_centre_distances(raster))
+    assert np.abs(raster.layers['glass_igloos'].astype(float) - expected).max() <= 1
+    assert np.array_equal(raster.layers[ANY_LAYER], raster.layers['glass_igloos'])
+
+
+def test_only_arrondissements_with_points_are_analysed(datasets):
+    raster = CoverageAnalyzer(resolution_m=100).build(datasets)
+    assert raster.shape == (10, 10)
+    assert set(np.unique(raster.arrondissements)) == {1}
+    assert (raster.layers[ANY_LAYER] != NODATA).all()
+    assert raster.layers[ANY_LAYER].max() <= np.ceil(np.hypot(450, 450))
+
+    summary = raster.summarize(threshold_m=300)
+    assert [row['quartier'] for row in summary] == ['Arrondissement 1']
+    assert summary[0]['cells'] == 100
@@ -0,0 +1,33 @@
+import geopandas as gpd
+from shapely.geometry import Point
+
+from scripts.deduplicate_containers import METRIC_CRS, ContainerDeduplicator, legacy_only
+
+X0, Y0 = 650_000.0, 6_860_000.0
+
+
+def _features(ids, offsets, addresses):
+    return gpd.GeoDataFrame({'_record_id': ids, 'adresse': addresses, 'c_ar': [14] * len(ids)},
+                            geometry=[Point(X0 + dx, Y0 + dy) for dx, dy in offsets],
+                            crs=METRIC_CRS).to_crs('EPSG:4326')
+
+
+def test_known_overlap_is_merged_with_lineage():
+    datasets = {
+        # g2 is a re-published copy of g1, half a metre away
+        'glass_igloos': _features(['g1', 'g2'], [(0, 0), (0.5, 0)],
+                                  ['12 rue Daguerre', '12 rue Daguerre']),
+        # w1 is the legacy record of the same igloo; w2 is a separate bin 500 m away
+        'waste_collection_points': _features(['w1', 'w2'], [(8, 0), (500, 0)],
+                                             ['12 RUE DAGUERRE', '40 avenue du Maine']),
+    }
+    containers = ContainerDeduplicator().deduplicate(datasets).set_index('container_id')
+
+    assert sorted(containers.index) == ['glass_igloos:g1', 'waste_collection_points:w2']
+    merged = containers.loc['glass_igloos:g1']
+    assert merged['container_type'] == 'glass_igloos'
+    assert merged['members'] == 3
+    assert merged['sources'] == 'glass_igloos;waste_collection_points'
+    assert set(merged['lineage'].split(';')) == {'glass_igloos:g1', 'glass_igloos:g2',
+                                                 'waste_collection_points:w1'}
+    assert legacy_only(containers).tolist() == [False, True]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from src.density_raster import DensityRasterizer
+
+LON, LAT = 2.3266, 48.8331
+
+
+def test_single_point():
+    level = DensityRasterizer().rasterize(np.array([LON]), np.array([LAT]))
+
+    assert level['grid'].ndim == 2
+    assert level['grid'].sum() == pytest.approx(1.0, rel=1e-3)
+    min_lon, min_lat, max_lon, max_lat = level['bounds']
+    assert min_lon < LON < max_lon and min_lat < LAT < max_lat
+
+
+@pytest.mark.parametrize('zoom', [None, 12, 14, 17])
+def test_many_points_conserve_weight(zoom):
+    rng = np.random.default_rng(0)
+    lons = LON + rng.uniform(-0.02, 0.02, 500)
+    lats = LAT + rng.uniform(-0.015, 0.015, 500)
+    weights = rng.uniform(0.1, 2.0, 500)
+
+    level = DensityRasterizer(max_pixels=200_000).rasterize(lons, lats, weights, zoom=zoom)
+
+    assert level['grid'].size <= 200_000
+    assert level['grid'].min() >= 0
+    assert level['grid'].sum() == pytest.approx(weights.sum(), rel=1e-3)
+
+
+def test_grid_rows_run_north_to_south():
+    rasterizer = DensityRasterizer(bandwidth_m=1.0)
+    level = rasterizer.rasterize(np.array([LON, LON]), np.array([LAT, LAT + 0.01]), np.array([1.0, 3.0]))
+
+    rows = np.nonzero(level['grid'].sum(axis=1))[0]
+    assert level['grid'][rows[0]].sum() == pytest.approx(3.0)
+
+
+def test_no_valid_points():
+    assert DensityRasterizer().rasterize(np.array([np.nan]), np.array([LAT])) is None
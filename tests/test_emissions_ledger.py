@@ -0,0 +1,66 @@
+from datetime import date
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from scripts.emissions_ledger import VEHICLE_CLASSES, EmissionsLedger
+from scripts.flow_graph import FlowGraph
+
+FLOWS = {
+    'annual_tonnage': {'household_waste': 365.0, 'glass': 73.0},
+    'collection_flows': {'collection_schedule': {
+        'household_waste': {'days_per_week': 6},
+        'glass': {'days_per_week': 0.5},
+    }},
+}
+
+
+@pytest.fixture
+def ledger():
+    nodes = gpd.GeoDataFrame({
+        'id': ['b1', 'b2', 'inc', 'glass'],
+        'type': ['collection', 'collection', 'treatment', 'treatment'],
+    }, geometry=[Point(2.32, 48.83), Point(2.33, 48.84), Point(2.40, 48.90), Point(2.25, 48.80)],
+        crs='EPSG:4326')
+    edges = [
+        {'source': 'b1', 'target': 'inc', 'estimated_daily_tonnage': 1.0},
+        {'source': 'b2', 'target': 'inc', 'estimated_daily_tonnage': 3.0},
+        {'source': 'b1', 'target': 'glass', 'estimated_daily_tonnage': 0.2},
+    ]
+    graph = FlowGraph.from_network(nodes, edges)
+    return EmissionsLedger.from_graph(graph, FLOWS, {'inc': 'incineration', 'glass': 'glass_processing'},
+                                      start=date(2024, 1, 1), days=364)
+
+
+def test_tonnage_is_conserved_and_split_by_weight(ledger):
+    totals = ledger.by_waste_type().set_index('waste_type')['tonnage']
+    assert totals['household_waste'] == pytest.approx(365.0 * 364 / 365, rel=1e-5)
+    assert totals['glass'] == pytest.approx(73.0 * 364 / 365, rel=1e-5)
+
+    household = ledger.waste_codes == ledger.waste_types.index('household_waste')
+    per_edge = ledger.tonnage[household].sum(axis=1)
+    assert per_edge[1] / per_edge[0] == pytest.approx(3.0, rel=1e-5)
+    # Tonnage only lands on collection days: six a week for household waste
+    assert int((ledger.tonnage[household][0] > 0).sum()) == 52 * 6
+
+
+def test_new_factors_rescale_emissions(ledger):
+    base = ledger.emissions()
+    doubled = {name: {**factors, 'loaded_kg_per_tkm': factors['loaded_kg_per_tkm'] * 2,
+                      'empty_kg_per_km': factors['empty_kg_per_km'] * 2}
+               for name, factors in VEHICLE_CLASSES.items()}
+    assert np.allclose(ledger.emissions(doubled), base * 2, rtol=1e-5)
+
+    refuse = VEHICLE_CLASSES['refuse_truck']
+    per_tkm = refuse['loaded_kg_per_tkm'] + refuse['empty_kg_per_km'] / refuse['payload_t']
+    household = ledger.waste_codes == ledger.waste_types.index('household_waste')
+    assert np.allclose(ledger.coefficients()[household], ledger.distance_km[household] * per_tkm, rtol=1e-5)
+
+
+def test_save_and_load_round_trip(ledger, tmp_path):
+    loaded = EmissionsLedger.load(ledger.save(tmp_path / "ledger"))
+    assert np.array_equal(loaded.tonnage, ledger.tonnage)
+    assert loaded.waste_types == ledger.waste_types
+    assert np.allclose(loaded.emissions(), ledger.emissions())
@@ -0,0 +1,58 @@
+import json
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from scripts.dataset_context import DatasetContext
+from scripts.enrich_data import DataEnricher
+
+
+def _points(n):
+    return gpd.GeoDataFrame({'nom': [f"p{i}" for i in range(n)]},
+                            geometry=[Point(2.32 + i * 1e-3, 48.83) for i in range(n)], crs='EPSG:4326')
+
+
+def test_load_processed_data_merges_context_and_disk(tmp_path):
+    processed = tmp_path / "processed"
+    processed.mkdir()
+    _points(2).to_file(processed / "glass_igloos.geojson", driver='GeoJSON')
+    _points(3).to_file(processed / "trilib_stations.geojson", driver='GeoJSON')
+
+    with DatasetContext() as context:
+        in_memory = _points(5)
+        context.add_dataset('glass_igloos', in_memory)
+        datasets = DataEnricher(tmp_path).load_processed_data(context)
+
+        assert set(datasets) == {'glass_igloos', 'trilib_stations'}
+        assert datasets['glass_igloos'] is in_memory
+        assert len(datasets['trilib_stations']) == 3
+        assert 'trilib_stations' in context.get_datasets()
+
+
+def test_flow_network_routes_each_waste_type_to_its_facilities(tmp_path):
+    datasets = {
+        'glass_igloos': _points(2),
+        'trilib_stations': gpd.GeoDataFrame(geometry=[Point(2.33, 48.84 + i * 1e-3) for i in range(4)],
+                                            crs='EPSG:4326'),
+        'textile_containers': gpd.GeoDataFrame(geometry=[Point(2.34, 48.85)], crs='EPSG:4326'),
+    }
+    enricher = DataEnricher(tmp_path)
+    flows = enricher.estimate_waste_flows()
+    nodes = enricher.create_flow_network(datasets).set_index('id')
+    with open(tmp_path / "enriched" / "flow_edges.json") as f:
+        edges = json.load(f)
+
+    facility = {e['source']: e['target'] for e in edges}
+    by_type = {}
+    for edge in edges:
+        waste_type = nodes.loc[edge['source'], 'waste_type']
+        assert edge['waste_type'] == waste_type
+        by_type[waste_type] = by_type.get(waste_type, 0) + edge['estimated_daily_tonnage']
+        assert facility[edge['source']] == {'glass': 'treatment_glass_processing',
+                                            'recyclables': 'treatment_recycling'}[waste_type]
+
+    # One edge per container that feeds a treatment flow; textiles are not trucked
+    assert len(edges) == 6
+    daily = flows['collection_flows']['daily_flows']
+    assert by_type == pytest.approx({'glass': daily['glass'], 'recyclables': daily['recyclables']})
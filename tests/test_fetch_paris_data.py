@@ -0,0 +1,26 @@
+import geopandas as gpd
+import pandas as pd
+
+from scripts.fetch_paris_data import ParisDataFetcher
+
+
+def _records(n):
+    return pd.DataFrame({
+        'adresse': [f"{i} rue de Rivoli" for i in range(n)],
+        'commentaire_interne': [f"note {i}" for i in range(n)],
+        'geometry': [{'type': 'Point', 'coordinates': [2.35 + i * 1e-3, 48.86]} for i in range(n)],
+    })
+
+
+def test_store_processed_persists_undeclared_columns(tmp_path):
+    fetcher = ParisDataFetcher(data_dir=tmp_path)
+    gdf = fetcher.convert_geometries(_records(3), 'glass_igloos')
+    assert 'commentaire_interne' in gdf.columns
+
+    in_memory = fetcher.store_processed(gdf, 'glass_igloos')
+    assert 'commentaire_interne' not in in_memory.columns
+    assert 'adresse' in in_memory.columns
+
+    on_disk = gpd.read_file(tmp_path / "processed" / "glass_igloos.geojson")
+    assert {'adresse', 'commentaire_interne'} <= set(on_disk.columns)
+    assert len(on_disk) == 3
@@ -0,0 +1,50 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from scripts.flow_graph import FlowGraph
+
+
+@pytest.fixture
+def graph():
+    # 't' has no outgoing edges and sits between nodes that do
+    ids = ['b1', 't', 'b2', 'c', 'b3']
+    nodes = gpd.GeoDataFrame({
+        'id': ids,
+        'name': [f"Node {i}" for i in ids],
+        'type': ['bin', 'treatment', 'bin', 'collection', 'bin'],
+    }, geometry=[Point(2.3 + i * 0.01, 48.85) for i in range(len(ids))], crs='EPSG:4326')
+    edges = [
+        {'source': 'b1', 'target': 'c', 'estimated_daily_tonnage': 1.0},
+        {'source': 'b2', 'target': 'c', 'estimated_daily_tonnage': 2.0},
+        {'source': 'c', 'target': 't', 'estimated_daily_tonnage': 3.0},
+        {'source': 'b3', 'target': 't', 'estimated_daily_tonnage': 0.5},
+    ]
+    return FlowGraph.from_network(nodes, edges)
+
+
+def test_upstream_direct_sources(graph):
+    result = graph.upstream('t')
+    assert result['id'].tolist() == ['c', 'b3']
+    assert result['daily_tonnage'].tolist() == [3.0, 0.5]
+    assert (result['hops'] == 1).all()
+
+
+def test_upstream_two_hops(graph):
+    result = graph.upstream('Node t', depth=2).set_index('id')
+    assert set(result.index) == {'c', 'b1', 'b2', 'b3'}
+    assert result.loc['b2', 'hops'] == 2
+    assert result.loc['b2', 'daily_tonnage'] == 2.0
+    assert result.loc['c', 'type'] == 'collection'
+
+
+def test_top_flows(graph):
+    result = graph.top_flows(2)
+    assert list(zip(result['source'], result['target'])) == [('c', 't'), ('b2', 'c')]
+    assert result['daily_tonnage'].tolist() == [3.0, 2.0]
+
+
+def test_top_flows_into_target(graph):
+    result = graph.top_flows(5, target='c')
+    assert list(zip(result['source'], result['target'])) == [('b2', 'c'), ('b1', 'c')]
+    assert graph.top_flows(5, target='b1').empty
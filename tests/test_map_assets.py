@@ -0,0 +1,74 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from src.map_visualizer import GarbageFlowVisualizer
+
+
+@pytest.fixture
+def visualizer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    enriched = tmp_path / "data" / "enriched"
+    enriched.mkdir(parents=True)
+    (tmp_path / "data" / "processed").mkdir()
+    nodes = gpd.GeoDataFrame({
+        'id': ['collection_0', 'collection_1', 'treatment_incineration'],
+        'type': ['collection', 'collection', 'treatment'],
+        'name': ['A', 'B', 'Issy-les-Moulineaux'],
+        'daily_capacity_kg': [500, 500, None],
+        'treatment_type': [None, None, 'incineration'],
+    }, geometry=[Point(2.3266, 48.8331), Point(2.3301, 48.8302), Point(2.2725, 48.8247)], crs='EPSG:4326')
+    nodes.to_file(enriched / "flow_nodes.geojson", driver='GeoJSON')
+    return GarbageFlowVisualizer(tmp_path / "data")
+
+
+def test_external_assets_reference_overlay_by_url(visualizer, tmp_path):
+    map_obj = visualizer.create_complete_map(external_assets=True)
+    html = map_obj.get_root().render()
+
+    pngs = list((tmp_path / "static" / "layers").glob("collection-intensity.*.png"))
+    assert len(pngs) == 1
+    assert f"layers/{pngs[0].name}" in html
+    assert 'data:image/png;base64' not in html
+
+
+def test_inline_overlay_is_embedded(visualizer, tmp_path):
+    html = visualizer.create_complete_map().get_root().render()
+
+    assert 'data:image/png;base64' in html
+    assert not (tmp_path / "static" / "layers").exists()
+
+
+def test_incremental_build_reuses_unchanged_layers(visualizer, tmp_path):
+    data = visualizer.load_data()
+    first = visualizer.build_map(data, external_assets=True)
+    drawn = {name: [child for _, child in children] for name, children in visualizer._layer_cache.items()}
+
+    second = visualizer.build_map(data, external_assets=True, changed={'proposed_sites'})
+    assert [c for _, c in visualizer._layer_cache['treatment_facilities']] == drawn['treatment_facilities']
+    assert all(child._parent is second for _, child in visualizer._layer_cache['treatment_facilities'])
+
+    visualizer.build_map(data, external_assets=True, changed={'nodes'})
+    assert [c for _, c in visualizer._layer_cache['treatment_facilities']] != drawn['treatment_facilities']
+    assert 'layers/' in second.get_root().render()
+    assert first is not second
+
+
+def test_heatmap_weights_points_by_outgoing_tonnage(visualizer, monkeypatch):
+    captured = {}
+
+    def rasterize(lons, lats, weights=None, **kwargs):
+        captured.update(lons=list(lons), weights=list(weights))
+        return None
+    monkeypatch.setattr(visualizer.density_rasterizer, 'rasterize', rasterize)
+
+    nodes = visualizer.load_data()['nodes']
+    edges = [
+        {'source': 'collection_1', 'target': 'treatment_incineration', 'estimated_daily_tonnage': 0.25},
+        {'source': 'collection_1', 'target': 'treatment_recycling', 'estimated_daily_tonnage': 0.5},
+    ]
+    visualizer.create_flow_heatmap(visualizer.create_base_map(), nodes, edges)
+
+    # collection_0 ships nothing and is left out
+    assert captured['lons'] == pytest.approx([2.3301])
+    assert captured['weights'] == pytest.approx([0.75])
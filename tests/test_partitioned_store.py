@@ -0,0 +1,47 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from scripts.partitioned_store import PartitionedStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionedStore(tmp_path / "partitioned")
+    reports = gpd.GeoDataFrame({
+        'c_ar': [14, 14, 14, 3],
+        'type': ['Propreté', 'Voirie', 'Propreté', 'Propreté'],
+        'datedecl': pd.to_datetime(['2024-04-30', '2024-05-02', '2024-06-15', '2024-05-20'], utc=True),
+    }, geometry=[Point(2.32, 48.83), Point(2.33, 48.83), Point(2.32, 48.84), Point(2.36, 48.86)],
+        crs='EPSG:4326')
+    assert store.write('citizen_reports', reports) == 4
+    return store
+
+
+def test_round_trip(store):
+    gdf = store.read('citizen_reports')
+    assert len(gdf) == 4
+    assert gdf.crs.to_epsg() == 4326
+    assert sorted(gdf['c_ar'].astype(int)) == [3, 14, 14, 14]
+    assert sorted(gdf['type'].astype(str)) == ['Propreté', 'Propreté', 'Propreté', 'Voirie']
+    assert sorted(round(p.x, 2) for p in gdf.geometry) == [2.32, 2.32, 2.33, 2.36]
+
+
+def test_partitions_are_pruned_by_arrondissement_and_month(store):
+    names = [f"{p.parent.parent.name}/{p.parent.name}"
+             for p in store.partitions('citizen_reports', arrondissements=[14], since='2024-05-01')]
+    assert names == ['_arr=14/_period=2024-05', '_arr=14/_period=2024-06']
+
+    # Rows outside the range in a kept partition are filtered when read
+    gdf = store.read('citizen_reports', arrondissements=[14], since='2024-05-01', until='2024-05-31')
+    assert gdf['type'].astype(str).tolist() == ['Voirie']
+
+
+def test_write_replaces_only_partitions_present(store):
+    update = gpd.GeoDataFrame({'c_ar': [3], 'type': ['Voirie'],
+                               'datedecl': pd.to_datetime(['2024-05-21'], utc=True)},
+                              geometry=[Point(2.36, 48.86)], crs='EPSG:4326')
+    store.write('citizen_reports', update)
+    assert store.read('citizen_reports', arrondissements=[3])['type'].astype(str).tolist() == ['Voirie']
+    assert len(store.read('citizen_reports', arrondissements=[14])) == 3
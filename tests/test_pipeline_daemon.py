@@ -0,0 +1,30 @@
+import geopandas as gpd
+from shapely.geometry import Point
+
+from scripts.partitioned_store import PartitionedStore
+from scripts.pipeline_daemon import PipelineDaemon
+
+
+def _bins(arrondissements):
+    return gpd.GeoDataFrame({'c_ar': arrondissements, 'lib_level': ['a'] * len(arrondissements)},
+                            geometry=[Point(2.32 + i * 1e-3, 48.83) for i in range(len(arrondissements))],
+                            crs='EPSG:4326')
+
+
+def test_partition_changes_are_detected_and_kept_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    daemon = PipelineDaemon(data_dir, arrondissement='14')
+    assert daemon.fetcher.PROCESSED_DATA_DIR == data_dir / "processed"
+    try:
+        store = PartitionedStore(data_dir / "processed" / "partitioned")
+        before = daemon._scan()
+        store.write('street_bins', _bins([14, 14, 15]))
+        after = daemon._scan()
+        changed = {p for p in set(after) | set(before) if after.get(p) != before.get(p)}
+        assert changed and all(p.suffix == '.parquet' for p in changed)
+
+        assert daemon._reload_processed(changed) == ['street_bins']
+        assert len(daemon.context.get_datasets()['street_bins']) == 2
+    finally:
+        daemon.context.close()
@@ -0,0 +1,38 @@
+import pstats
+
+import numpy as np
+
+from scripts.pipeline_metrics import PipelineMetrics
+
+
+def _first_helper():
+    return sum(range(1000))
+
+
+def _second_helper():
+    return sorted(range(1000), reverse=True)
+
+
+def test_stage_peak_rss_is_per_stage():
+    metrics = PipelineMetrics()
+    with metrics.stage('allocate'):
+        block = np.ones(200 * 2 ** 20 // 8)
+        block.sum()
+    del block
+    with metrics.stage('small'):
+        pass
+
+    peaks = {record['stage']: record['peak_rss_bytes'] for record in metrics.stages}
+    assert peaks['allocate'] - peaks['small'] > 100 * 2 ** 20
+
+
+def test_profile_accumulates_over_invocations(tmp_path):
+    metrics = PipelineMetrics(profile_stage='convert', profile_dir=tmp_path)
+    with metrics.stage('convert', dataset='a'):
+        _first_helper()
+    with metrics.stage('convert', dataset='b'):
+        _second_helper()
+
+    functions = {name for (_, _, name) in pstats.Stats(str(tmp_path / "convert.prof")).stats}
+    assert {'_first_helper', '_second_helper'} <= functions
+    assert '2 invocation(s)' in (tmp_path / "convert.profile.txt").read_text()
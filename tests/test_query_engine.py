@@ -0,0 +1,83 @@
+import json
+from datetime import date
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from scripts.emissions_ledger import EmissionsLedger
+from scripts.partitioned_store import PartitionedStore
+from scripts.query_engine import QueryEngine
+
+EXPECTED_ROWS = {
+    'street_bins': 4,
+    'glass_igloos': 2,
+    'flow_nodes': 3,
+    'flow_edges': 2,
+    'coverage_quartiers': 2,
+    'edge_emissions': 2,
+}
+
+
+def _points(n, **columns):
+    return gpd.GeoDataFrame(columns, geometry=[Point(2.33 + i * 1e-3, 48.85) for i in range(n)],
+                            crs='EPSG:4326')
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    processed = tmp_path / "processed"
+    enriched = tmp_path / "enriched"
+    (enriched / "coverage").mkdir(parents=True)
+    processed.mkdir()
+
+    PartitionedStore(processed / "partitioned").write(
+        'street_bins', _points(4, c_ar=[5, 5, 6, 6], lib_level=['a', 'b', 'a', 'b']))
+    _points(2, adresse=['1 rue A', '2 rue B']).to_file(processed / "glass_igloos.geojson", driver='GeoJSON')
+    _points(3, id=['n0', 'n1', 'n2'], type=['bin', 'bin', 'facility']).to_file(
+        enriched / "flow_nodes.geojson", driver='GeoJSON')
+
+    with open(enriched / "flow_edges.json", 'w') as f:
+        json.dump([{'source': 'n0', 'target': 'n2', 'weight': 1.0},
+                   {'source': 'n1', 'target': 'n2', 'weight': 2.0}], f)
+    with open(enriched / "coverage" / "coverage_summary.json", 'w') as f:
+        json.dump({'resolution_m': 25, 'quartiers': [{'quartier': 'Odéon', 'cells': 10},
+                                                      {'quartier': 'Monnaie', 'cells': 12}]}, f)
+
+    EmissionsLedger({
+        'tonnage': np.ones((2, 3), dtype=np.float32),
+        'sources': np.array([0, 1]),
+        'targets': np.array([2, 2]),
+        'waste_codes': np.array([0, 0], dtype=np.int8),
+        'class_codes': np.array([0, 0], dtype=np.int8),
+        'distance_km': np.array([1.5, 2.5], dtype=np.float32),
+    }, ['residual'], date(2024, 1, 1), np.array(['n0', 'n1', 'n2']), np.array(['A', 'B', 'C']),
+        np.array([5.0, 6.0, 6.0])).save(enriched / "emissions_ledger")
+    return tmp_path
+
+
+def test_every_registered_view_is_queryable(data_dir):
+    with QueryEngine(data_dir) as engine:
+        assert set(engine.sources) == set(EXPECTED_ROWS)
+        for name, rows in EXPECTED_ROWS.items():
+            result = engine.query(f'SELECT count(*) AS n FROM "{name}"', use_cache=False)
+            assert result['n'].iloc[0] == rows, name
+
+
+def test_partition_columns_and_parameters(data_dir):
+    with QueryEngine(data_dir) as engine:
+        result = engine.query('SELECT count(*) AS n FROM street_bins WHERE _arr = ?', [6], use_cache=False)
+        assert result['n'].iloc[0] == 2
+
+
+def test_edge_emissions_built_on_first_use_and_cached(data_dir):
+    with QueryEngine(data_dir) as engine:
+        assert 'edge_emissions' in engine._deferred
+        sql = 'SELECT sum(tonnes) AS t FROM edge_emissions'
+        assert engine.query(sql)['t'].iloc[0] == pytest.approx(6.0)
+        assert 'edge_emissions' not in engine._deferred
+        assert engine.query(sql)['t'].iloc[0] == pytest.approx(6.0)
+        engine.refresh()
+        assert engine.query(sql, use_cache=False)['t'].iloc[0] == pytest.approx(6.0)
+        assert 'edge_emissions' in engine.tables()['table'].tolist()
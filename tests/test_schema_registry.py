@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from scripts.dataset_schemas import consumer_fields
+from scripts.schema_registry import SchemaRegistry
+
+
+def _registry(tmp_path, fields):
+    registry = SchemaRegistry("http://localhost.invalid/api/records/1.0", tmp_path / "schema_cache.json")
+    registry._cache = {'street_bins': {
+        'dataset_id': 'corbeilles-de-rue',
+        'fields': fields,
+        'refine_field': 'c_ar',
+        'refine_format': 'number',
+        'resolved_at': datetime.now(timezone.utc).isoformat(),
+    }}
+    return registry
+
+
+def test_select_fields_keeps_fields_missing_from_probe(tmp_path):
+    # 'adresse' was null in every probed record, so the probe never saw it
+    registry = _registry(tmp_path, ['c_ar', 'lib_level'])
+    selected = registry.select_fields('street_bins', 'corbeilles-de-rue')
+    assert selected == consumer_fields('street_bins')
+    assert 'adresse' in selected
+
+
+def test_validate_flags_only_probed_fields_never_returned(tmp_path):
+    registry = _registry(tmp_path, ['c_ar', 'lib_level'])
+    records = [{'fields': {'c_ar': 1}, 'geometry': {'type': 'Point', 'coordinates': [2.35, 48.86]}}]
+    issues = registry.validate('street_bins', records, {'fields': 'adresse,c_ar,lib_level'})
+    assert "requested fields never returned: lib_level" in issues
@@ -0,0 +1,26 @@
+import geopandas as gpd
+from shapely.geometry import LineString
+
+from scripts.deduplicate_containers import METRIC_CRS
+from scripts.simplify_geometries import GeometrySimplifier
+
+X0, Y0 = 650_000.0, 6_860_000.0
+
+
+def _roads(offset):
+    lines = [LineString([(X0 + offset + i * 10, Y0 + j * 50) for j in range(20)]) for i in range(3)]
+    return gpd.GeoDataFrame({'c_ar': [offset] * 3}, geometry=lines, crs=METRIC_CRS).to_crs('EPSG:4326')
+
+
+def test_cache_keeps_one_entry_per_subset(tmp_path, monkeypatch):
+    simplifier = GeometrySimplifier(tmp_path)
+    first, second = _roads(0), _roads(5000)
+    simplifier.for_zoom('road_network', first, 14)
+    simplifier.for_zoom('road_network', second, 14)
+
+    # Switching back to the first subset is a cache hit, not a rebuild
+    def rebuild(*args):
+        raise AssertionError("simplified again")
+    monkeypatch.setattr(simplifier, 'simplify', rebuild)
+    assert len(simplifier.for_zoom('road_network', first, 14)) == 3
+    assert len(simplifier.for_zoom('road_network', second, 14)) == 3
@@ -0,0 +1,60 @@
+from itertools import combinations
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point, box
+
+from scripts.deduplicate_containers import METRIC_CRS
+from scripts.siting_optimizer import SitingOptimizer
+
+X0, Y0 = 650_000.0, 6_860_000.0
+RES = 250.0
+
+
+@pytest.fixture
+def datasets():
+    # Two 1 km square arrondissements; the only station sits in a corner cell of the first
+    boundaries = gpd.GeoDataFrame({'c_ar': [1, 2]}, geometry=[
+        box(X0, Y0, X0 + 1000, Y0 + 1000), box(X0 + 1000, Y0, X0 + 2000, Y0 + 1000)], crs=METRIC_CRS)
+    stations = gpd.GeoDataFrame(geometry=[Point(X0 + RES / 2, Y0 + RES / 2)], crs=METRIC_CRS)
+    return {'arrondissement_boundaries': boundaries, 'trilib_stations': stations.to_crs('EPSG:4326')}
+
+
+def _optimizer(k):
+    return SitingOptimizer(k=k, station_types=['trilib_stations'], demand_resolution_m=RES,
+                           candidate_resolution_m=RES, restarts=2, workers=1)
+
+
+def _total_distance(cells, facilities):
+    return np.hypot(*(cells[:, None, :] - facilities[None, :, :]).transpose(2, 0, 1)).min(axis=1).sum()
+
+
+def test_p_median_matches_brute_force(datasets):
+    sites = _optimizer(2).propose(datasets)
+    assert len(sites) == 2
+    assert set(sites['arrondissement']) == {1}
+
+    centres = (np.arange(4) + 0.5) * RES
+    cells = np.array([(X0 + x, Y0 + y) for x in centres for y in centres])
+    station = np.array([[X0 + RES / 2, Y0 + RES / 2]])
+    best = min(_total_distance(cells, np.vstack([station, cells[list(pair)]]))
+               for pair in combinations(range(len(cells)), 2))
+
+    metric = sites.to_crs(METRIC_CRS).geometry
+    chosen = np.column_stack([metric.x, metric.y])
+    assert _total_distance(cells, np.vstack([station, chosen])) == pytest.approx(best, rel=1e-4)
+    assert sites['rank'].tolist() == [1, 2]
+
+
+def test_sites_stay_where_stations_were_fetched(datasets):
+    everywhere = _optimizer(3).propose(datasets, arrondissements=[1, 2])
+    assert 2 in set(everywhere['arrondissement'])
+
+    scoped = _optimizer(3).propose(datasets)
+    assert set(scoped['arrondissement']) == {1}
+
+
+def test_no_stations_means_no_siting(datasets):
+    datasets['trilib_stations'] = datasets['trilib_stations'].iloc[:0]
+    assert _optimizer(1).propose(datasets) is None
@@ -0,0 +1,52 @@
+import time
+from datetime import datetime, timezone
+
+from scripts.snapshot_store import SnapshotStore
+
+FULL = {'dataset': 'corbeilles-de-rue', 'fields': 'adresse,c_ar', 'rows': 10000, 'format': 'json'}
+FOURTH = {**FULL, 'refine.c_ar': '4'}
+
+
+def _record(recordid, arrondissement, adresse):
+    return {'recordid': recordid, 'record_timestamp': datetime.now(timezone.utc).isoformat(),
+            'fields': {'c_ar': arrondissement, 'adresse': adresse}}
+
+
+def test_commit_diff_and_as_of_read(tmp_path):
+    store = SnapshotStore(tmp_path)
+    first = store.commit('street_bins', [_record('a', 4, '1 rue de Rivoli'),
+                                         _record('b', 4, '2 rue de Rivoli')], query=FULL)
+    time.sleep(0.01)
+    between = datetime.now(timezone.utc)
+    time.sleep(0.01)
+    second = store.commit('street_bins', [_record('a', 4, '1 rue de Rivoli'),
+                                          _record('b', 4, '3 rue de Rivoli'),
+                                          _record('c', 4, '4 rue de Rivoli')], query=FULL)
+    assert second['added'] == 2 and second['removed'] == 1 and second['new_objects'] == 2
+
+    changes = store.diff('street_bins', first['snapshot_id'], second['snapshot_id'], query=FULL)
+    assert [r['recordid'] for r in changes['added']] == ['c']
+    assert changes['removed'] == []
+    assert [(old['fields']['adresse'], new['fields']['adresse']) for old, new in changes['modified']] \
+        == [('2 rue de Rivoli', '3 rue de Rivoli')]
+
+    past = store.read('street_bins', as_of=between, query=FULL)
+    assert sorted(r['fields']['adresse'] for r in past) == ['1 rue de Rivoli', '2 rue de Rivoli']
+    assert len(store.read('street_bins', query=FULL)) == 3
+
+
+def test_history_is_kept_per_query(tmp_path):
+    store = SnapshotStore(tmp_path)
+    everything = [_record('a', 4, '1 rue de Rivoli'), _record('b', 11, '1 rue Oberkampf')]
+    store.commit('street_bins', everything, query=FULL)
+
+    # A filtered fetch is not a deletion of the records outside the filter
+    filtered = store.commit('street_bins', everything[:1], query={**FOURTH, 'rows': 100})
+    assert filtered['removed'] == 0 and filtered['new_objects'] == 0
+    again = store.commit('street_bins', everything, query=FULL)
+    assert again['added'] == 0 and again['removed'] == 0
+
+    assert len(store.snapshots('street_bins', FULL)) == 2
+    assert len(store.snapshots('street_bins', FOURTH)) == 1
+    assert [r['recordid'] for r in store.read('street_bins', query=FOURTH)] == ['a']
+    assert len(store.queries('street_bins')) == 2
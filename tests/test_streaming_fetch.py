@@ -0,0 +1,29 @@
+from scripts.fetch_paris_data import ParisDataFetcher
+from scripts.streaming_fetch import StreamingFetcher
+
+
+def _record(lon, lat):
+    return {'fields': {'adresse': 'rue de Rivoli'},
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]}}
+
+
+PAGES = {
+    'glass_igloos': [_record(2.35, 48.86), _record(2.36, 48.86)],
+    # Not a valid geometry: conversion of this page raises
+    'trilib_stations': [{'fields': {}, 'geometry': {'type': 'Point', 'coordinates': 'n/a'}}],
+}
+
+
+def test_bad_inline_page_fails_only_its_dataset(tmp_path, monkeypatch):
+    fetcher = ParisDataFetcher(data_dir=tmp_path)
+    monkeypatch.setattr(fetcher, 'fetch_plan', lambda arrondissement: [(k, None) for k in PAGES])
+    monkeypatch.setattr(fetcher, 'search_params', lambda key, filters, rows: {'dataset': key})
+    monkeypatch.setattr(fetcher, 'fetch_page', lambda key, params: {'nhits': len(PAGES[key]),
+                                                                     'records': PAGES[key]})
+    monkeypatch.setattr(fetcher, 'check_schema', lambda *args: [])
+    monkeypatch.setattr(fetcher, 'save_raw', lambda *args: None)
+
+    datasets = StreamingFetcher(fetcher, fetch_workers=2, cpu_workers=1).run('1')
+
+    assert set(datasets) == {'glass_igloos'}
+    assert len(datasets['glass_igloos']) == 2
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.enrich_data import DEFAULT_WASTE_RATES, DataEnricher
+from scripts.siting_optimizer import ARRONDISSEMENT_POPULATION
+from scripts.tonnage_series import TonnageSeries, tidy_table
+
+
+def _long_table():
+    return pd.DataFrame({
+        'granularite': ['Arrondissement'] * 4,
+        'arrondissement': ['75005', '75005', '75012', '75012'],
+        'annee': [2022] * 4,
+        'type_dechet': ['Verre', 'Ordures ménagères résiduelles'] * 2,
+        'kg_par_habitant': [30.0, 250.0, 40.0, 260.0],
+        'tonnage': [1700.0, 14000.0, 5600.0, 36000.0],
+    })
+
+
+def test_tidy_table_prefers_arrondissement_number_over_granularite():
+    tidy = tidy_table(_long_table(), 'tonnage')
+    assert sorted(tidy['arrondissement'].unique()) == [5, 12]
+
+
+@pytest.mark.parametrize('measure, column', [('tonnage', 'tonnage'), ('kg_per_capita', 'kg_par_habitant')])
+def test_tidy_table_value_column_follows_measure(measure, column):
+    table = _long_table()
+    tidy = tidy_table(table, measure)
+    assert tidy['value'].tolist() == table[column].tolist()
+    assert tidy['waste_type'].tolist() == ['glass', 'household_waste'] * 2
+    assert tidy['month'].isna().all()
+
+
+def test_rates_use_local_figures_then_paris_fallback():
+    paris = pd.DataFrame({'annee': [2022], 'type_dechet': ['Verre'], 'kg_par_habitant': [36.0]})
+    local = _long_table().drop(columns='tonnage')
+    series = TonnageSeries.from_tables({'waste_per_capita': pd.concat([paris, local], ignore_index=True)})
+
+    rates, period = series.rates(5, ARRONDISSEMENT_POPULATION)
+    assert period == '2022'
+    assert rates['glass'] == pytest.approx(30.0)
+    assert rates['household_waste'] == pytest.approx(250.0)
+
+    rates, _ = series.rates(7, ARRONDISSEMENT_POPULATION)
+    assert rates == {'glass': pytest.approx(36.0)}
+    assert series.rates(5, ARRONDISSEMENT_POPULATION, '2019') == ({}, None)
+
+
+def test_rates_from_tonnage_divide_by_population():
+    table = _long_table().drop(columns='kg_par_habitant')
+    series = TonnageSeries.from_tables({'waste_statistics': table})
+    rates, _ = series.rates(5, ARRONDISSEMENT_POPULATION)
+    assert rates['glass'] == pytest.approx(1700.0 * 1000 / ARRONDISSEMENT_POPULATION[5], rel=1e-4)
+
+
+def test_estimate_waste_flows_ignores_implausible_rates_and_supports_paris(tmp_path):
+    table = pd.DataFrame({'annee': [2022, 2022], 'type_dechet': ['Verre', 'Encombrants'],
+                          'kg_par_habitant': [36.0, 25000.0]})
+    series = TonnageSeries.from_tables({'waste_per_capita': table})
+    flows = DataEnricher(tmp_path).estimate_waste_flows(arrondissement=0, series=series)
+
+    assert flows['population'] == sum(ARRONDISSEMENT_POPULATION.values())
+    assert flows['waste_rates']['glass'] == pytest.approx(36.0)
+    assert flows['waste_rates']['bulky_waste'] == DEFAULT_WASTE_RATES['bulky_waste']
+    assert np.isclose(flows['annual_tonnage']['glass'], flows['population'] * 36.0 / 1000, rtol=1e-4)